@@ -1,11 +1,54 @@
 from django.contrib import admin
-from .models import UserProfile, MembershipPlan, Resource, Booking, LeaseContract, Subscription
+from django.contrib.admin.utils import unquote
+from .models import (
+    UserProfile, MembershipPlan, Resource, Booking, ArchivedBooking,
+    LeaseContract, Subscription, WaitlistEntry, Job, Invoice, BillingRun, Location,
+    MaintenanceWindow, Occupancy, AuditEntry
+)
+from . import audit, jobs, sites
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables that grow without bound: estimated
+    counts instead of COUNT(*), no second unfiltered count, and
+    autocomplete widgets instead of <select>s listing every related row.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+class SiteScopedAdmin(admin.ModelAdmin):
+    """Narrow changelists to the current site chosen on the staff member's profile."""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).for_site(sites.current_site(request.user))
+
+class AuditHistoryAdmin(admin.ModelAdmin):
+    """Show the object's audit trail on its admin History page."""
+    audit_model = None
+
+    def history_view(self, request, object_id, extra_context=None):
+        obj = self.get_object(request, unquote(object_id))
+        if obj is not None:
+            extra_context = {**(extra_context or {}), 'audit_entries': audit.history(obj, self.audit_model)}
+        return super().history_view(request, object_id, extra_context)
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('name',)
+    prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'role', 'account_status', 'company_name')
+class UserProfileAdmin(AuditHistoryAdmin, LargeTableAdmin):
+    list_display = ('user', 'role', 'account_status', 'company_name', 'current_site')
     list_filter = ('role', 'account_status')
-    search_fields = ('user__username', 'company_name')
+    list_select_related = ('user', 'current_site')
+    search_fields = ('^user__username', '^company_name')
+    autocomplete_fields = ('user',)
 
 @admin.register(MembershipPlan)
 class MembershipPlanAdmin(admin.ModelAdmin):
@@ -14,27 +57,127 @@ class MembershipPlanAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(Resource)
-class ResourceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'type', 'capacity', 'status', 'location')
-    list_filter = ('type', 'status')
-    search_fields = ('name', 'location')
+class ResourceAdmin(SiteScopedAdmin):
+    list_display = ('name', 'type', 'capacity', 'status', 'site', 'location')
+    list_filter = ('site', 'type', 'status')
+    list_select_related = ('site',)
+    search_fields = ('name', 'location', 'external_key')
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(AuditHistoryAdmin, SiteScopedAdmin, LargeTableAdmin):
     list_display = ('user', 'resource', 'start_time', 'end_time', 'status')
-    list_filter = ('status', 'resource__type')
-    search_fields = ('user__username', 'resource__name')
+    list_filter = ('site', 'status', 'resource__type')
+    list_select_related = ('user', 'resource')
+    search_fields = ('^user__username', '^resource__name')
+    autocomplete_fields = ('user', 'resource')
+    date_hierarchy = 'start_time'
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(AuditHistoryAdmin, SiteScopedAdmin, LargeTableAdmin):
+    audit_model = Booking
+    list_display = ('user', 'resource', 'start_time', 'end_time', 'status', 'archived_at')
+    list_filter = ('site', 'status')
+    list_select_related = ('user', 'resource')
+    search_fields = ('^user__username', '^resource__name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(LeaseContract)
-class LeaseContractAdmin(admin.ModelAdmin):
+class LeaseContractAdmin(AuditHistoryAdmin, SiteScopedAdmin, LargeTableAdmin):
     list_display = ('user', 'resource', 'start_date', 'end_date', 'status')
-    list_filter = ('status',)
-    search_fields = ('user__username', 'resource__name')
+    list_filter = ('resource__site', 'status')
+    list_select_related = ('user', 'resource')
+    search_fields = ('^user__username', '^resource__name')
+    autocomplete_fields = ('user', 'resource')
+    date_hierarchy = 'start_date'
+
+@admin.register(MaintenanceWindow)
+class MaintenanceWindowAdmin(LargeTableAdmin):
+    list_display = ('resource', 'start_time', 'end_time', 'reason')
+    list_select_related = ('resource',)
+    search_fields = ('^resource__name',)
+    autocomplete_fields = ('resource',)
+    date_hierarchy = 'start_time'
+
+@admin.register(Occupancy)
+class OccupancyAdmin(LargeTableAdmin):
+    """Read-only view of the ledger; rows follow their bookings, leases and maintenance windows."""
+    list_display = ('resource', 'source', 'start_time', 'end_time')
+    list_filter = ('source',)
+    list_select_related = ('resource',)
+    search_fields = ('^resource__name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(LargeTableAdmin):
+    """Read-only, append-only trail of status transitions."""
+    list_display = ('created_at', 'content_type', 'object_id', 'field', 'old_value', 'new_value', 'actor')
+    list_filter = ('content_type', 'field')
+    list_select_related = ('content_type', 'actor')
+    search_fields = ('=object_id', '^actor__username')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdmin):
     list_display = ('user', 'plan', 'start_date', 'end_date', 'is_active')
     list_filter = ('is_active', 'plan')
-    search_fields = ('user__username', 'plan__name')
+    list_select_related = ('user', 'plan')
+    search_fields = ('^user__username', '^plan__name')
+    autocomplete_fields = ('user', 'plan')
+    date_hierarchy = 'start_date'
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(LargeTableAdmin):
+    list_display = ('user', 'resource', 'start_time', 'end_time', 'priority', 'status', 'created_at')
+    list_filter = ('status',)
+    list_editable = ('priority',)
+    list_select_related = ('user', 'resource')
+    search_fields = ('^user__username', '^resource__name')
+    autocomplete_fields = ('user', 'resource', 'booking')
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('task', 'queue', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'queue')
+    search_fields = ('^task',)
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'finished_at', 'created_at', 'updated_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected dead jobs')
+    def retry_jobs(self, request, queryset):
+        count = jobs.retry(queryset)
+        self.message_user(request, f'Requeued {count} jobs.')
 
+@admin.register(Invoice)
+class InvoiceAdmin(LargeTableAdmin):
+    list_display = ('user', 'period', 'total', 'status', 'due_date')
+    list_filter = ('status', 'period')
+    list_select_related = ('user',)
+    search_fields = ('^user__username', '=period')
+    autocomplete_fields = ('user', 'lease', 'subscription')
 
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    list_display = ('period', 'status', 'leases_processed', 'subscriptions_processed', 'started_at', 'finished_at')
+    readonly_fields = ('last_lease_id', 'last_subscription_id', 'leases_processed',
+                       'subscriptions_processed', 'started_at', 'finished_at')
@@ -0,0 +1,539 @@
+"""
+JSON API at /api/v1/ for the mobile and kiosk clients.
+
+    GET   /api/v1/<collection>/        list (keyset-paginated)
+    POST  /api/v1/<collection>/        create
+    GET   /api/v1/<collection>/<id>/   one object
+    PATCH /api/v1/<collection>/<id>/   update
+
+Collections: resources, bookings, leases, subscriptions and plans. Lists
+and objects take:
+
+- ``fields=id,status,...``: the fields to return (all by default)
+- ``include=resource,user``: related objects to return under ``included``,
+  keyed by type and id, so an object referenced by many rows is sent once.
+  ``fields[<type>]=...`` picks their fields. Included objects that are
+  themselves a collection are limited to what that collection shows the
+  user, so a relation the user cannot see is left out.
+- ``limit`` (default API_PAGE_SIZE, at most API_MAX_PAGE_SIZE) and
+  ``cursor``, the ``next`` value of the previous page. Pages are keyset
+  pages that continue after the last row instead of counting an OFFSET,
+  so every page costs the same.
+- per-collection filters such as ``status=approved``.
+
+Reads never build model instances. Rows come from ``values_list()`` and
+go straight to JSON. Each included relation costs one ``pk__in`` query
+per page, whatever the page size. Writes go through the same forms and
+``permissions.py`` rules as the HTML views. Requests use the session
+login, and writes need the CSRF token (``X-CSRFToken``).
+"""
+import base64
+import binascii
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.forms.models import model_to_dict
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from . import entitlements, jobs, ratelimit, reservations, sites
+from .db import serialized_write
+from .forms import BookingForm, LeaseContractForm, ResourceForm, SubscriptionForm
+from .models import Booking, LeaseContract, Location, MembershipPlan, Resource, Subscription
+from .permissions import (
+    can_approve_bookings, can_approve_leases, can_cancel_subscriptions, can_manage_leases,
+    can_manage_membership_plans, can_manage_resources, can_terminate_leases, can_view_all_bookings,
+    can_view_all_leases, can_view_all_subscriptions, is_owner_or_staff,
+)
+
+TRUE_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, errors=None, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors
+        self.headers = headers or {}
+
+
+class Type:
+    """A model as the API shows it: output fields mapped to ORM paths, and relations to other types"""
+
+    def __init__(self, name, model, fields, relations=None):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        # {field: type name}; the field holds the related object's id
+        self.relations = relations or {}
+
+
+class Collection(Type):
+    """A Type served at /api/v1/<name>/"""
+
+    def __init__(self, name, model, fields, queryset, ordering, relations=None, filters=None,
+                 create=None, update=None):
+        super().__init__(name, model, fields, relations)
+        # queryset(request) returns the objects the user may see
+        self.queryset = queryset
+        # Keyset order; must end with a unique field and name only non-null fields
+        self.ordering = ordering
+        self.filters = filters or {}
+        self.create = create
+        self.update = update
+
+
+def _json(payload, status=200):
+    return JsonResponse(payload, status=status, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'separators': (',', ':')})
+
+
+def api_view(view_func):
+    """Session auth with JSON errors instead of redirects; parses JSON request bodies"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        try:
+            if not request.user.is_authenticated:
+                raise ApiError(401, 'Authentication required')
+            request.data = {}
+            if request.method in ('POST', 'PATCH'):
+                try:
+                    request.data = json.loads(request.body or b'{}')
+                except ValueError:
+                    raise ApiError(400, 'The request body is not valid JSON')
+                if not isinstance(request.data, dict):
+                    raise ApiError(400, 'The request body must be a JSON object')
+            return view_func(request, *args, **kwargs)
+        except ApiError as e:
+            body = {'error': e.message}
+            if e.errors is not None:
+                body['errors'] = e.errors
+            response = _json(body, status=e.status)
+            for header, value in e.headers.items():
+                response[header] = value
+            return response
+    return wrapper
+
+
+# Reading
+
+def _field_names(type_, value):
+    if not value:
+        return list(type_.fields)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in type_.fields]
+    if unknown:
+        raise ApiError(400, f'Unknown fields for {type_.name}: {", ".join(unknown)}',
+                       {'allowed': list(type_.fields)})
+    # The id always comes first so clients can key on it
+    return ['id'] + [name for name in names if name != 'id']
+
+
+def _includes(collection, value):
+    names = [name.strip() for name in (value or '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in collection.relations]
+    if unknown:
+        raise ApiError(400, f'Cannot include {", ".join(unknown)} on {collection.name}',
+                       {'allowed': list(collection.relations)})
+    return names
+
+
+def _fetch(queryset, type_, names, extra=()):
+    """Rows of ``names`` as dicts, plus the raw values of ``extra`` ORM paths"""
+    paths = [type_.fields[name] for name in names] + list(extra)
+    width = len(names)
+    return [(dict(zip(names, values[:width])), values[width:])
+            for values in queryset.values_list(*paths)]
+
+
+def _included(request, collection, rows, includes, params):
+    included = {}
+    for relation in includes:
+        type_ = TYPES[collection.relations[relation]]
+        ids = {row[relation] for row in rows if row[relation] is not None}
+        if not ids:
+            continue
+        names = _field_names(type_, params.get(f'fields[{type_.name}]'))
+        # One query per relation for the whole page
+        objects = included.setdefault(type_.name, {})
+        if isinstance(type_, Collection):
+            queryset = type_.queryset(request)
+        else:
+            queryset = type_.model._base_manager.all()
+        for row, _ in _fetch(queryset.filter(pk__in=ids), type_, names):
+            objects[str(row['id'])] = row
+    return included
+
+
+def _order_paths(collection):
+    return [term.lstrip('-') for term in collection.ordering]
+
+
+def _cursor_value(value):
+    # Exact values: DjangoJSONEncoder would cut datetimes to milliseconds and skip rows
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_cursor(values):
+    raw = json.dumps(list(values), default=_cursor_value, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(collection, cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        paths = _order_paths(collection)
+        if not isinstance(values, list) or len(values) != len(paths):
+            raise ValueError
+        return [collection.model._meta.get_field(path).to_python(value) for path, value in zip(paths, values)]
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        raise ApiError(400, 'Invalid cursor')
+
+
+def _after(collection, values):
+    """Rows that sort after ``values`` in the collection's keyset order"""
+    condition = Q()
+    for i, term in enumerate(collection.ordering):
+        clause = Q(**{f'{term.lstrip("-")}__{"lt" if term.startswith("-") else "gt"}': values[i]})
+        for previous, value in zip(collection.ordering[:i], values[:i]):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def _filter(collection, queryset, params):
+    lookups = {}
+    for param, lookup in collection.filters.items():
+        if param in params:
+            value = params[param]
+            lookups[lookup] = TRUE_VALUES.get(value.lower(), value) if lookup.startswith('is_') else value
+    try:
+        return queryset.filter(**lookups)
+    except (ValueError, ValidationError):
+        raise ApiError(400, 'Invalid filter value')
+
+
+def _limit(params):
+    default = getattr(settings, 'API_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
+    try:
+        limit = int(params.get('limit', default))
+    except ValueError:
+        raise ApiError(400, 'limit must be a number')
+    return max(1, min(limit, maximum))
+
+
+def _list(request, collection):
+    params = request.GET
+    names = _field_names(collection, params.get('fields'))
+    includes = _includes(collection, params.get('include'))
+    limit = _limit(params)
+
+    queryset = _filter(collection, collection.queryset(request), params)
+    if params.get('cursor'):
+        queryset = queryset.filter(_after(collection, _decode_cursor(collection, params['cursor'])))
+    queryset = queryset.order_by(*collection.ordering)
+
+    # Relations to include need their ids even when the client did not ask for them
+    fetched = names + [relation for relation in includes if relation not in names]
+    results = _fetch(queryset[:limit + 1], collection, fetched, extra=_order_paths(collection))
+    page = results[:limit]
+    rows = [row for row, _ in page]
+    payload = {
+        'data': [{name: row[name] for name in names} for row in rows] if fetched != names else rows,
+        'next': _encode_cursor(page[-1][1]) if len(results) > limit else None,
+    }
+    if includes:
+        payload['included'] = _included(request, collection, rows, includes, params)
+    return _json(payload)
+
+
+def _detail(request, collection, queryset, pk, status=200):
+    params = request.GET
+    names = _field_names(collection, params.get('fields'))
+    includes = _includes(collection, params.get('include'))
+    fetched = names + [relation for relation in includes if relation not in names]
+    results = _fetch(queryset.filter(pk=pk), collection, fetched)
+    if not results:
+        raise ApiError(404, f'No {collection.name} with id {pk}')
+    row = results[0][0]
+    payload = {'data': {name: row[name] for name in names}}
+    if includes:
+        payload['included'] = _included(request, collection, [row], includes, params)
+    return _json(payload, status=status)
+
+
+# Writing
+
+def _form_errors(form):
+    return {field: [error['message'] for error in errors] for field, errors in form.errors.get_json_data().items()}
+
+
+def _only(data, allowed):
+    unknown = sorted(set(data) - set(allowed))
+    if unknown:
+        raise ApiError(400, f'These fields cannot be changed here: {", ".join(unknown)}')
+
+
+def _create_booking(request, data):
+    policy = ratelimit.get_policy('booking_create')
+    if policy is not None:
+        limited = ratelimit.limit(policy, request)
+        if limited is not None:
+            raise ApiError(429, 'Too many requests', headers={'Retry-After': limited['Retry-After']})
+    form = BookingForm(data)
+    if not form.is_valid():
+        raise ApiError(400, 'The booking is not valid', _form_errors(form))
+    booking = form.save(commit=False)
+    if not entitlements.is_entitled(request.user, booking.resource):
+        raise ApiError(403, 'Your membership plan does not include this type of resource.')
+    booking.user = request.user
+    booking.total_price = booking.calculate_total_price()
+    try:
+        reservations.create(booking)
+    except ValidationError as e:
+        raise ApiError(409, e.messages[0])
+    return booking
+
+
+def _update_booking(request, booking, data):
+    _only(data, ('status',))
+    status = data.get('status')
+    if status == 'cancelled':
+        if not is_owner_or_staff(request.user, booking):
+            raise ApiError(403, 'You cannot cancel this booking')
+        if booking.status not in ('pending', 'approved'):
+            raise ApiError(400, f'A {booking.status} booking cannot be cancelled')
+        booking.status = status
+        serialized_write(booking.save)()
+        return booking
+    if status not in ('approved', 'rejected'):
+        raise ApiError(400, 'status must be approved, rejected or cancelled')
+    if not can_approve_bookings(request.user):
+        raise ApiError(403, 'Only staff can approve or reject bookings')
+    try:
+        booking = (reservations.approve if status == 'approved' else reservations.reject)(booking)
+    except ValidationError as e:
+        # Another approval or lease took the slot first
+        raise ApiError(409 if e.code == 'conflict' else 400, e.messages[0])
+    if status == 'approved':
+        jobs.enqueue('core_app.tasks.send_booking_approved_email', booking_id=booking.pk)
+    return booking
+
+
+def _save_resource(request, data, resource=None):
+    if not can_manage_resources(request.user):
+        raise ApiError(403, 'Only staff can manage resources')
+    if resource is not None:
+        # PATCH: fields left out keep their current values
+        data = {**model_to_dict(resource, fields=ResourceForm.Meta.fields), **data}
+    form = ResourceForm(data, instance=resource)
+    if not form.is_valid():
+        raise ApiError(400, 'The resource is not valid', _form_errors(form))
+    return form.save()
+
+
+def _create_lease(request, data):
+    if not can_manage_leases(request.user):
+        raise ApiError(403, 'Only staff can create leases')
+    form = LeaseContractForm(data)
+    if not form.is_valid():
+        raise ApiError(400, 'The lease is not valid', _form_errors(form))
+    lease = form.save(commit=False)
+    lease.user = request.user
+    if data.get('user') is not None:
+        lease.user = User.objects.filter(pk=data['user']).first()
+        if lease.user is None:
+            raise ApiError(400, 'The lease is not valid', {'user': ['Unknown user.']})
+    try:
+        reservations.create_lease(lease)
+    except ValidationError as e:
+        raise ApiError(409, e.messages[0])
+    return lease
+
+
+def _update_lease(request, lease, data):
+    _only(data, ('status',))
+    status = data.get('status')
+    if status == 'active':
+        if not can_approve_leases(request.user):
+            raise ApiError(403, 'Only staff can approve leases')
+        try:
+            return reservations.activate_lease(lease)
+        except ValidationError as e:
+            # Another lease or an approved booking took the period first
+            raise ApiError(409 if e.code == 'conflict' else 400, e.messages[0])
+    if status != 'terminated':
+        raise ApiError(400, 'status must be active or terminated')
+    if not can_terminate_leases(request.user):
+        raise ApiError(403, 'Only admins can terminate leases')
+    if lease.status != 'active':
+        raise ApiError(400, f'A {lease.status} lease cannot be terminated')
+    lease.status = status
+    serialized_write(lease.save)()
+    return lease
+
+
+def _create_subscription(request, data):
+    form = SubscriptionForm(data)
+    if not form.is_valid():
+        raise ApiError(400, 'The subscription is not valid', _form_errors(form))
+    subscription = form.save(commit=False)
+    subscription.user = request.user
+    subscription.save()
+    return subscription
+
+
+def _update_subscription(request, subscription, data):
+    _only(data, ('is_active',))
+    if data.get('is_active') is not False:
+        raise ApiError(400, 'Subscriptions can only be cancelled (is_active: false)')
+    if not can_cancel_subscriptions(request.user):
+        raise ApiError(403, 'Only staff can cancel subscriptions')
+    subscription.is_active = False
+    subscription.save()
+    return subscription
+
+
+# Visibility, as in the HTML views
+
+def _resources(request):
+    site = sites.current_site(request.user)
+    return entitlements.filter_resources(Resource.objects.for_site(site), request.user)
+
+
+def _bookings(request):
+    site = sites.current_site(request.user)
+    if can_view_all_bookings(request.user):
+        return Booking.objects.for_site(site)
+    return Booking.objects.for_site(site).filter(user=request.user)
+
+
+def _leases(request):
+    site = sites.current_site(request.user)
+    if can_view_all_leases(request.user):
+        return LeaseContract.objects.for_site(site)
+    return LeaseContract.objects.for_site(site).filter(user=request.user)
+
+
+def _subscriptions(request):
+    if can_view_all_subscriptions(request.user):
+        return Subscription.objects.all()
+    return Subscription.objects.filter(user=request.user)
+
+
+def _plans(request):
+    if can_manage_membership_plans(request.user):
+        return MembershipPlan.objects.all()
+    return MembershipPlan.objects.filter(is_active=True)
+
+
+COLLECTIONS = {collection.name: collection for collection in (
+    Collection(
+        'resources', Resource,
+        fields={'id': 'id', 'name': 'name', 'type': 'type', 'status': 'status', 'capacity': 'capacity',
+                'site': 'site_id', 'location': 'location', 'price_per_hour': 'price_per_hour',
+                'monthly_price': 'monthly_price', 'description': 'description', 'amenities': 'amenities',
+                'external_key': 'external_key', 'updated_at': 'updated_at'},
+        queryset=_resources,
+        ordering=('name', 'id'),
+        relations={'site': 'sites'},
+        filters={'type': 'type', 'status': 'status', 'site': 'site__slug'},
+        create=_save_resource,
+        update=lambda request, resource, data: _save_resource(request, data, resource),
+    ),
+    Collection(
+        'bookings', Booking,
+        fields={'id': 'id', 'resource': 'resource_id', 'user': 'user_id', 'site': 'site_id',
+                'start_time': 'start_time', 'end_time': 'end_time', 'status': 'status',
+                'total_price': 'total_price', 'notes': 'notes', 'created_at': 'created_at',
+                'updated_at': 'updated_at'},
+        queryset=_bookings,
+        ordering=('-start_time', '-id'),
+        relations={'resource': 'resources', 'user': 'users', 'site': 'sites'},
+        filters={'status': 'status', 'resource': 'resource_id', 'user': 'user_id'},
+        create=_create_booking,
+        update=_update_booking,
+    ),
+    Collection(
+        'leases', LeaseContract,
+        fields={'id': 'id', 'resource': 'resource_id', 'user': 'user_id', 'start_date': 'start_date',
+                'end_date': 'end_date', 'monthly_rent': 'monthly_rent', 'deposit_amount': 'deposit_amount',
+                'status': 'status', 'terms_and_conditions': 'terms_and_conditions',
+                'created_at': 'created_at', 'updated_at': 'updated_at'},
+        queryset=_leases,
+        ordering=('-id',),
+        relations={'resource': 'resources', 'user': 'users'},
+        filters={'status': 'status', 'resource': 'resource_id'},
+        create=_create_lease,
+        update=_update_lease,
+    ),
+    Collection(
+        'subscriptions', Subscription,
+        fields={'id': 'id', 'user': 'user_id', 'plan': 'plan_id', 'start_date': 'start_date',
+                'end_date': 'end_date', 'is_active': 'is_active', 'created_at': 'created_at'},
+        queryset=_subscriptions,
+        ordering=('-id',),
+        relations={'user': 'users', 'plan': 'plans'},
+        filters={'is_active': 'is_active', 'plan': 'plan_id'},
+        create=_create_subscription,
+        update=_update_subscription,
+    ),
+    Collection(
+        'plans', MembershipPlan,
+        fields={'id': 'id', 'name': 'name', 'description': 'description', 'price': 'price',
+                'duration_days': 'duration_days', 'access_level': 'access_level', 'is_active': 'is_active'},
+        queryset=_plans,
+        ordering=('id',),
+        filters={'access_level': 'access_level'},
+    ),
+)}
+
+TYPES = {
+    **COLLECTIONS,
+    'users': Type('users', User, {'id': 'id', 'username': 'username', 'first_name': 'first_name',
+                                  'last_name': 'last_name'}),
+    'sites': Type('sites', Location, {'id': 'id', 'name': 'name', 'slug': 'slug'}),
+}
+
+
+def _collection(name):
+    collection = COLLECTIONS.get(name)
+    if collection is None:
+        raise ApiError(404, f'Unknown collection "{name}"')
+    return collection
+
+
+@require_http_methods(['GET', 'POST'])
+@api_view
+def collection_view(request, name):
+    collection = _collection(name)
+    if request.method == 'GET':
+        return _list(request, collection)
+    if collection.create is None:
+        raise ApiError(405, f'{collection.name} are read-only')
+    obj = collection.create(request, request.data)
+    return _detail(request, collection, collection.model.objects.all(), obj.pk, status=201)
+
+
+@require_http_methods(['GET', 'PATCH'])
+@api_view
+def item_view(request, name, pk):
+    collection = _collection(name)
+    if request.method == 'GET':
+        return _detail(request, collection, collection.queryset(request), pk)
+    if collection.update is None:
+        raise ApiError(405, f'{collection.name} are read-only')
+    obj = collection.queryset(request).filter(pk=pk).first()
+    if obj is None:
+        raise ApiError(404, f'No {collection.name} with id {pk}')
+    collection.update(request, obj, request.data)
+    return _detail(request, collection, collection.model.objects.all(), obj.pk)
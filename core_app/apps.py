@@ -6,4 +6,5 @@ class CoreAppConfig(AppConfig):
     name = 'core_app'
     
     def ready(self):
+        import core_app.assets  # registers the built-assets system check
         import core_app.signals
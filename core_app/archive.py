@@ -0,0 +1,91 @@
+"""
+Hot/cold partitioning of booking history.
+
+Decided bookings that ended before the retention horizon are copied into
+``ArchivedBooking`` and deleted from ``Booking`` in PK-ordered batches, one
+short write transaction per batch. The hot table then only holds recent and
+upcoming bookings, which is all that conflict checks, dashboards and the
+default booking list ever need.
+
+``booking_history`` reads both tables for views that need the full record.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .db import serialized_write
+from .models import ArchivedBooking, Booking
+from .pagination import before_keyset
+
+ARCHIVED_FIELDS = ('id', 'user_id', 'resource_id', 'site_id', 'start_time', 'end_time', 'status',
+                   'total_price', 'notes', 'created_at', 'updated_at')
+
+
+def retention_horizon(days=None):
+    """Bookings that ended before this moment are eligible for archiving"""
+    if days is None:
+        days = getattr(settings, 'BOOKING_RETENTION_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(horizon):
+    # A pending booking still waits for a decision, however old it is
+    return Booking.objects.filter(end_time__lt=horizon).exclude(status='pending')
+
+
+@serialized_write
+def _archive_batch(ids):
+    rows = Booking.objects.filter(pk__in=ids).values(*ARCHIVED_FIELDS)
+    ArchivedBooking.objects.bulk_create(
+        [ArchivedBooking(**row) for row in rows],
+        ignore_conflicts=True
+    )
+    Booking.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_bookings(horizon, batch_size=1000):
+    """Move every booking that ended before horizon into the archive; yields batch sizes"""
+    last_pk = 0
+    while True:
+        ids = list(
+            archivable(horizon)
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield _archive_batch(ids)
+        last_pk = ids[-1]
+
+
+def booking_history(user=None, status=None, limit=None, site=None, before=None):
+    """
+    Bookings from the hot and archive tables, newest first.
+
+    Each side is fetched with its own indexed query and the two already
+    sorted streams are merged, so callers never see which table a row came from.
+    Archived rows keep their booking id, so (start_time, id) orders both tables
+    as one; ``before`` is such a pair from pagination.decode_keyset and
+    ``limit`` is applied to each table before merging.
+    """
+    querysets = []
+    for model in (Booking, ArchivedBooking):
+        queryset = model.objects.for_site(site).select_related('user', 'resource').order_by('-start_time', '-id')
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        if status:
+            queryset = queryset.filter(status=status)
+        if before is not None:
+            queryset = queryset.filter(before_keyset('start_time', before))
+        if limit is not None:
+            queryset = queryset[:limit]
+        querysets.append(queryset)
+
+    merged = heapq.merge(*querysets, key=lambda booking: (booking.start_time, booking.pk), reverse=True)
+    if limit is not None:
+        return [booking for _, booking in zip(range(limit), merged)]
+    return list(merged)
@@ -0,0 +1,201 @@
+"""
+Front-end asset storage and serving.
+
+``npm run build`` compiles assets/app.css into a purged Tailwind stylesheet
+and vendors Alpine.js, both under core_app/static/core_app/dist/.
+``collectstatic`` then copies every static file to STATIC_ROOT through
+``PrecompressedManifestStaticFilesStorage``, which adds a content hash to
+each name (app.css -> app.3f2a9c1e04b7.css) and writes a gzip variant next
+to it, plus a brotli one when the optional ``brotli`` package is installed.
+
+``StaticFiles`` serves STATIC_ROOT, through
+``core_app.middleware.StaticFilesMiddleware``, when Django itself faces the
+traffic. Hashed names are cached for a year as immutable. Each response is
+the smallest stored variant the client accepts, so nothing is compressed
+while serving requests. Set SERVE_STATIC=False when a web server or CDN
+serves STATIC_ROOT.
+
+Until the build has run, ``built()`` is False and base.html loads pinned
+Tailwind and Alpine releases from their CDNs instead, so a checkout without
+node still renders styled, interactive pages.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.checks import Tags, Warning, register
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUILT_ASSETS = ('core_app/dist/app.css', 'core_app/dist/alpine.min.js')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot')
+MIN_COMPRESS_SIZE = 256  # bytes; smaller files gain less than the header costs
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+
+# Content-Encoding -> file suffix, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+_built = False
+
+
+def built():
+    """Whether every built asset can be served; a True answer is kept for the process"""
+    global _built
+    if not _built:
+        # With a manifest, collectstatic decides what exists; without one, the finders do
+        hashed_files = getattr(staticfiles_storage, 'hashed_files', None)
+        if hashed_files:
+            _built = all(name in hashed_files for name in BUILT_ASSETS)
+        else:
+            _built = all(finders.find(name) for name in BUILT_ASSETS)
+    return _built
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Content-hashed static files with .gz/.br variants written at collectstatic time"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            for name in set(self.hashed_files.values()):
+                self.compress(name)
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', lambda: brotli.compress(data, quality=11)))
+        for suffix, compress in variants:
+            # A hashed name never changes content, so an existing variant is current
+            if os.path.exists(path + suffix):
+                continue
+            compressed = compress()
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+    def stored_name(self, name):
+        # No manifest means collectstatic has not run (development, tests);
+        # fall back to the plain name instead of failing every page
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+
+class StaticFile:
+    """One file under STATIC_ROOT and its precompressed variants"""
+
+    def __init__(self, name, path, immutable):
+        stat = os.stat(path)
+        self.name = name
+        self.path = path
+        self.size = stat.st_size
+        self.etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else MUTABLE_CACHE_CONTROL
+        self.variants = []
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants.append((encoding, path + suffix, os.path.getsize(path + suffix)))
+
+    def pick(self, accept_encoding):
+        """Return (encoding or None, path, size) for an Accept-Encoding header"""
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, path, size in self.variants:
+            if encoding in accepted:
+                return encoding, path, size
+        return None, self.path, self.size
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class StaticFiles:
+    """Lookup table of served files, filled on first request for each name"""
+
+    def __init__(self, root):
+        self.root = str(root)
+        self.files = {}
+        self._hashed_names = None
+
+    def hashed_names(self):
+        if self._hashed_names is None:
+            self._hashed_names = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        return self._hashed_names
+
+    def find(self, name):
+        static_file = self.files.get(name)
+        if static_file is None:
+            try:
+                path = safe_join(self.root, name)
+            except SuspiciousFileOperation:
+                return None
+            if not name or not os.path.isfile(path):
+                return None
+            static_file = self.files[name] = StaticFile(name, path, name in self.hashed_names())
+        return static_file
+
+    def serve(self, request, name):
+        static_file = self.find(name)
+        if static_file is None:
+            return HttpResponseNotFound()
+
+        encoding, path, size = static_file.pick(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = static_file.etag if encoding is None else f'{static_file.etag[:-1]}-{encoding}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+            response['Content-Length'] = size
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+            # FileResponse names the download after the .gz/.br file on disk
+            del response['Content-Disposition']
+        response['ETag'] = etag
+        response['Cache-Control'] = static_file.cache_control
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if static_file.variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+@register(Tags.staticfiles)
+def check_built_assets(app_configs, **kwargs):
+    missing = [name for name in BUILT_ASSETS if not finders.find(name)]
+    if not missing:
+        return []
+    return [Warning(
+        f'Front-end assets have not been built: {", ".join(missing)}.',
+        hint='Run "npm install && npm run build" before collectstatic. '
+             'Until then pages load Tailwind and Alpine from their CDNs.',
+        id='core_app.W001',
+    )]
@@ -0,0 +1,127 @@
+"""
+Audit trail of status transitions.
+
+``TRACKED_FIELDS`` lists the fields whose changes are recorded. Receivers
+in ``signals.py`` remember each field's loaded value on ``post_init`` and
+call ``record_changes`` on ``post_save``. Each change becomes an
+``AuditEntry`` naming the user of the current request (or of an ``actor``
+block) as the actor.
+
+Entries are not inserted one by one. An entry joins the buffer only once
+its transaction commits, so rolled-back changes leave no trace. The
+buffer is written with a single ``bulk_create`` when the request ends
+(``AuditMiddleware``) or when a ``buffered()`` block exits. Outside
+either, a committed entry is written right away.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import AuditEntry, Booking, LeaseContract, UserProfile
+
+TRACKED_FIELDS = {
+    Booking: ('status',),
+    LeaseContract: ('status',),
+    UserProfile: ('account_status',),
+}
+
+logger = logging.getLogger(__name__)
+
+_buffer = ContextVar('audit_buffer', default=None)
+_actor = ContextVar('audit_actor', default=None)
+
+
+def remember(instance):
+    """Keep the loaded values of the tracked fields; deferred fields are skipped"""
+    instance._audit_loaded = {
+        field: instance.__dict__[field]
+        for field in TRACKED_FIELDS[type(instance)]
+        if field in instance.__dict__
+    }
+
+
+def _actor_id():
+    actor = _actor.get()
+    # A request is resolved lazily so requests that change nothing never load the user
+    user = getattr(actor, 'user', actor)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+def record_changes(instance, created):
+    """Buffer an entry for every tracked field that changed in this save"""
+    loaded = getattr(instance, '_audit_loaded', {})
+    entries = []
+    for field in TRACKED_FIELDS[type(instance)]:
+        value = getattr(instance, field)
+        old = None if created else loaded.get(field, value)
+        if created or old != value:
+            entries.append(AuditEntry(
+                content_type=ContentType.objects.get_for_model(instance),
+                object_id=instance.pk,
+                field=field,
+                old_value=old or '',
+                new_value=value,
+                actor_id=_actor_id(),
+                created_at=timezone.now(),
+            ))
+        loaded[field] = value
+    instance._audit_loaded = loaded
+    if entries:
+        transaction.on_commit(lambda: _committed(entries))
+
+
+def _committed(entries):
+    buffer = _buffer.get()
+    if buffer is None:
+        AuditEntry.objects.bulk_create(entries)
+    else:
+        buffer.extend(entries)
+
+
+def flush():
+    """Write the buffered entries in one INSERT"""
+    buffer = _buffer.get()
+    if buffer:
+        try:
+            AuditEntry.objects.bulk_create(buffer)
+        except DatabaseError:
+            # The audited changes are already committed; don't fail the request over it
+            logger.exception('Could not write %d audit entries: %s', len(buffer), buffer)
+        buffer.clear()
+
+
+@contextmanager
+def buffered():
+    """Collect committed entries and write them in one bulk_create on exit"""
+    token = _buffer.set([])
+    try:
+        yield
+    finally:
+        try:
+            flush()
+        finally:
+            _buffer.reset(token)
+
+
+@contextmanager
+def actor(user_or_request):
+    """Attribute changes made in this block to a user, or to a request's user"""
+    token = _actor.set(user_or_request)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def history(obj, model=None, limit=200):
+    """Newest-first audit entries for one object; model overrides its type (archived bookings)"""
+    return (AuditEntry.objects
+            .filter(content_type=ContentType.objects.get_for_model(model or obj), object_id=obj.pk)
+            .select_related('actor')
+            .order_by('-created_at', '-id')[:limit])
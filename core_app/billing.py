@@ -0,0 +1,165 @@
+"""
+Monthly billing runs.
+
+``run_billing(period)`` invoices every lease active during the period and
+renews (and invoices) every subscription that expires in it. Contracts are
+streamed in PK order, ``chunk_size`` at a time, and each chunk is written
+with ``bulk_create`` in its own short transaction together with the run's
+checkpoint (``BillingRun.last_lease_id`` / ``last_subscription_id``).
+
+A crashed run resumes after the last committed chunk. Re-running a chunk is
+harmless anyway: invoices are unique per (lease, period) and
+(subscription, period), and a subscription can only be renewed once.
+"""
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import entitlements
+from .db import serialized_write
+from .models import BillingRun, Invoice, LeaseContract, Subscription
+
+ZERO = Decimal('0.00')
+
+
+def parse_period(period):
+    """Return (first_day, last_day) for a 'YYYY-MM' period"""
+    try:
+        year, month = (int(part) for part in period.split('-'))
+        first_day = date(year, month, 1)
+    except ValueError:
+        raise ValueError(f"Invalid billing period {period!r}, expected YYYY-MM")
+    return first_day, first_day.replace(day=calendar.monthrange(year, month)[1])
+
+
+def _due_date(first_day):
+    return first_day + timedelta(days=getattr(settings, 'INVOICE_DUE_DAYS', 14))
+
+
+def lease_invoice(lease, period, first_day, last_day):
+    """Build an unsaved invoice for one lease row (a values() dict)"""
+    line_items = [{
+        'description': f"Rent {period}",
+        'amount': str(lease['monthly_rent']),
+    }]
+    total = lease['monthly_rent']
+    if first_day <= lease['start_date'] <= last_day and lease['deposit_amount']:
+        line_items.append({'description': 'Security deposit', 'amount': str(lease['deposit_amount'])})
+        total += lease['deposit_amount']
+    return Invoice(
+        user_id=lease['user_id'],
+        period=period,
+        lease_id=lease['id'],
+        line_items=line_items,
+        total=total,
+        due_date=_due_date(first_day),
+    )
+
+
+def renewal(subscription):
+    """Build the unsaved follow-on subscription for one subscription row"""
+    start_date = subscription['end_date'] + timedelta(days=1)
+    return Subscription(
+        user_id=subscription['user_id'],
+        plan_id=subscription['plan_id'],
+        start_date=start_date,
+        end_date=start_date + timedelta(days=subscription['plan__duration_days']),
+        renewed_from_id=subscription['id'],
+    )
+
+
+def renewal_invoice(subscription, period, first_day):
+    return Invoice(
+        user_id=subscription['user_id'],
+        period=period,
+        subscription_id=subscription['id'],
+        line_items=[{
+            'description': f"{subscription['plan__name']} renewal",
+            'amount': str(subscription['plan__price']),
+        }],
+        total=subscription['plan__price'] or ZERO,
+        due_date=_due_date(first_day),
+    )
+
+
+def _chunks(queryset, fields, last_pk, chunk_size):
+    """Yield lists of values() rows in PK order, starting after last_pk"""
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values(*fields)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1]['id']
+
+
+@serialized_write
+def _commit_leases(run, invoices, last_pk, count):
+    Invoice.objects.bulk_create(invoices, ignore_conflicts=True)
+    BillingRun.objects.filter(pk=run.pk).update(last_lease_id=last_pk, leases_processed=run.leases_processed + count)
+    run.last_lease_id = last_pk
+    run.leases_processed += count
+
+
+@serialized_write
+def _commit_renewals(run, renewals, invoices, last_pk, count):
+    Subscription.objects.bulk_create(renewals, ignore_conflicts=True)
+    Invoice.objects.bulk_create(invoices, ignore_conflicts=True)
+    BillingRun.objects.filter(pk=run.pk).update(
+        last_subscription_id=last_pk, subscriptions_processed=run.subscriptions_processed + count
+    )
+    run.last_subscription_id = last_pk
+    run.subscriptions_processed += count
+    # bulk_create skips post_save, so invalidate the whole batch at once
+    transaction.on_commit(
+        lambda: entitlements.invalidate_many_user_entitlements(r.user_id for r in renewals)
+    )
+
+
+def run_billing(period, chunk_size=1000, restart=False, progress=None):
+    """Bill one period, resuming from the last checkpoint; returns the BillingRun"""
+    first_day, last_day = parse_period(period)
+    run, created = BillingRun.objects.get_or_create(period=period)
+    if run.status == 'completed' and not restart:
+        return run
+    if restart:
+        run.status = 'running'
+        run.last_lease_id = run.last_subscription_id = 0
+        run.leases_processed = run.subscriptions_processed = 0
+        run.finished_at = None
+        run.save()
+
+    leases = LeaseContract.objects.filter(
+        status='active',
+        start_date__lte=last_day,
+        end_date__gte=first_day
+    )
+    lease_fields = ('id', 'user_id', 'start_date', 'monthly_rent', 'deposit_amount')
+    for rows in _chunks(leases, lease_fields, run.last_lease_id, chunk_size):
+        invoices = [lease_invoice(row, period, first_day, last_day) for row in rows]
+        _commit_leases(run, invoices, rows[-1]['id'], len(rows))
+        if progress:
+            progress('leases', run.leases_processed)
+
+    expiring = Subscription.objects.filter(
+        is_active=True,
+        plan__is_active=True,
+        end_date__gte=first_day,
+        end_date__lte=last_day
+    )
+    subscription_fields = ('id', 'user_id', 'plan_id', 'end_date', 'plan__name', 'plan__price',
+                           'plan__duration_days')
+    for rows in _chunks(expiring, subscription_fields, run.last_subscription_id, chunk_size):
+        renewals = [renewal(row) for row in rows]
+        invoices = [renewal_invoice(row, period, first_day) for row in rows]
+        _commit_renewals(run, renewals, invoices, rows[-1]['id'], len(rows))
+        if progress:
+            progress('subscriptions', run.subscriptions_processed)
+
+    run.status = 'completed'
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'finished_at'])
+    return run
@@ -0,0 +1,257 @@
+"""
+Bulk import of the resource catalog.
+
+A catalog is a CSV file with a header row, or JSON Lines with one object
+per line. Rows are matched to resources by ``external_key``: a known key
+updates that resource, an unknown key creates one. Columns left out of a
+file keep the resource's current values, so a file with only
+``external_key,price_per_hour`` is a price change. Sites are given by slug.
+
+``plan`` validates every row with ``ResourceImportForm`` (the rules of
+``ResourceForm``) and diffs it against the database without writing. The
+file costs one query for the keys and one for the sites. ``apply`` writes
+a plan with ``bulk_create`` and ``bulk_update``, one serialized transaction
+per batch. Side effects that signals would run per row happen once per
+batch: the facet cache is bumped, and bookings follow resources that
+moved site.
+"""
+import csv
+import hashlib
+import io
+import json
+from itertools import islice
+from pathlib import PurePath
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import facets
+from .db import serialized_write
+from .forms import ResourceImportForm
+from .models import ArchivedBooking, Booking, Location, Resource
+
+COLUMNS = tuple(ResourceImportForm.Meta.fields)
+FIELDS = tuple(column for column in COLUMNS if column != 'external_key')
+ATTNAMES = {field: Resource._meta.get_field(field).attname for field in FIELDS}
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+KEY_BATCH = 500
+
+
+class CatalogError(Exception):
+    """The file as a whole cannot be read"""
+
+
+class Change:
+    def __init__(self, line, key, resource, changes=None):
+        self.line = line
+        self.key = key
+        self.resource = resource
+        # {field: (old, new)} for updates, as shown in the preview
+        self.changes = changes or {}
+
+
+class Plan:
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+        self.unchanged = 0
+        self.errors = []  # (line, key, [messages])
+
+    @property
+    def is_valid(self):
+        return not self.errors
+
+    @property
+    def has_changes(self):
+        return bool(self.creates or self.updates)
+
+    def fingerprint(self):
+        """Digest of the planned writes, to check that an applied plan is the one previewed"""
+        digest = hashlib.sha256()
+        for change in self.creates:
+            digest.update(repr(('create', change.key, [getattr(change.resource, f) for f in FIELDS])).encode())
+        for change in self.updates:
+            digest.update(repr(('update', change.key, sorted(change.changes.items()))).encode())
+        return digest.hexdigest()
+
+
+def _batched(items, size):
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _clean_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value).strip()
+
+
+def _check_columns(columns):
+    unknown = sorted(set(columns) - set(COLUMNS))
+    if unknown:
+        raise CatalogError(f'Unknown columns: {", ".join(unknown)}. Allowed: {", ".join(COLUMNS)}')
+    if 'external_key' not in columns:
+        raise CatalogError('The external_key column is required')
+
+
+def decode(data):
+    """Text of an uploaded catalog"""
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise CatalogError('The file is not UTF-8 text')
+
+
+def read_rows(text, name):
+    """Return [(line, {column: value})] from the text of a CSV or JSON Lines catalog"""
+    file_format = FORMATS.get(PurePath(name).suffix.lower())
+    if file_format is None:
+        raise CatalogError(f'Unsupported file type "{name}"; upload a .csv or .jsonl file')
+    stream = io.StringIO(text, newline='')
+    rows = _read_csv(stream) if file_format == 'csv' else _read_jsonl(stream)
+    max_rows = getattr(settings, 'RESOURCE_IMPORT_MAX_ROWS', 5000)
+    rows = list(islice(rows, max_rows + 1))
+    if len(rows) > max_rows:
+        raise CatalogError(f'The file has more than {max_rows} rows; split it up')
+    return rows
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(stream)
+    columns = [column.strip() for column in reader.fieldnames or ()]
+    _check_columns(columns)
+    reader.fieldnames = columns
+    for row in reader:
+        if None in row:
+            raise CatalogError(f'Line {reader.line_num}: more values than columns')
+        if any(value for value in row.values()):
+            yield reader.line_num, {column: _clean_value(value) for column, value in row.items()}
+
+
+def _read_jsonl(stream):
+    for line, raw in enumerate(stream, start=1):
+        if not raw.strip():
+            continue
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            raise CatalogError(f'Line {line}: invalid JSON ({e})')
+        if not isinstance(row, dict):
+            raise CatalogError(f'Line {line}: expected a JSON object')
+        _check_columns(row)
+        yield line, {column: _clean_value(value) for column, value in row.items()}
+
+
+def _form_data(resource, slugs):
+    """A resource's current (or default) values as form data, for columns a row leaves out"""
+    data = {field: _clean_value(getattr(resource, field)) for field in FIELDS if field != 'site'}
+    data['site'] = slugs.get(resource.site_id, '')
+    return data
+
+
+def _display(field, value, slugs):
+    if field == 'site':
+        return slugs.get(value, '')
+    return _clean_value(value)
+
+
+def plan(rows):
+    """Validate and diff catalog rows against the database; nothing is written"""
+    result = Plan()
+    keys = {row.get('external_key', '') for line, row in rows} - {''}
+    existing = {}
+    for batch in _batched(sorted(keys), KEY_BATCH):
+        existing.update((resource.external_key, resource)
+                        for resource in Resource.objects.filter(external_key__in=batch))
+    locations = list(Location.objects.all())
+    sites = {site.slug: site for site in locations}
+    slugs = {site.pk: site.slug for site in locations}
+
+    seen = set()
+    for line, row in rows:
+        key = row.get('external_key', '')
+        if not key:
+            result.errors.append((line, key, ['external_key: This field is required.']))
+            continue
+        if key in seen:
+            result.errors.append((line, key, ['external_key: Appears more than once in the file.']))
+            continue
+        seen.add(key)
+
+        resource = existing.get(key)
+        # New resources start from the model defaults, like the create form
+        instance = resource or Resource()
+        data = _form_data(instance, slugs)
+        data.update(row)
+        before = {field: getattr(instance, ATTNAMES[field]) for field in FIELDS}
+        form = ResourceImportForm(data, instance=instance, sites=sites)
+        if not form.is_valid():
+            result.errors.append((line, key, [
+                f'{field}: {message}' if field != '__all__' else message
+                for field, messages in form.errors.items() for message in messages
+            ]))
+            continue
+
+        if resource is None:
+            result.creates.append(Change(line, key, instance))
+            continue
+        changes = {}
+        for field in FIELDS:
+            new = getattr(resource, ATTNAMES[field])
+            if new != before[field]:
+                changes[field] = (_display(field, before[field], slugs), _display(field, new, slugs))
+        if changes:
+            result.updates.append(Change(line, key, resource, changes))
+        else:
+            result.unchanged += 1
+    return result
+
+
+@serialized_write
+def _create_batch(changes):
+    Resource.objects.bulk_create([change.resource for change in changes])
+
+
+@serialized_write
+def _update_batch(changes):
+    now = timezone.now()
+    by_fields = {}
+    for change in changes:
+        change.resource.updated_at = now
+        by_fields.setdefault(tuple(sorted(change.changes)), []).append(change.resource)
+    # Write only the columns that changed, so concurrent edits to other fields survive
+    for fields, resources in by_fields.items():
+        Resource.objects.bulk_update(resources, fields + ('updated_at',))
+
+    # Bookings carry a copy of their resource's site (see signals.move_resource_bookings)
+    moved = {}
+    for change in changes:
+        if 'site' in change.changes:
+            moved.setdefault(change.resource.site_id, []).append(change.resource.pk)
+    for site_id, resource_ids in moved.items():
+        Booking.objects.filter(resource_id__in=resource_ids).update(site=site_id)
+        ArchivedBooking.objects.filter(resource_id__in=resource_ids).update(site=site_id)
+
+
+def apply(plan, batch_size=None, progress=None):
+    """Write a valid plan in batches; returns (created, updated)"""
+    if not plan.is_valid:
+        raise ValueError('Cannot apply a catalog plan with errors')
+    batch_size = batch_size or getattr(settings, 'RESOURCE_IMPORT_BATCH_SIZE', 500)
+    created = updated = 0
+    for batch in _batched(plan.creates, batch_size):
+        _create_batch(batch)
+        facets.bump_version()
+        created += len(batch)
+        if progress is not None:
+            progress('created', created)
+    for batch in _batched(plan.updates, batch_size):
+        _update_batch(batch)
+        facets.bump_version()
+        updated += len(batch)
+        if progress is not None:
+            progress('updated', updated)
+    return created, updated
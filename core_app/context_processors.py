@@ -0,0 +1,17 @@
+from . import assets, sites
+
+
+def site_switcher(request):
+    """Expose the site list and the user's current site to every template"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'sites': sites.active_sites(),
+        'current_site': sites.current_site(user),
+    }
+
+
+def built_assets(request):
+    """Tell base.html whether to load the built assets or the CDN fallback"""
+    return {'assets_built': assets.built()}
@@ -0,0 +1,60 @@
+"""
+Serialized write path.
+
+SQLite allows a single writer at a time. Funnelling writes from one process
+through a lock, inside a transaction, and retrying on "database is locked"
+with exponential backoff turns lock errors under concurrent booking
+submissions into short queueing delays. On other databases, or when
+``SQLITE_SERIALIZE_WRITES`` is off, only the transaction and retry apply.
+"""
+import random
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+_write_lock = threading.RLock()
+
+
+def is_lock_error(exc):
+    """Check whether an OperationalError is SQLite lock contention"""
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def _write_guard(using):
+    if connections[using].vendor == 'sqlite' and getattr(settings, 'SQLITE_SERIALIZE_WRITES', False):
+        return _write_lock
+    return nullcontext()
+
+
+def serialized_write(func=None, *, using=DEFAULT_DB_ALIAS):
+    """
+    Run func in a write transaction, serialized per process, retrying on
+    lock contention. Usable as a decorator or as serialized_write(callable)().
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Inside an outer transaction we cannot retry, so just join it
+            if connections[using].in_atomic_block:
+                return func(*args, **kwargs)
+
+            attempts = getattr(settings, 'WRITE_RETRY_ATTEMPTS', 5)
+            backoff = getattr(settings, 'WRITE_RETRY_BACKOFF', 0.05)
+            for attempt in range(attempts + 1):
+                try:
+                    with _write_guard(using), transaction.atomic(using=using):
+                        return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if attempt == attempts or not is_lock_error(exc):
+                        raise
+                time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+        return wrapper
+
+    if func is None:
+        return decorator
+    return decorator(func)
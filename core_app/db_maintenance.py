@@ -0,0 +1,225 @@
+"""
+SQLite backups and housekeeping for ``manage.py db_maintenance``.
+
+``backup`` copies the live database with SQLite's online backup API. In
+rollback-journal mode each step copies ``DB_BACKUP_STEP_PAGES`` pages
+under a read lock that blocks commits, and the pause between steps lets
+waiting writers through. A write from another connection restarts the
+copy from the first page, so the finished file is always a consistent
+snapshot; after ``DB_BACKUP_MAX_RESTARTS`` restarts the copy is finished
+in a single step, so a busy database still gets backed up. In WAL mode
+readers never block writers but every write still restarts a stepped
+copy, so the copy is taken in a single step from the start.
+
+The copy is written to a ``.partial`` file and checked with ``PRAGMA
+integrity_check``. It gets its final name only if the check passes, and
+only then are the oldest backups rotated away.
+
+``optimize`` refreshes planner statistics, ``incremental_vacuum`` returns
+free pages to the filesystem, and ``table_sizes`` reports the space used
+by each table and index.
+"""
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.utils import timezone
+
+BACKUP_SUFFIX = '.sqlite3'
+PARTIAL_SUFFIX = '.partial'
+
+
+class MaintenanceError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def database_path(using='default'):
+    """Path of the SQLite database behind an alias; raises MaintenanceError otherwise"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        raise MaintenanceError(f'Database "{using}" is {connection.vendor}, not SQLite; use its own backup tools')
+    name = str(connection.settings_dict['NAME'])
+    if connection.is_in_memory_db():
+        raise MaintenanceError(f'Database "{using}" is in memory and cannot be backed up')
+    return Path(name)
+
+
+def backup_dir():
+    return Path(getattr(settings, 'DB_BACKUP_DIR', '') or Path(settings.BASE_DIR) / 'backups')
+
+
+def backups(directory, stem):
+    """Finished backups of ``stem``, newest first"""
+    pattern = re.compile(rf'^{re.escape(stem)}-\d{{8}}-\d{{6}}{re.escape(BACKUP_SUFFIX)}$')
+    return sorted((path for path in Path(directory).glob(f'{stem}-*{BACKUP_SUFFIX}') if pattern.match(path.name)),
+                  reverse=True)
+
+
+def _connect(path):
+    timeout = getattr(settings, 'SQLITE_BUSY_TIMEOUT', 20)
+    return sqlite3.connect(path, timeout=timeout, isolation_level=None)
+
+
+def verify(path, quick=False):
+    """Run integrity_check (or quick_check) on a database file; returns the problems found"""
+    connection = _connect(path)
+    try:
+        rows = connection.execute('PRAGMA quick_check' if quick else 'PRAGMA integrity_check').fetchall()
+    finally:
+        connection.close()
+    problems = [row[0] for row in rows]
+    return [] if problems == ['ok'] else problems
+
+
+def backup(directory=None, keep=None, step_pages=None, step_pause=None, quick_check=False,
+           using='default', progress=None):
+    """
+    Copy the live database into ``directory`` and keep the newest ``keep`` backups.
+
+    Returns a dict with the backup path, its size, the pages copied, the
+    steps taken, the number of restarts, whether the copy had to finish in
+    a single step, and the elapsed seconds.
+    """
+    source_path = database_path(using)
+    directory = Path(directory or backup_dir())
+    keep = getattr(settings, 'DB_BACKUP_KEEP', 7) if keep is None else keep
+    step_pages = step_pages or getattr(settings, 'DB_BACKUP_STEP_PAGES', 256)
+    step_pause = getattr(settings, 'DB_BACKUP_STEP_PAUSE', 0.01) if step_pause is None else step_pause
+    max_restarts = getattr(settings, 'DB_BACKUP_MAX_RESTARTS', 3)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    stem = source_path.stem
+    target = directory / f'{stem}-{timezone.now():%Y%m%d-%H%M%S}{BACKUP_SUFFIX}'
+    partial = target.with_name(target.name + PARTIAL_SUFFIX)
+    state = {'remaining': None, 'restarts': 0, 'steps': 0, 'single_step': False}
+
+    def step(status, remaining, total):
+        # A step that succeeds without progress means a write restarted the copy
+        if status == sqlite3.SQLITE_OK and state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts and not state['single_step']:
+                raise _TooManyRestarts
+        state['remaining'] = remaining
+        state['steps'] += 1
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining and step_pause:
+            time.sleep(step_pause)
+
+    started = time.perf_counter()
+    source = _connect(source_path)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            state['single_step'] = True
+        destination = sqlite3.connect(partial, isolation_level=None)
+        try:
+            try:
+                source.backup(destination, pages=-1 if state['single_step'] else step_pages, progress=step)
+            except _TooManyRestarts:
+                # Writes keep invalidating the copy; take it in one read transaction instead
+                state['single_step'] = True
+                source.backup(destination, pages=-1, progress=step)
+            # The copy inherits WAL mode; a standalone file should not need -wal/-shm files
+            destination.execute('PRAGMA journal_mode=DELETE')
+            pages = destination.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            destination.close()
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        source.close()
+
+    problems = verify(partial, quick=quick_check)
+    if problems:
+        partial.rename(partial.with_name(partial.name + '.corrupt'))
+        raise MaintenanceError(f'Backup {target.name} failed verification: {"; ".join(problems[:5])}')
+    os.replace(partial, target)
+
+    removed = []
+    if keep > 0:
+        for old in backups(directory, stem)[keep:]:
+            old.unlink()
+            removed.append(old)
+
+    return {
+        'path': target,
+        'bytes': target.stat().st_size,
+        'pages': pages,
+        'steps': state['steps'],
+        'restarts': state['restarts'],
+        'single_step': state['single_step'],
+        'removed': removed,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def optimize(full=False, using='default'):
+    """Refresh planner statistics: PRAGMA optimize, or a full ANALYZE"""
+    database_path(using)
+    with connections[using].cursor() as cursor:
+        # optimize only re-analyzes tables whose statistics are stale, so it is cheap to run often
+        cursor.execute('ANALYZE' if full else 'PRAGMA optimize')
+
+
+def auto_vacuum_mode(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        return {0: 'none', 1: 'full', 2: 'incremental'}[cursor.fetchone()[0]]
+
+
+def freelist_pages(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA freelist_count')
+        return cursor.fetchone()[0]
+
+
+def enable_incremental_vacuum(using='default'):
+    """Switch the file to auto_vacuum=INCREMENTAL; this rewrites it with a full VACUUM"""
+    database_path(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('VACUUM')
+
+
+def incremental_vacuum(pages=None, using='default'):
+    """Release up to ``pages`` free pages (all when None); returns the pages released"""
+    database_path(using)
+    if auto_vacuum_mode(using) != 'incremental':
+        raise MaintenanceError(
+            'auto_vacuum is not INCREMENTAL; run "db_maintenance vacuum --enable-incremental" '
+            'once, off-peak (it rewrites the whole file)'
+        )
+    before = freelist_pages(using)
+    connection = connections[using]
+    connection.ensure_connection()
+    # The pragma frees one page per step, but execute() steps a statement without
+    # result columns only once; executescript() runs it to the end
+    connection.connection.executescript(
+        f'PRAGMA incremental_vacuum({int(pages)})' if pages else 'PRAGMA incremental_vacuum'
+    )
+    return before - freelist_pages(using)
+
+
+def table_sizes(using='default'):
+    """(name, table it belongs to, bytes) for every table and index, largest first"""
+    database_path(using)
+    with connections[using].cursor() as cursor:
+        try:
+            cursor.execute('SELECT 1 FROM dbstat LIMIT 1')
+        except OperationalError:
+            raise MaintenanceError('This SQLite build has no dbstat table (SQLITE_ENABLE_DBSTAT_VTAB)')
+        cursor.execute(
+            'SELECT stat.name, master.tbl_name, SUM(stat.pgsize) AS size '
+            'FROM dbstat AS stat LEFT JOIN sqlite_master AS master ON master.name = stat.name '
+            'GROUP BY stat.name ORDER BY size DESC'
+        )
+        return [(name, table or name, size) for name, table, size in cursor.fetchall()]
@@ -0,0 +1,127 @@
+"""
+Membership entitlements.
+
+Maps ``MembershipPlan.access_level`` onto the ``Resource.type`` values a
+member may book. The plan matrix ({plan_id: resource types}) is held in
+process memory and reloaded only when its version key in the cache is
+bumped; each user's active subscriptions are cached separately. Both are
+invalidated from ``signals.py`` when a plan or subscription changes.
+"""
+import threading
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import MembershipPlan, Resource, Subscription, UserProfile
+
+ACCESS_MATRIX = {
+    'desk': frozenset({'desk'}),
+    'desk_room': frozenset({'desk', 'meeting_room'}),
+    'all': frozenset({'desk', 'meeting_room', 'office'}),
+}
+
+ALL_RESOURCE_TYPES = frozenset(value for value, _ in Resource.RESOURCE_TYPES)
+UNRESTRICTED_ROLES = ('staff', 'admin')
+
+MATRIX_VERSION_KEY = 'entitlements:matrix_version'
+USER_CACHE_KEY = 'entitlements:user:{}'
+USER_CACHE_TIMEOUT = 60 * 15
+
+_matrix_lock = threading.Lock()
+_plan_matrix = None
+_plan_matrix_version = None
+
+
+def get_plan_matrix():
+    """Return {plan_id: frozenset(resource types)}, reloading if stale"""
+    global _plan_matrix, _plan_matrix_version
+    version = cache.get(MATRIX_VERSION_KEY, 0)
+    if _plan_matrix is not None and _plan_matrix_version == version:
+        return _plan_matrix
+
+    with _matrix_lock:
+        if _plan_matrix is None or _plan_matrix_version != version:
+            _plan_matrix = {
+                plan_id: ACCESS_MATRIX.get(access_level, frozenset())
+                for plan_id, access_level in MembershipPlan.objects.values_list('id', 'access_level')
+            }
+            _plan_matrix_version = version
+    return _plan_matrix
+
+
+def get_user_subscriptions(user_id):
+    """Return cached (plan_id, start_date, end_date) tuples for a user's live subscriptions"""
+    key = USER_CACHE_KEY.format(user_id)
+    subscriptions = cache.get(key)
+    if subscriptions is None:
+        subscriptions = list(Subscription.objects.filter(
+            user_id=user_id,
+            is_active=True,
+            end_date__gte=timezone.now().date()
+        ).values_list('plan_id', 'start_date', 'end_date'))
+        cache.set(key, subscriptions, USER_CACHE_TIMEOUT)
+    return subscriptions
+
+
+def allowed_resource_types(user):
+    """Return the resource types a user may book right now"""
+    if not user.is_authenticated:
+        return frozenset()
+
+    # Memoize on the user object so a request pays for the lookup once
+    cached = getattr(user, '_entitled_resource_types', None)
+    if cached is not None:
+        return cached
+
+    try:
+        role = user.userprofile.role
+    except UserProfile.DoesNotExist:
+        role = None
+
+    if role in UNRESTRICTED_ROLES:
+        types = ALL_RESOURCE_TYPES
+    else:
+        today = timezone.now().date()
+        matrix = get_plan_matrix()
+        types = frozenset().union(*(
+            matrix.get(plan_id, frozenset())
+            for plan_id, start_date, end_date in get_user_subscriptions(user.pk)
+            if start_date <= today <= end_date
+        ))
+
+    user._entitled_resource_types = types
+    return types
+
+
+def is_entitled(user, resource):
+    """Check whether the user's membership covers the given resource"""
+    return resource.type in allowed_resource_types(user)
+
+
+def filter_resources(queryset, user):
+    """Narrow a Resource queryset to the types the user is entitled to"""
+    types = allowed_resource_types(user)
+    if types == ALL_RESOURCE_TYPES:
+        return queryset
+    return queryset.filter(type__in=types)
+
+
+def invalidate_plan_matrix():
+    """Force every process to reload the plan matrix on next use"""
+    global _plan_matrix
+    if not cache.add(MATRIX_VERSION_KEY, 1, None):
+        try:
+            cache.incr(MATRIX_VERSION_KEY)
+        except ValueError:
+            cache.set(MATRIX_VERSION_KEY, 1, None)
+    _plan_matrix = None
+
+
+def invalidate_user_entitlements(user_id):
+    """Drop the cached subscriptions for a single user"""
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+def invalidate_many_user_entitlements(user_ids):
+    """Drop cached subscriptions for many users in one cache round trip"""
+    cache.delete_many([USER_CACHE_KEY.format(user_id) for user_id in set(user_ids)])
@@ -0,0 +1,124 @@
+"""
+Faceted resource browsing.
+
+Facet counts for type, status, capacity band, site and price band are
+computed in a single conditional aggregate over the resources the user may
+see. Each facet's counts apply every *other* selected facet, so picking a
+type still shows how many resources each status would leave. The result is
+cached per (scope, selection) under a version key that ``signals.py`` bumps
+whenever a resource or site changes.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import sites
+from .models import Resource
+
+VERSION_CACHE_KEY = 'facets:resources:version'
+FACET_CACHE_TIMEOUT = 60 * 15
+
+# (value, label, lower bound inclusive, upper bound exclusive)
+CAPACITY_BANDS = (
+    ('1', '1 person', 1, 2),
+    ('2-4', '2-4 people', 2, 5),
+    ('5-10', '5-10 people', 5, 11),
+    ('11+', '11+ people', 11, None),
+)
+PRICE_BANDS = (
+    ('under-10', 'Under $10/hr', None, 10),
+    ('10-25', '$10-25/hr', 10, 25),
+    ('25-50', '$25-50/hr', 25, 50),
+    ('50+', '$50+/hr', 50, None),
+)
+
+
+def _band_q(field, lower, upper):
+    q = Q()
+    if lower is not None:
+        q &= Q(**{f'{field}__gte': lower})
+    if upper is not None:
+        q &= Q(**{f'{field}__lt': upper})
+    return q
+
+
+def facet_options():
+    """Return {facet: [(value, label, Q)]} for every facet"""
+    return {
+        'type': [(value, label, Q(type=value)) for value, label in Resource.RESOURCE_TYPES],
+        'status': [(value, label, Q(status=value)) for value, label in Resource.STATUS_CHOICES],
+        'capacity': [(value, label, _band_q('capacity', lower, upper))
+                     for value, label, lower, upper in CAPACITY_BANDS],
+        'site': [(str(site.pk), site.name, Q(site_id=site.pk)) for site in sites.active_sites()],
+        'price': [(value, label, _band_q('price_per_hour', lower, upper))
+                  for value, label, lower, upper in PRICE_BANDS],
+    }
+
+
+def selection(params, options=None):
+    """Pick the valid facet values out of request parameters"""
+    options = options or facet_options()
+    selected = {}
+    for facet, choices in options.items():
+        value = params.get(facet)
+        if value and any(value == choice[0] for choice in choices):
+            selected[facet] = value
+    return selected
+
+
+def _filter_q(options, selected, skip=None):
+    q = Q()
+    for facet, value in selected.items():
+        if facet != skip:
+            q &= next(choice[2] for choice in options[facet] if choice[0] == value)
+    return q
+
+
+def filter_resources(queryset, selected, options=None):
+    """Apply the selected facets to a Resource queryset"""
+    return queryset.filter(_filter_q(options or facet_options(), selected))
+
+
+def get_version():
+    return cache.get_or_set(VERSION_CACHE_KEY, 1, None)
+
+
+def bump_version():
+    """Invalidate every cached facet count"""
+    if not cache.add(VERSION_CACHE_KEY, 2, None):
+        try:
+            cache.incr(VERSION_CACHE_KEY)
+        except ValueError:
+            cache.set(VERSION_CACHE_KEY, 2, None)
+
+
+def facet_counts(queryset, selected, scope_key, options=None):
+    """
+    Return ({facet: {value: count}}, total) for a scoped Resource queryset.
+
+    scope_key must identify everything that narrowed the queryset before
+    faceting (entitlements, current site), since it is part of the cache key.
+    """
+    options = options or facet_options()
+    raw_key = f'{scope_key}|' + '|'.join(f'{k}={v}' for k, v in sorted(selected.items()))
+    key = f'facets:resources:{get_version()}:{hashlib.md5(raw_key.encode()).hexdigest()}'
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    matching = _filter_q(options, selected)
+    aggregates = {'total': Count('pk', filter=matching) if matching else Count('pk')}
+    for facet, choices in options.items():
+        others = _filter_q(options, selected, skip=facet)
+        for index, (value, label, q) in enumerate(choices):
+            aggregates[f'{facet}__{index}'] = Count('pk', filter=q & others)
+    row = queryset.aggregate(**aggregates)
+
+    counts = {
+        facet: {value: row[f'{facet}__{index}'] for index, (value, label, q) in enumerate(choices)}
+        for facet, choices in options.items()
+    }
+    result = (counts, row['total'])
+    cache.set(key, result, FACET_CACHE_TIMEOUT)
+    return result
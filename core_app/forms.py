@@ -1,8 +1,9 @@
 from django import forms
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
-from .models import Resource, Booking, LeaseContract, MembershipPlan, Subscription
+from .models import Location, Resource, Booking, LeaseContract, MembershipPlan, Subscription, UserProfile, WaitlistEntry
 from django.utils import timezone
+from . import metrics, occupancy
 
 class CustomUserCreationForm(UserCreationForm):
     username = forms.CharField(
@@ -28,16 +29,57 @@ class CustomUserCreationForm(UserCreationForm):
         model = User
         fields = ('username', 'password1', 'password2')
 
+class LoginForm(AuthenticationForm):
+    suspended = False
+
+    def confirm_login_allowed(self, user):
+        super().confirm_login_allowed(user)
+        if UserProfile.objects.filter(user=user, account_status='suspended').exists():
+            self.suspended = True
+            raise forms.ValidationError("This account has been suspended.", code='suspended')
+
 class ResourceForm(forms.ModelForm):
+    site = forms.ModelChoiceField(queryset=Location.objects.filter(is_active=True), required=False)
+
     class Meta:
         model = Resource
-        fields = ['name', 'type', 'description', 'capacity', 'location', 
-                 'amenities', 'price_per_hour', 'monthly_price', 'status']
+        fields = ['name', 'type', 'description', 'capacity', 'site', 'location', 
+                 'amenities', 'price_per_hour', 'monthly_price', 'status', 'external_key']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3}),
             'amenities': forms.Textarea(attrs={'rows': 3}),
         }
 
+class ResourceImportForm(ResourceForm):
+    """ResourceForm for one catalog row; the site is a slug looked up in a preloaded map"""
+    site = forms.CharField(required=False)
+    external_key = forms.CharField(max_length=64)
+
+    def __init__(self, *args, sites=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sites = sites or {}
+
+    def clean_site(self):
+        slug = self.cleaned_data['site'].strip()
+        if not slug:
+            return None
+        site = self.sites.get(slug)
+        # Like ResourceForm, only active sites can be chosen, but a resource may stay where it is
+        if site is None or (not site.is_active and site.pk != self.instance.site_id):
+            raise forms.ValidationError(f'Unknown or inactive site "{slug}"')
+        return site
+
+    def _get_validation_exclusions(self):
+        # clean_site already resolved the site; don't query for it again on every row
+        return super()._get_validation_exclusions() | {'site'}
+
+    def validate_unique(self):
+        # core_app.catalog matches keys against the catalog in one query per file
+        pass
+
+class CatalogUploadForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, or JSON Lines (.jsonl)')
+
 class BookingForm(forms.ModelForm):
     class Meta:
         model = Booking
@@ -60,16 +102,17 @@ class BookingForm(forms.ModelForm):
             if end_time <= start_time:
                 raise forms.ValidationError("End time must be after start time")
             
-            # Check for booking conflicts
+            # Check approved bookings, leases and maintenance in one lookup
             if resource:
-                conflicts = Booking.objects.filter(
-                    resource=resource,
-                    status='approved',
-                    start_time__lt=end_time,
-                    end_time__gt=start_time
-                )
+                conflicts = occupancy.conflicts(resource, start_time, end_time, booking=self.instance)
                 if conflicts.exists():
-                    raise forms.ValidationError("This time slot is already booked")
+                    metrics.inc('spaceflow_booking_conflicts_total')
+                    raise forms.ValidationError("This time slot is already booked", code='conflict')
+
+class WaitlistForm(forms.ModelForm):
+    class Meta:
+        model = WaitlistEntry
+        fields = ['start_time', 'end_time', 'notes']
 
 class LeaseContractForm(forms.ModelForm):
     class Meta:
@@ -94,16 +137,13 @@ class LeaseContractForm(forms.ModelForm):
             if end_date <= start_date:
                 raise forms.ValidationError("End date must be after start date")
             
-            # Check for lease conflicts
+            # Check leases, approved bookings and maintenance in one lookup
             if resource:
-                conflicts = LeaseContract.objects.filter(
-                    resource=resource,
-                    status='active',
-                    start_date__lt=end_date,
-                    end_date__gt=start_date
+                conflicts = occupancy.conflicts(
+                    resource, *occupancy.lease_range(start_date, end_date), lease=self.instance
                 )
                 if conflicts.exists():
-                    raise forms.ValidationError("This resource is already leased for the selected period")
+                    raise forms.ValidationError("This resource is already booked or leased for the selected period")
 
 class SubscriptionForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,146 @@
+"""
+DB-backed background jobs.
+
+Slow side effects (email, image processing, report refreshes) are recorded
+as ``Job`` rows and executed by ``manage.py run_worker`` instead of inside
+the request. ``enqueue`` is a plain INSERT: called inside a transaction the
+job commits or rolls back with it, and it is equally safe to call from a
+``transaction.on_commit`` callback (see ``enqueue_on_commit``).
+
+Workers claim jobs in batches with ``SELECT ... FOR UPDATE SKIP LOCKED``
+where the database supports it, and otherwise with a guarded
+``UPDATE ... WHERE status='queued'``. Failed jobs are retried with
+exponential backoff; once ``max_attempts`` is reached they are marked
+``dead`` and kept for inspection (admin, ``manage.py dead_jobs``).
+"""
+import importlib
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .db import serialized_write
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(func):
+    """Register a function as a job task under its dotted path"""
+    TASKS[f'{func.__module__}.{func.__name__}'] = func
+    return func
+
+
+def load_tasks():
+    """Import every module listed in JOB_TASK_MODULES so its tasks register"""
+    for module in getattr(settings, 'JOB_TASK_MODULES', ['core_app.tasks']):
+        importlib.import_module(module)
+
+
+def _task_name(func_or_name):
+    if callable(func_or_name):
+        return f'{func_or_name.__module__}.{func_or_name.__name__}'
+    return func_or_name
+
+
+def enqueue(func_or_name, queue='default', run_at=None, max_attempts=None, **payload):
+    """Record a job; payload must be JSON-serializable keyword arguments"""
+    return Job.objects.create(
+        task=_task_name(func_or_name),
+        queue=queue,
+        payload=payload,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def enqueue_on_commit(func_or_name, **kwargs):
+    """Enqueue once the current transaction commits (immediately if there is none)"""
+    transaction.on_commit(partial(enqueue, func_or_name, **kwargs))
+
+
+def requeue_stale(timeout=None):
+    """Return jobs whose worker died mid-run to the queue"""
+    if timeout is None:
+        timeout = getattr(settings, 'JOB_LOCK_TIMEOUT', 600)
+    return Job.objects.filter(
+        status='running',
+        locked_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).update(status='queued', locked_by='', locked_at=None)
+
+
+@serialized_write
+def _lock_batch(worker_id, queue, batch_size, now):
+    candidates = Job.objects.filter(queue=queue, status='queued', run_at__lte=now).order_by('run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    ids = list(candidates.values_list('id', flat=True)[:batch_size])
+    if ids:
+        # The status guard makes this safe even without row locks
+        Job.objects.filter(id__in=ids, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now, updated_at=now
+        )
+    return ids
+
+
+def claim(worker_id, queue='default', batch_size=10):
+    """Atomically take up to batch_size due jobs for this worker"""
+    ids = _lock_batch(worker_id, queue, batch_size, timezone.now())
+    if not ids:
+        return []
+    return list(Job.objects.filter(id__in=ids, status='running', locked_by=worker_id))
+
+
+def backoff(attempts):
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 30)
+    return timedelta(seconds=min(base * (2 ** (attempts - 1)), 6 * 60 * 60))
+
+
+def run(job):
+    """Execute one claimed job and record the outcome"""
+    close_old_connections()
+    try:
+        func = TASKS.get(job.task)
+        if func is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        func(**job.payload)
+    except Exception:
+        job.attempts += 1
+        job.last_error = traceback.format_exc()
+        job.locked_by = ''
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'dead'
+            job.finished_at = timezone.now()
+            logger.error('Job %s (%s) is dead after %s attempts', job.pk, job.task, job.attempts)
+        else:
+            job.status = 'queued'
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning('Job %s (%s) failed, retrying at %s', job.pk, job.task, job.run_at)
+    else:
+        job.attempts += 1
+        job.status = 'succeeded'
+        job.finished_at = timezone.now()
+        job.last_error = ''
+    serialized_write(job.save)(update_fields=['status', 'attempts', 'last_error', 'locked_by',
+                                              'locked_at', 'run_at', 'finished_at', 'updated_at'])
+    close_old_connections()
+    return job
+
+
+def retry(queryset):
+    """Put dead jobs back on the queue with a fresh attempt budget"""
+    return queryset.filter(status='dead').update(
+        status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+    )
+
+
+def new_worker_id():
+    return uuid.uuid4().hex[:12]
@@ -0,0 +1,273 @@
+"""
+Structured, non-blocking logging.
+
+Every record passes through ``QueueHandler``. On the logging thread it only
+does cheap work: it merges the message arguments, renders any traceback,
+tags the record with the current request's ID, user ID and URL name
+(``RequestContextFilter``), and puts it on a bounded queue. A background
+listener thread takes records off the queue in batches, formats them
+(``JsonFormatter`` writes one JSON object per line), and writes each batch
+with one write to stderr and, optionally, to ``LOG_FILE``. A slow
+terminal or disk therefore delays the listener, not the request.
+
+Every worker process appends to the same file. Each batch goes out as a
+single write(2) on a file opened with O_APPEND, so batches from different
+workers never overwrite or split each other. Rotation is left to logrotate
+or similar: before each batch the sink checks whether the file was moved
+and reopens it if so.
+
+If the queue is full, the record is dropped instead of blocking. Drops are
+counted in ``spaceflow_log_records_dropped_total``, and the listener logs
+how many were lost once it catches up.
+
+Each process starts its own listener on its first record, including
+workers forked from a server that logged before the fork.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.core.signals import request_finished, request_started
+from django.utils.functional import empty
+
+from . import metrics
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+CONTEXT_FIELDS = ('request_id', 'user_id', 'url_name')
+# Attributes every LogRecord has; anything else was passed with extra=
+RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'} | set(CONTEXT_FIELDS)
+
+_request = ContextVar('log_request', default=None)
+_exception_formatter = logging.Formatter()
+
+
+def request_id(request):
+    """The caller's X-Request-ID when it looks sane, otherwise a new one"""
+    incoming = request.META.get(REQUEST_ID_HEADER, '')
+    if REQUEST_ID_PATTERN.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def bind_request(request):
+    """Tag records logged until the request finishes with its ID, user and URL name"""
+    _request.set(request)
+
+
+def _unbind_request(**kwargs):
+    _request.set(None)
+
+
+# The handler logs 4xx and 5xx responses (django.request) after the whole
+# middleware chain has returned, so the context lasts until the response is
+# closed rather than ending with RequestLogMiddleware
+request_started.connect(_unbind_request, dispatch_uid='core_app.logs.request_started')
+request_finished.connect(_unbind_request, dispatch_uid='core_app.logs.request_finished')
+
+
+def _user_id(request):
+    user = getattr(request, 'user', None)
+    # Never resolve a lazy user just to log: it may query, or log while loading
+    if user is None or getattr(user, '_wrapped', None) is empty:
+        return None
+    return user.pk if user.is_authenticated else None
+
+
+class RequestContextFilter(logging.Filter):
+    """Add request_id, user_id and url_name to every record (None outside a request)"""
+
+    def filter(self, record):
+        request = _request.get()
+        if request is not None:
+            match = getattr(request, 'resolver_match', None)
+            context = {
+                'request_id': getattr(request, 'request_id', None),
+                'user_id': _user_id(request),
+                'url_name': match.view_name if match is not None else None,
+            }
+        else:
+            context = dict.fromkeys(CONTEXT_FIELDS)
+        for field, value in context.items():
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record, with extra= fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            entry[field] = getattr(record, field, None)
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class StreamSink(logging.StreamHandler):
+    def write_batch(self, text):
+        self.stream.write(text)
+        self.flush()
+
+
+class FileSink(logging.handlers.WatchedFileHandler):
+    def write_batch(self, text):
+        if self.stream is None:
+            self.stream = self._open()
+        else:
+            self.reopenIfNeeded()
+        # One unbuffered write, so concurrent workers' batches don't interleave
+        data = text.encode(self.encoding or 'utf-8')
+        fd = self.stream.fileno()
+        while data:
+            data = data[os.write(fd, data):]
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a per-process listener thread through a bounded queue.
+    The handler's formatter is applied by the listener.
+    """
+
+    def __init__(self, filename='', queue_size=10000, batch_size=100, stream=None):
+        super().__init__(None)
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.sinks = [StreamSink(stream or sys.stderr)]
+        if filename:
+            self.sinks.append(FileSink(filename, encoding='utf-8', delay=True))
+        self.dropped = self._reported = 0
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        # Inherited by forked workers; stop() only acts in the process that owns the listener
+        atexit.register(self.stop)
+
+    def _check_fork(self):
+        # A forked child inherits the queue but not the listener thread
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+    def _start(self):
+        self.queue = queue.Queue(self.queue_size)
+        self.dropped = self._reported = 0
+        self._thread = threading.Thread(target=self._listen, args=(self.queue,),
+                                         name='log-listener', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def prepare(self, record):
+        """
+        Copy the record so the listener can format it later. The message is
+        merged with its arguments and the traceback is rendered to text, so
+        nothing refers back to the caller's objects or frames.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._check_fork()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc('spaceflow_log_records_dropped_total', level=record.levelname)
+
+    def _listen(self, records):
+        while True:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            if self.dropped > self._reported:
+                batch.append(self._dropped_record())
+            self._write(batch)
+            if stopping:
+                return
+
+    def _dropped_record(self):
+        dropped, self._reported = self.dropped - self._reported, self.dropped
+        return logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f'Dropped {dropped} log records because the log queue was full',
+            'created': time.time(), **dict.fromkeys(CONTEXT_FIELDS),
+        })
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record) + '\n')
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        text = ''.join(lines)
+        for sink in self.sinks:
+            sink.acquire()
+            try:
+                sink.write_batch(text)
+            except Exception:
+                sink.handleError(batch[0])
+            finally:
+                sink.release()
+
+    def stop(self, timeout=2.0):
+        """Write what is queued and stop this process's listener; the next record starts a new one"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._pid = None
+
+    def close(self):
+        self.stop()
+        for sink in self.sinks:
+            sink.close()
+        super().close()
+
+
+def stop_listeners():
+    """Drain and stop the root logger's listeners, e.g. so a server can fork safely"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, QueueHandler):
+            handler.stop()
@@ -0,0 +1,40 @@
+import time
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = 'Render each core_app admin changelist and report its query count and time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='Superuser to render as (default: first superuser)')
+        parser.add_argument('--search', type=str, default='', help='Optional search term (?q=) to apply')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username'], is_superuser=True).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('A superuser is required to render admin changelists')
+
+        factory = RequestFactory()
+        params = {'q': options['search']} if options['search'] else {}
+
+        self.stdout.write(f"{'changelist':<28}{'queries':>9}{'ms':>10}")
+        for model, model_admin in admin.site._registry.items():
+            if model._meta.app_label != 'core_app':
+                continue
+            request = factory.get('/admin/', params)
+            request.user = user
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = model_admin.changelist_view(request)
+                response.render()
+                elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(f'{model._meta.model_name:<28}{len(ctx.captured_queries):>9}{elapsed:>10.1f}')
@@ -0,0 +1,66 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core_app import archive
+from core_app.models import Booking, Resource
+
+
+class Command(BaseCommand):
+    help = 'Move bookings that ended before the retention horizon into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Retention horizon in days (default: BOOKING_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bookings per transaction (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many bookings would move')
+        parser.add_argument('--measure', action='store_true',
+                          help='Time a conflict check and the booking list query before and after archiving')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        horizon = archive.retention_horizon(options['days'])
+        pending = archive.archivable(horizon).count()
+        self.stdout.write(f'{pending} bookings ended before {horizon:%Y-%m-%d %H:%M}')
+        if options['dry_run'] or not pending:
+            return
+
+        if options['measure']:
+            before = self._measure()
+
+        moved = 0
+        for count in archive.archive_bookings(horizon, options['batch_size']):
+            moved += count
+            self.stdout.write(f'  archived {moved}/{pending}')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} bookings'))
+
+        if options['measure']:
+            after = self._measure()
+            self.stdout.write(f"{'query':<16}{'before ms':>12}{'after ms':>12}")
+            for name in ('conflict_check', 'booking_list'):
+                self.stdout.write(f'{name:<16}{before[name]:>12.2f}{after[name]:>12.2f}')
+
+    def _measure(self, repeat=20):
+        resource = Resource.objects.order_by('pk').first()
+        start = timezone.now() + timedelta(days=1)
+        timings = {'conflict_check': [], 'booking_list': []}
+        for _ in range(repeat):
+            started = time.perf_counter()
+            if resource is not None:
+                Booking.objects.filter(
+                    resource=resource,
+                    status='approved',
+                    start_time__lt=start + timedelta(hours=1),
+                    end_time__gt=start
+                ).exists()
+            timings['conflict_check'].append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            list(Booking.objects.select_related('user', 'resource'))
+            timings['booking_list'].append((time.perf_counter() - started) * 1000)
+        return {name: statistics.median(values) for name, values in timings.items()}
@@ -0,0 +1,99 @@
+import statistics
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.client import RequestFactory
+
+
+class Command(BaseCommand):
+    help = ('Benchmark requests per second against the configured database with a new '
+            'connection per request and with persistent connections (CONN_MAX_AGE)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per thread (default: 500)')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent request threads (default: 4)')
+        parser.add_argument('--path', default='/', help='URL to request (default: /)')
+        parser.add_argument('--max-age', type=int, default=60,
+                            help='CONN_MAX_AGE for the persistent run (default: 60)')
+
+    def handle(self, *args, **options):
+        # Requests go through the full WSGI handler, so request_started and
+        # request_finished open and close connections exactly as in production
+        self.handler = WSGIHandler()
+        self.environ = RequestFactory()._base_environ(PATH_INFO=options['path'], REQUEST_METHOD='GET')
+        self.environ['HTTP_HOST'] = 'localhost'
+        settings_dict = connections['default'].settings_dict
+        original_max_age = settings_dict['CONN_MAX_AGE']
+
+        self.stdout.write(f"{connections['default'].vendor}: {options['threads']} threads x "
+                          f"{options['requests']} requests of {options['path']}\n")
+        self.stdout.write(f"{'mode':<20}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'connects':>10}")
+        try:
+            for label, max_age in (('per request', 0), (f"persistent ({options['max_age']}s)", options['max_age'])):
+                connections.close_all()
+                settings_dict['CONN_MAX_AGE'] = max_age
+                result = self._run(options['threads'], options['requests'])
+                self.stdout.write(f"{label:<20}{result['throughput']:>10.1f}{result['p50']:>10.2f}"
+                                  f"{result['p99']:>10.2f}{result['connects']:>10}")
+        finally:
+            settings_dict['CONN_MAX_AGE'] = original_max_age
+            connections.close_all()
+
+    def _request(self):
+        status = []
+        response = self.handler(dict(self.environ), lambda code, headers: status.append(code))
+        try:
+            for chunk in response:
+                pass
+        finally:
+            # Sends request_finished, which closes connections past CONN_MAX_AGE
+            response.close()
+        if not status[0].startswith(('2', '3')):
+            raise RuntimeError(f'{self.environ["PATH_INFO"]} returned {status[0]}')
+
+    def _run(self, threads, requests):
+        latencies = []
+        connects = []
+        lock = threading.Lock()
+
+        def count_connect(sender, **kwargs):
+            with lock:
+                connects.append(1)
+
+        def worker():
+            local = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                self._request()
+                local.append((time.perf_counter() - start) * 1000)
+            connections.close_all()
+            with lock:
+                latencies.extend(local)
+
+        # Warm up templates, URL resolvers and caches outside the measurement
+        self._request()
+        connections.close_all()
+
+        connection_created.connect(count_connect, weak=False)
+        try:
+            pool = [threading.Thread(target=worker) for _ in range(threads)]
+            started = time.perf_counter()
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connect)
+
+        latencies.sort()
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': latencies[int(len(latencies) * 0.99) - 1],
+            'connects': len(connects),
+        }
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Benchmark concurrent booking writes against a scratch SQLite file '
+            'with the default and the production SQLite profiles')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads (default: 8)')
+        parser.add_argument('--ops', type=int, default=200, help='Writes per writer (default: 200)')
+        parser.add_argument('--profile', choices=['default', 'production', 'both'], default='both',
+                          help='Which profile to run (default: both)')
+
+    def handle(self, *args, **options):
+        profiles = ['default', 'production'] if options['profile'] == 'both' else [options['profile']]
+
+        self.stdout.write(f"{options['writers']} writers x {options['ops']} booking writes each\n")
+        self.stdout.write(f"{'profile':<12}{'ok':>8}{'locked':>8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for profile in profiles:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self._create_schema(path)
+                result = self._run(path, profile, options['writers'], options['ops'])
+            self.stdout.write(
+                f"{profile:<12}{result['ok']:>8}{result['locked']:>8}{result['throughput']:>10.1f}"
+                f"{result['p50']:>10.2f}{result['p99']:>10.2f}"
+            )
+
+    def _create_schema(self, path):
+        conn = sqlite3.connect(path)
+        conn.executescript("""
+            CREATE TABLE booking (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                resource_id INTEGER NOT NULL,
+                start_time TEXT NOT NULL,
+                end_time TEXT NOT NULL,
+                status TEXT NOT NULL,
+                notes TEXT NOT NULL
+            );
+            CREATE INDEX booking_resource_time ON booking (resource_id, start_time);
+        """)
+        conn.close()
+
+    def _connect(self, path, profile):
+        if profile == 'production':
+            conn = sqlite3.connect(path, timeout=settings.SQLITE_BUSY_TIMEOUT,
+                                   isolation_level=None, check_same_thread=False)
+            for name, value in settings.SQLITE_PRAGMAS.items():
+                conn.execute(f'PRAGMA {name}={value}')
+        else:
+            # Django's stock sqlite3 settings: rollback journal, 5s timeout,
+            # deferred transactions
+            conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        return conn
+
+    def _run(self, path, profile, writers, ops):
+        latencies = []
+        counters = {'ok': 0, 'locked': 0}
+        results_lock = threading.Lock()
+        write_lock = threading.Lock()
+        begin = 'BEGIN IMMEDIATE' if profile == 'production' else 'BEGIN'
+        base = datetime(2030, 1, 1)
+
+        def write(conn, resource_id, start):
+            conn.execute(begin)
+            try:
+                # Conflict check followed by insert, as BookingForm + booking_create do
+                conn.execute(
+                    'SELECT COUNT(*) FROM booking WHERE resource_id = ? AND status = ? '
+                    'AND start_time < ? AND end_time > ?',
+                    (resource_id, 'approved', (start + timedelta(hours=1)).isoformat(), start.isoformat())
+                ).fetchone()
+                conn.execute(
+                    'INSERT INTO booking (resource_id, start_time, end_time, status, notes) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (resource_id, start.isoformat(), (start + timedelta(hours=1)).isoformat(), 'pending', '')
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+        def worker(index):
+            conn = self._connect(path, profile)
+            for i in range(ops):
+                start = base + timedelta(hours=index * ops + i)
+                started = time.perf_counter()
+                ok = False
+                attempts = settings.WRITE_RETRY_ATTEMPTS if profile == 'production' else 0
+                for attempt in range(attempts + 1):
+                    try:
+                        if profile == 'production':
+                            with write_lock:
+                                write(conn, index % 20, start)
+                        else:
+                            write(conn, index % 20, start)
+                        ok = True
+                        break
+                    except sqlite3.OperationalError:
+                        if attempt < attempts:
+                            time.sleep(settings.WRITE_RETRY_BACKOFF * (2 ** attempt))
+                elapsed = (time.perf_counter() - started) * 1000
+                with results_lock:
+                    latencies.append(elapsed)
+                    counters['ok' if ok else 'locked'] += 1
+            conn.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'ok': counters['ok'],
+            'locked': counters['locked'],
+            'throughput': counters['ok'] / duration if duration else 0,
+            'p50': statistics.median(latencies) if latencies else 0,
+            'p99': latencies[int(len(latencies) * 0.99) - 1] if latencies else 0,
+        }
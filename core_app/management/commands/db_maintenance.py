@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core_app import db_maintenance
+from core_app.db_maintenance import MaintenanceError
+
+JOBS = ('backup', 'optimize', 'vacuum', 'sizes')
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f'{num_bytes:.0f} {unit}' if unit == 'B' else f'{num_bytes:.1f} {unit}'
+        num_bytes /= 1024
+
+
+class Command(BaseCommand):
+    help = ('SQLite maintenance: online backup with rotation and verification, '
+            'planner statistics, incremental vacuum and table/index sizes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('jobs', nargs='+', choices=JOBS + ('all',),
+                            help='Jobs to run in order; "all" runs backup, optimize, vacuum and sizes')
+        parser.add_argument('--database', default='default', help='Database alias (default: default)')
+        parser.add_argument('--dir', help='Backup directory (default: DB_BACKUP_DIR)')
+        parser.add_argument('--keep', type=int, help='Backups to keep, 0 for all (default: DB_BACKUP_KEEP)')
+        parser.add_argument('--step-pages', type=int,
+                            help='Pages copied per backup step (default: DB_BACKUP_STEP_PAGES)')
+        parser.add_argument('--step-pause', type=float,
+                            help='Seconds to pause between backup steps (default: DB_BACKUP_STEP_PAUSE)')
+        parser.add_argument('--quick-check', action='store_true',
+                            help='Verify the backup with quick_check instead of integrity_check')
+        parser.add_argument('--full-analyze', action='store_true',
+                            help='Run a full ANALYZE instead of PRAGMA optimize')
+        parser.add_argument('--vacuum-pages', type=int,
+                            help='Free pages to release per run (default: all)')
+        parser.add_argument('--enable-incremental', action='store_true',
+                            help='Switch the database to auto_vacuum=INCREMENTAL (rewrites the file; run off-peak)')
+        parser.add_argument('--top', type=int, default=20, help='Tables and indexes to list (default: 20)')
+
+    def handle(self, *args, **options):
+        if options['step_pages'] is not None and options['step_pages'] < 1:
+            raise CommandError('--step-pages must be positive')
+        jobs = JOBS if 'all' in options['jobs'] else options['jobs']
+        try:
+            for job in jobs:
+                getattr(self, f'_{job}')(options)
+        except MaintenanceError as e:
+            raise CommandError(str(e))
+
+    def _backup(self, options):
+        result = db_maintenance.backup(
+            directory=options['dir'],
+            keep=options['keep'],
+            step_pages=options['step_pages'],
+            step_pause=options['step_pause'],
+            quick_check=options['quick_check'],
+            using=options['database'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Backed up to {result['path']} ({_size(result['bytes'])}, {result['pages']} pages) in "
+            f"{result['steps']} steps, {result['restarts']} restarts, {result['seconds']:.2f}s; verified"
+        ))
+        if result['single_step'] and result['restarts']:
+            self.stdout.write(self.style.WARNING(
+                '  writes kept restarting the copy, so it was finished in a single step'
+            ))
+        for path in result['removed']:
+            self.stdout.write(f'  removed old backup {path.name}')
+
+    def _optimize(self, options):
+        db_maintenance.optimize(full=options['full_analyze'], using=options['database'])
+        self.stdout.write(self.style.SUCCESS('ANALYZE complete' if options['full_analyze'] else 'PRAGMA optimize complete'))
+
+    def _vacuum(self, options):
+        using = options['database']
+        if options['enable_incremental']:
+            db_maintenance.enable_incremental_vacuum(using)
+            self.stdout.write(self.style.SUCCESS('auto_vacuum is now INCREMENTAL'))
+        mode = db_maintenance.auto_vacuum_mode(using)
+        if mode != 'incremental':
+            self.stdout.write(self.style.WARNING(
+                f'Skipping incremental vacuum: auto_vacuum is {mode.upper()} with '
+                f'{db_maintenance.freelist_pages(using)} free pages. Run with --enable-incremental once, off-peak.'
+            ))
+            return
+        released = db_maintenance.incremental_vacuum(options['vacuum_pages'], using)
+        self.stdout.write(self.style.SUCCESS(
+            f'Released {released} free pages, {db_maintenance.freelist_pages(using)} left'
+        ))
+
+    def _sizes(self, options):
+        sizes = db_maintenance.table_sizes(options['database'])
+        total = sum(size for name, table, size in sizes)
+        self.stdout.write(f"{'name':<48}{'table':<32}{'size':>12}{'share':>8}")
+        for name, table, size in sizes[:options['top']]:
+            self.stdout.write(f'{name:<48}{table:<32}{_size(size):>12}{size / total:>8.1%}')
+        self.stdout.write(f"{'total':<80}{_size(total):>12}")
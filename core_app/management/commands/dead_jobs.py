@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core_app import jobs
+from core_app.models import Job
+
+
+class Command(BaseCommand):
+    help = 'List dead background jobs, or put them back on the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Only these job IDs')
+        parser.add_argument('--retry', action='store_true', help='Requeue the selected dead jobs')
+        parser.add_argument('--errors', action='store_true', help='Show the last error of each job')
+
+    def handle(self, *args, **options):
+        dead = Job.objects.filter(status='dead').order_by('-finished_at')
+        if options['ids']:
+            dead = dead.filter(pk__in=options['ids'])
+
+        if options['retry']:
+            count = jobs.retry(dead)
+            self.stdout.write(self.style.SUCCESS(f'Requeued {count} jobs'))
+            return
+
+        for job in dead:
+            self.stdout.write(f'#{job.pk} {job.task} attempts={job.attempts} finished={job.finished_at:%Y-%m-%d %H:%M}')
+            self.stdout.write(f'    payload={job.payload}')
+            if options['errors'] and job.last_error:
+                self.stdout.write(job.last_error)
@@ -0,0 +1,341 @@
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from core_app import entitlements, facets, occupancy, sites
+from core_app.models import (
+    Booking, LeaseContract, Location, MembershipPlan, Resource, Subscription, UserProfile
+)
+
+# Per unit of --scale
+USERS_PER_SCALE = 1000
+RESOURCES_PER_SCALE = 100
+BOOKINGS_PER_SCALE = 10000
+MAX_SITES = 50
+
+FIRST_NAMES = ('Ada', 'Ben', 'Chloe', 'Dev', 'Elena', 'Femi', 'Grace', 'Hiro', 'Isla', 'Jonas',
+               'Kemi', 'Liam', 'Maya', 'Noah', 'Olga', 'Priya', 'Quinn', 'Rosa', 'Sami', 'Tara')
+LAST_NAMES = ('Adams', 'Baker', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Hughes', 'Ito', 'Jones',
+              'Kowalski', 'Lopez', 'Murphy', 'Nguyen', 'Okafor', 'Patel', 'Rossi', 'Smith', 'Tanaka', 'Weber')
+COMPANIES = ('', '', '', 'Northwind', 'Bluebird Labs', 'Kite Studio', 'Acme Consulting', 'Fernway',
+             'Orbit Analytics', 'Paper Crane', 'Quarry Legal', 'Tidal Design')
+SITE_NAMES = ('Harbour House', 'Mill Yard', 'Station Works', 'Old Library', 'Canal Wharf',
+              'Market Hall', 'Foundry', 'Printworks', 'Observatory', 'Glasshouse')
+AMENITIES = ('Wi-Fi', 'Monitor', 'Whiteboard', 'Video conferencing', 'Standing desk', 'Lockers')
+
+PLANS = (
+    ('Hot Desk', 'Any free desk, weekdays', Decimal('149.00'), 30, 'desk'),
+    ('Desk + Rooms', 'Desks plus meeting room bookings', Decimal('249.00'), 30, 'desk_room'),
+    ('All Access', 'Desks, meeting rooms and offices', Decimal('449.00'), 30, 'all'),
+    ('All Access Annual', 'All Access, billed yearly', Decimal('4490.00'), 365, 'all'),
+)
+
+# Bookable slots per day (start hour, hours) by resource type
+SLOTS = {
+    'desk': ((9, 4), (13, 4)),
+    'meeting_room': ((8, 1), (9, 2), (11, 1), (13, 2), (15, 1), (16, 2)),
+    'office': ((9, 8),),
+}
+# Relative demand per slot, busiest mid-morning and early afternoon
+SLOT_WEIGHTS = {
+    'desk': (5, 4),
+    'meeting_room': (1, 4, 3, 4, 3, 2),
+    'office': (1,),
+}
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Let bulk_create keep the created_at/updated_at values set on the instances"""
+    fields = [model._meta.get_field('created_at'), model._meta.get_field('updated_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Generate a large, deterministic synthetic dataset for load and scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                          help=f'Size multiplier: {USERS_PER_SCALE} users, {RESOURCES_PER_SCALE} resources and '
+                               f'{BOOKINGS_PER_SCALE} bookings per unit (default: 1)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--anchor', type=date.fromisoformat,
+                          help='Date the data is generated around, YYYY-MM-DD (default: today)')
+        parser.add_argument('--past-days', type=int, default=365, help='Days of booking history (default: 365)')
+        parser.add_argument('--future-days', type=int, default=60, help='Days of future bookings (default: 60)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT batch (default: 5000)')
+        parser.add_argument('--prefix', default='gen', help='Username prefix for generated users (default: gen)')
+        parser.add_argument('--password', default='password', help='Password for every generated user')
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        if scale < 1:
+            raise CommandError('--scale must be positive')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users with prefix "{prefix}" already exist; choose another --prefix')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.anchor = options['anchor'] or timezone.localdate()
+        started = time.perf_counter()
+
+        site_list = self._sites(min(MAX_SITES, scale))
+        plans = self._plans()
+        users = self._users(scale * USERS_PER_SCALE, prefix, options['password'], site_list)
+        resources = self._resources(scale * RESOURCES_PER_SCALE, site_list)
+        self._subscriptions(users, plans)
+        self._leases(users, resources)
+        self._bookings(scale * BOOKINGS_PER_SCALE, users, resources,
+                       options['past_days'], options['future_days'])
+
+        # bulk_create skips the signals that normally maintain these
+        self.stdout.write(f'  occupancy: {occupancy.rebuild(self.batch_size)}')
+        sites.invalidate_sites()
+        facets.bump_version()
+        entitlements.invalidate_plan_matrix()
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
+
+    def _insert(self, model, rows, label):
+        """bulk_create an iterable of unsaved instances in batches; returns the saved rows"""
+        saved = []
+        total = 0
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                created = model.objects.bulk_create(batch)
+            total += len(created)
+            if label != 'bookings':
+                saved.extend(created)
+            self.stdout.write(f'  {label}: {total}', ending='\r')
+            self.stdout.flush()
+        self.stdout.write(f'  {label}: {total}')
+        return saved
+
+    def _sites(self, count):
+        site_list = []
+        for i in range(count):
+            name = SITE_NAMES[i % len(SITE_NAMES)]
+            if i >= len(SITE_NAMES):
+                name = f'{name} {i // len(SITE_NAMES) + 1}'
+            site, created = Location.objects.get_or_create(
+                name=name,
+                defaults={'slug': slugify(name), 'address': f'{self.rng.randint(1, 200)} {name} Road'}
+            )
+            site_list.append(site)
+        self.stdout.write(f'  sites: {len(site_list)}')
+        return site_list
+
+    def _plans(self):
+        plans = []
+        for name, description, price, duration_days, access_level in PLANS:
+            plan, created = MembershipPlan.objects.get_or_create(
+                name=name,
+                defaults={
+                    'description': description,
+                    'price': price,
+                    'duration_days': duration_days,
+                    'access_level': access_level,
+                }
+            )
+            plans.append(plan)
+        return plans
+
+    def _users(self, count, prefix, password, site_list):
+        rng = self.rng
+        password_hash = make_password(password)
+        joined_start = timezone.make_aware(datetime.combine(self.anchor - timedelta(days=3 * 365), datetime.min.time()))
+
+        def users():
+            for i in range(count):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                username = f'{prefix}{i:07d}'
+                yield User(
+                    username=username,
+                    first_name=first,
+                    last_name=last,
+                    email=f'{username}@example.com',
+                    password=password_hash,
+                    # Sign-ups accelerate towards the anchor date
+                    date_joined=joined_start + timedelta(days=3 * 365 * rng.random() ** 0.5),
+                )
+
+        created = self._insert(User, users(), 'users')
+
+        def profiles():
+            for user in created:
+                roll = rng.random()
+                role = 'admin' if roll < 0.005 else 'staff' if roll < 0.03 else 'member'
+                yield UserProfile(
+                    user=user,
+                    role=role,
+                    phone_number=f'+44 7{rng.randint(100000000, 999999999)}',
+                    company_name=rng.choice(COMPANIES),
+                    account_status='suspended' if rng.random() < 0.03 else 'active',
+                    current_site=rng.choice(site_list) if role != 'member' else None,
+                )
+
+        self._insert(UserProfile, profiles(), 'profiles')
+        return created
+
+    def _resources(self, count, site_list):
+        rng = self.rng
+
+        def resources():
+            for i in range(count):
+                site = site_list[i % len(site_list)]
+                roll = rng.random()
+                if roll < 0.6:
+                    kind, capacity, hourly = 'desk', 1, rng.choice((5, 8, 10, 12))
+                elif roll < 0.85:
+                    kind, capacity, hourly = 'meeting_room', rng.choice((4, 6, 8, 12, 20)), rng.choice((25, 35, 50, 75))
+                else:
+                    kind, capacity, hourly = 'office', rng.choice((2, 4, 6, 10)), rng.choice((30, 45, 60))
+                yield Resource(
+                    name=f'{site.name} {dict(Resource.RESOURCE_TYPES)[kind]} {i + 1}',
+                    type=kind,
+                    description=f'{dict(Resource.RESOURCE_TYPES)[kind]} on floor {rng.randint(1, 6)}',
+                    capacity=capacity,
+                    site=site,
+                    location=f'Floor {rng.randint(1, 6)}',
+                    amenities=', '.join(rng.sample(AMENITIES, rng.randint(1, 4))),
+                    price_per_hour=Decimal(hourly),
+                    monthly_price=Decimal(hourly * 120),
+                    status='maintenance' if rng.random() < 0.03 else 'available',
+                )
+
+        return self._insert(Resource, resources(), 'resources')
+
+    def _subscriptions(self, users, plans):
+        rng = self.rng
+
+        def subscriptions():
+            for user in users:
+                if rng.random() > 0.6:
+                    continue
+                plan = rng.choices(plans, weights=(5, 3, 2, 1))[0]
+                # Most subscriptions are current; some lapsed in the last year
+                lapsed = rng.random() < 0.2
+                start = self.anchor - timedelta(days=rng.randint(0, plan.duration_days + (365 if lapsed else 0)))
+                yield Subscription(
+                    user=user,
+                    plan=plan,
+                    start_date=start,
+                    end_date=start + timedelta(days=plan.duration_days),
+                    is_active=rng.random() > 0.05,
+                )
+
+        self._insert(Subscription, subscriptions(), 'subscriptions')
+
+    def _leases(self, users, resources):
+        rng = self.rng
+
+        def leases():
+            for resource in resources:
+                if resource.type != 'office' or rng.random() > 0.7:
+                    continue
+                start = (self.anchor - timedelta(days=rng.randint(0, 540))).replace(day=1)
+                end = start + timedelta(days=365 * rng.choice((1, 1, 2)) - 1)
+                yield LeaseContract(
+                    user=rng.choice(users),
+                    resource=resource,
+                    start_date=start,
+                    end_date=end,
+                    monthly_rent=resource.monthly_price,
+                    deposit_amount=resource.monthly_price * 2,
+                    status='active' if end >= self.anchor else 'expired',
+                    terms_and_conditions='Standard office licence agreement.',
+                )
+
+        self._insert(LeaseContract, leases(), 'leases')
+
+    def _bookings(self, count, users, resources, past_days, future_days):
+        """
+        Spread ``count`` bookings over the resources. Each resource gets a set
+        of distinct (day, slot) cells from its type's fixed slot grid, so no
+        two bookings on a resource overlap; weekdays and busy slots are
+        weighted up.
+        """
+        rng = self.rng
+        days = past_days + future_days
+        first_day = self.anchor - timedelta(days=past_days)
+        tz = timezone.get_current_timezone()
+
+        cum_weights = {}
+        for kind, weights in SLOT_WEIGHTS.items():
+            running, cumulative = 0, []
+            for day in range(days):
+                weekday = (first_day + timedelta(days=day)).weekday()
+                day_weight = 1 if weekday < 5 else 0.15
+                for weight in weights:
+                    running += weight * day_weight
+                    cumulative.append(running)
+            cum_weights[kind] = cumulative
+
+        bookable = [r for r in resources if r.type != 'office'] or resources
+        per_resource, extra = divmod(count, len(bookable))
+
+        # Past/future is judged against the anchor, not the clock, so a
+        # given seed and anchor always produce the same statuses
+        now = timezone.make_aware(datetime.combine(self.anchor, datetime.min.time()), tz)
+
+        def bookings():
+            for index, resource in enumerate(bookable):
+                slots = SLOTS[resource.type]
+                cells_available = days * len(slots)
+                wanted = min(per_resource + (index < extra), int(cells_available * 0.8))
+                cells = set()
+                population = range(cells_available)
+                while len(cells) < wanted:
+                    cells.update(rng.choices(population, cum_weights=cum_weights[resource.type],
+                                             k=wanted - len(cells)))
+                for cell in sorted(cells):
+                    day, slot = divmod(cell, len(slots))
+                    hour, hours = slots[slot]
+                    start = timezone.make_aware(
+                        datetime.combine(first_day + timedelta(days=day), datetime.min.time()) + timedelta(hours=hour),
+                        tz
+                    )
+                    end = start + timedelta(hours=hours)
+                    roll = rng.random()
+                    if end < now:
+                        status = 'completed' if roll < 0.8 else 'cancelled' if roll < 0.93 else 'rejected'
+                    else:
+                        status = 'approved' if roll < 0.6 else 'pending' if roll < 0.9 else 'cancelled'
+                    created_at = start - timedelta(days=rng.expovariate(1 / 7))
+                    yield Booking(
+                        user=rng.choice(users),
+                        resource=resource,
+                        site_id=resource.site_id,
+                        start_time=start,
+                        end_time=end,
+                        status=status,
+                        total_price=resource.price_per_hour * hours,
+                        created_at=created_at,
+                        updated_at=created_at,
+                    )
+
+        with explicit_timestamps(Booking):
+            self._insert(Booking, bookings(), 'bookings')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_app import catalog
+
+
+class Command(BaseCommand):
+    help = ('Create and update resources from a CSV or JSON Lines catalog, matched by external_key. '
+            'Shows the changes without writing unless --apply is given')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file (.csv or .jsonl)')
+        parser.add_argument('--apply', action='store_true', help='Write the changes')
+        parser.add_argument('--batch-size', type=int, help='Resources per transaction (default: RESOURCE_IMPORT_BATCH_SIZE)')
+        parser.add_argument('--show', type=int, default=50, help='Changes to list in the preview (default: 50)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            with open(options['path'], 'rb') as stream:
+                rows = catalog.read_rows(catalog.decode(stream.read()), options['path'])
+        except (OSError, catalog.CatalogError) as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        plan = catalog.plan(rows)
+        self.stdout.write(f'{len(rows)} rows checked in {time.perf_counter() - started:.2f}s: '
+                          f'{len(plan.creates)} to create, {len(plan.updates)} to update, '
+                          f'{plan.unchanged} unchanged, {len(plan.errors)} with errors')
+
+        for line, key, messages in plan.errors:
+            self.stdout.write(self.style.ERROR(f'  line {line} {key}: {"; ".join(messages)}'))
+        for change in plan.creates[:options['show']]:
+            self.stdout.write(f'  + {change.key}: {change.resource.name}')
+        for change in plan.updates[:options['show']]:
+            diff = ', '.join(f'{field} {old!r} -> {new!r}' for field, (old, new) in change.changes.items())
+            self.stdout.write(f'  ~ {change.key}: {diff}')
+
+        if not plan.is_valid:
+            raise CommandError('Fix the rows above; nothing was written')
+        if not options['apply'] or not plan.has_changes:
+            return
+
+        started = time.perf_counter()
+        created, updated = catalog.apply(plan, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} and updated {updated} resources in {time.perf_counter() - started:.2f}s'
+        ))
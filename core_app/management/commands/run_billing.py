@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_app import billing
+
+
+class Command(BaseCommand):
+    help = 'Invoice active leases and renew expiring subscriptions for a billing period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', type=str, required=True, help='Billing period as YYYY-MM')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Contracts per transaction (default: 1000)')
+        parser.add_argument('--restart', action='store_true',
+                          help='Rerun a completed period from the start (existing invoices are kept)')
+
+    def handle(self, *args, **options):
+        try:
+            billing.parse_period(options['period'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.perf_counter()
+        run = billing.run_billing(
+            options['period'],
+            chunk_size=options['chunk_size'],
+            restart=options['restart'],
+            progress=lambda kind, count: self.stdout.write(f'  {kind}: {count} processed'),
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Billing {run.period} {run.status}: {run.leases_processed} leases, '
+            f'{run.subscriptions_processed} expiring subscriptions processed in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,46 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core_app import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the jobs table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', type=str, default='default', help='Queue to consume (default: default)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads (default: 4)')
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per poll (default: 10)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                          help='Seconds to sleep when the queue is empty (default: 1.0)')
+        parser.add_argument('--once', action='store_true', help='Drain due jobs once and exit')
+
+    def handle(self, *args, **options):
+        jobs.load_tasks()
+        worker_id = jobs.new_worker_id()
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(
+            f"Worker {worker_id} consuming '{options['queue']}' with {options['concurrency']} threads"
+        )
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            while not self.stopping:
+                jobs.requeue_stale()
+                batch = jobs.claim(worker_id, options['queue'], options['batch_size'])
+                if batch:
+                    for job in pool.map(jobs.run, batch):
+                        style = self.style.SUCCESS if job.status == 'succeeded' else self.style.WARNING
+                        self.stdout.write(style(f'{job.task} #{job.pk}: {job.status}'))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        self.stdout.write(f'Worker {worker_id} stopped')
+
+    def _stop(self, signum, frame):
+        self.stopping = True
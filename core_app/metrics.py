@@ -0,0 +1,322 @@
+"""
+Prometheus metrics.
+
+Each process counts into a small in-memory registry (a dict update under a
+lock, so instrumentation stays cheap on the request path) and periodically
+writes a snapshot of it to ``METRICS_DIR/<pid>-<token>.json``. The
+``/metrics`` view merges every process's file, so counters and histograms
+add up correctly no matter which worker serves the scrape. Only processes
+that serve requests write files; management commands never do, and
+neither do warm-up requests or ``main.py --check``.
+
+When a process exits, ``retire()`` folds its counts into a single
+``exited.json`` and deletes its own file, so counters stay monotonic
+without the directory growing by one file per recycled worker. The random
+token keeps a reused PID from overwriting an older process's file, and
+``fold_exited()`` (run when the server starts) folds files left behind by
+processes that were killed. ``clear()`` resets everything.
+
+Gauges such as pending bookings are not accumulated at all: they are read
+from the database at scrape time.
+"""
+import atexit
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+from django.conf import settings
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'spaceflow_http_requests_total': ('counter', 'HTTP responses by view, method and status.'),
+    'spaceflow_http_request_duration_seconds': ('histogram', 'Request latency by view.'),
+    'spaceflow_db_queries_total': ('counter', 'Database queries executed while serving requests, by view.'),
+    'spaceflow_bookings_created_total': ('counter', 'Bookings created.'),
+    'spaceflow_bookings_approved_total': ('counter', 'Bookings moved to approved.'),
+    'spaceflow_booking_conflicts_total': ('counter', 'Booking requests rejected because the slot was taken.'),
+    'spaceflow_ratelimited_total': ('counter', 'Requests rejected with 429 by rate limit policy.'),
+    'spaceflow_dashboard_widget_over_budget_total': ('counter', 'Dashboard widget renders that exceeded their query budget.'),
+    'spaceflow_log_records_dropped_total': ('counter', 'Log records dropped because the log queue was full.'),
+    'spaceflow_pending_bookings': ('gauge', 'Bookings awaiting approval.'),
+    'spaceflow_active_leases': ('gauge', 'Active lease contracts.'),
+}
+
+
+EXITED_FILE = 'exited.json'
+PROCESS_FILE = re.compile(r'^(\d+)-[0-9a-f]+\.json$')
+
+
+def _directory():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(settings.BASE_DIR, 'metrics')
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+@contextmanager
+def _locked(directory, exclusive):
+    """Hold the directory lock: shared to read the files, exclusive to fold them"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(directory, filename, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        counters[(name, _label_key(labels))] += value
+    for name, labels, values in data['histograms']:
+        key = (name, _label_key(labels))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+        else:
+            histograms[key] = values
+
+
+def _dump(counters, histograms):
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, dict(labels), list(values)] for (name, labels), values in histograms.items()],
+    }
+
+
+def _fold(directory, filenames):
+    """Add the given process files to exited.json and delete them; call with the lock held"""
+    counters, histograms = defaultdict(float), {}
+    for filename in (EXITED_FILE, *filenames):
+        data = _read(os.path.join(directory, filename))
+        if data is not None:
+            _merge(counters, histograms, data)
+    _write(directory, EXITED_FILE, _dump(counters, histograms))
+    for filename in filenames:
+        try:
+            os.unlink(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+
+
+class Registry:
+    """Per-process counters and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._filename = f'{self._pid}-{uuid.uuid4().hex[:12]}.json'
+        self._flushed_to = None
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_flush = 0.0
+        # Set once the process serves a request; others never write files
+        self.serving = False
+        self.warming_up = False
+
+    def reset(self):
+        """Forget this process's counts and delete the file it wrote, if any"""
+        with self._lock:
+            if self._flushed_to is not None and self._pid == os.getpid():
+                try:
+                    os.unlink(os.path.join(self._flushed_to, self._filename))
+                except FileNotFoundError:
+                    pass
+            self._reset()
+
+    @contextmanager
+    def warm_up(self):
+        """Serve warm-up requests without writing anything, then forget what they counted"""
+        self.warming_up = True
+        try:
+            yield
+        finally:
+            self.reset()
+
+    def _check_fork(self):
+        # A forked child inherits the parent's counts; start from zero so
+        # they are not reported twice
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._check_fork()
+            self._counters[(name, _label_key(labels))] += amount
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            self._check_fork()
+            key = (name, _label_key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # One slot per bucket plus +Inf, then sum
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            histogram[bisect.bisect_left(BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return _dump(self._counters, self._histograms)
+
+    def flush(self, force=False):
+        """Write this process's snapshot to disk, at most once per METRICS_FLUSH_INTERVAL"""
+        self._check_fork()
+        if not self.serving:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        self._last_flush = now
+        directory = _directory()
+        os.makedirs(directory, exist_ok=True)
+        _write(directory, self._filename, self.snapshot())
+        self._flushed_to = directory
+
+    def retire(self):
+        """Fold this process's counts into exited.json and remove its file; call as it exits"""
+        self._check_fork()
+        if not self.serving:
+            return
+        self.flush(force=True)
+        directory = _directory()
+        with _locked(directory, exclusive=True):
+            _fold(directory, [self._filename])
+        self.serving = False
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+def maybe_flush():
+    """Called after each request: marks the process as serving and flushes periodically"""
+    if registry.warming_up:
+        return
+    registry.serving = True
+    registry.flush()
+
+
+atexit.register(registry.retire)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fold_exited():
+    """Fold the files of processes that died without retiring (e.g. killed) into exited.json"""
+    directory = _directory()
+    if not os.path.isdir(directory):
+        return 0
+    with _locked(directory, exclusive=True):
+        stale = [filename for filename in os.listdir(directory)
+                 if (match := PROCESS_FILE.match(filename)) and not _alive(int(match.group(1)))]
+        if stale:
+            _fold(directory, stale)
+    return len(stale)
+
+
+def collect():
+    """Merge the snapshots of every process into ({key: value}, {key: buckets})"""
+    registry.flush(force=True)
+    counters = defaultdict(float)
+    histograms = {}
+    directory = _directory()
+    with _locked(directory, exclusive=False):
+        for filename in os.listdir(directory):
+            if filename == EXITED_FILE or PROCESS_FILE.match(filename):
+                data = _read(os.path.join(directory, filename))
+                if data is not None:
+                    _merge(counters, histograms, data)
+    return counters, histograms
+
+
+def clear():
+    """Delete all metric files, e.g. to reset the counters of a deployment"""
+    directory = _directory()
+    if os.path.isdir(directory):
+        with _locked(directory, exclusive=True):
+            for filename in os.listdir(directory):
+                if filename.endswith(('.json', '.tmp')):
+                    os.unlink(os.path.join(directory, filename))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return repr(int(value))
+    return repr(value)
+
+
+def render(gauges):
+    """Render all metrics in the Prometheus text exposition format"""
+    counters, histograms = collect()
+    samples = defaultdict(list)
+
+    for (name, labels), value in counters.items():
+        samples[name].append(f'{name}{_labels(labels)} {_number(value)}')
+    for (name, labels), values in histograms.items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float('inf'),), values):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples[name].append(f'{name}_bucket{_labels(labels, [("le", le)])} {cumulative}')
+        samples[name].append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+        samples[name].append(f'{name}_count{_labels(labels)} {cumulative}')
+    for name, value in gauges.items():
+        samples[name].append(f'{name} {_number(value)}')
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(sorted(samples.get(name, [])))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,162 @@
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, logout
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.shortcuts import redirect, resolve_url
+from django.utils.functional import SimpleLazyObject
+
+from . import assets, audit, logs, metrics, profiling, ratelimit, user_snapshot
+
+access_logger = logging.getLogger('core_app.requests')
+
+
+class SnapshotAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Drop-in replacement for Django's AuthenticationMiddleware that resolves
+    request.user from the session snapshot instead of querying auth_user and
+    core_app_userprofile, and signs out suspended accounts.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: user_snapshot.get_user(request))
+
+        if SESSION_KEY in request.session and request.user.is_authenticated:
+            if user_snapshot.is_suspended(request.user):
+                logout(request)
+                return redirect(f"{resolve_url(settings.LOGIN_URL)}?suspended=1")
+
+
+class RequestLogMiddleware:
+    """
+    Give each request an ID (the caller's X-Request-ID or a new one), tag
+    everything logged while serving it, and log one line per response
+    (see core_app.logs).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.log_requests = getattr(settings, 'LOG_REQUESTS', True)
+
+    def __call__(self, request):
+        request.request_id = logs.request_id(request)
+        logs.bind_request(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        if self.log_requests:
+            access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+            })
+        response['X-Request-ID'] = request.request_id
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and database query count for every request,
+    labelled by the resolved view name (see core_app.metrics).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else '<unmatched>'
+        metrics.observe('spaceflow_http_request_duration_seconds', duration, view=view)
+        metrics.inc('spaceflow_http_requests_total', view=view, method=request.method,
+                    status=str(response.status_code))
+        if queries:
+            metrics.inc('spaceflow_db_queries_total', queries, view=view)
+        metrics.maybe_flush()
+        return response
+
+
+class AuditMiddleware:
+    """
+    Attribute audited changes to the request's user and write the request's
+    audit entries in one bulk insert at the end (see core_app.audit).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with audit.actor(request), audit.buffered():
+            return self.get_response(request)
+
+
+class RateLimitMiddleware:
+    """
+    Apply the settings.RATELIMITS policy named after the resolved URL, for
+    views that do not use the ratelimit decorator (see core_app.ratelimit).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'ratelimited', False):
+            return None
+        policy = ratelimit.get_policy(request.resolver_match.url_name)
+        if policy is None:
+            return None
+        return ratelimit.limit(policy, request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a single request when an authorized user asks for it with
+    ?_profile=1 or an X-Profile header (see core_app.profiling).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profiling.requested(request) and profiling.allowed(request):
+            return profiling.profile_request(request, self.get_response)
+        return self.get_response(request)
+
+
+class StaticFilesMiddleware:
+    """
+    Serve STATIC_ROOT ahead of the rest of the middleware stack, with
+    precompressed variants and far-future caching (see core_app.assets).
+    """
+
+    def __init__(self, get_response):
+        static_url = urlsplit(settings.STATIC_URL or '')
+        if not getattr(settings, 'SERVE_STATIC', True) or static_url.netloc or not static_url.path:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + static_url.path.lstrip('/')
+        self.static_files = assets.StaticFiles(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.path_info.startswith(self.prefix) and request.method in ('GET', 'HEAD'):
+            return self.static_files.serve(request, request.path_info[len(self.prefix):])
+        return self.get_response(request)
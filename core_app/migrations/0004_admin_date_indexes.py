@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0003_archivedbooking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['start_time'], name='booking_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leasecontract',
+            index=models.Index(fields=['start_date'], name='lease_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['start_date'], name='subscription_start_idx'),
+        ),
+    ]
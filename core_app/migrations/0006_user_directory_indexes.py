@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Case-insensitive prefix indexes for the user directory search. Django's
+# istartswith compiles to LIKE on SQLite (index-backed with NOCASE
+# collation) and to UPPER(col) LIKE UPPER(%s) on PostgreSQL.
+PREFIX_INDEXES = [
+    ('dir_user_username_idx', 'auth_user', 'username'),
+    ('dir_user_email_idx', 'auth_user', 'email'),
+    ('dir_user_first_name_idx', 'auth_user', 'first_name'),
+    ('dir_user_last_name_idx', 'auth_user', 'last_name'),
+    ('dir_profile_company_idx', 'core_app_userprofile', 'company_name'),
+]
+
+
+def create_prefix_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, table, column in PREFIX_INDEXES:
+        if vendor == 'sqlite':
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column} COLLATE NOCASE)')
+        elif vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} (UPPER({column}::text) varchar_pattern_ops)'
+            )
+        else:
+            schema_editor.execute(f'CREATE INDEX {name} ON {table} ({column})')
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    for name, table, column in PREFIX_INDEXES:
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute(f'DROP INDEX {name} ON {table}')
+        else:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0005_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['role', 'account_status'], name='profile_role_status_idx'),
+        ),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
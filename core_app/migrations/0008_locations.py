@@ -0,0 +1,116 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:44
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils.text import slugify
+
+
+def normalize(value):
+    """Collapse whitespace so 'Main  St ' and 'main st' group together"""
+    return ' '.join(value.split())
+
+
+def create_locations(apps, schema_editor):
+    """Turn the distinct Resource.location strings into Location rows"""
+    Location = apps.get_model('core_app', 'Location')
+    Resource = apps.get_model('core_app', 'Resource')
+    Booking = apps.get_model('core_app', 'Booking')
+    ArchivedBooking = apps.get_model('core_app', 'ArchivedBooking')
+
+    spellings = defaultdict(Counter)
+    resource_ids = defaultdict(list)
+    for pk, location in Resource.objects.values_list('pk', 'location'):
+        name = normalize(location or '')
+        if name:
+            spellings[name.casefold()][name] += 1
+            resource_ids[name.casefold()].append(pk)
+
+    slugs = set()
+    for key, counter in spellings.items():
+        # The most common spelling becomes the canonical site name
+        name = counter.most_common(1)[0][0]
+        slug = base = slugify(name)[:90] or 'site'
+        n = 1
+        while slug in slugs:
+            n += 1
+            slug = f'{base}-{n}'
+        slugs.add(slug)
+        site = Location.objects.create(name=name, slug=slug)
+        Resource.objects.filter(pk__in=resource_ids[key]).update(site=site)
+
+    # Copy each resource's site onto its bookings in one statement per table
+    site_of_resource = Resource.objects.filter(pk=OuterRef('resource_id')).values('site_id')[:1]
+    Booking.objects.update(site=Subquery(site_of_resource))
+    ArchivedBooking.objects.update(site=Subquery(site_of_resource))
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0007_billing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('address', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddField(
+            model_name='archivedbooking',
+            name='site',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to='core_app.location'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='site',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='core_app.location'),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='site',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='resources', to='core_app.location'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='current_site',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core_app.location'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['site', '-start_time'], name='archived_booking_site_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['site', '-start_time'], name='booking_site_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['site', 'status'], name='booking_site_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['site', 'name'], name='resource_site_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=models.Index(fields=['site', 'type', 'name'], name='resource_site_type_idx'),
+        ),
+        migrations.RunPython(create_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:57
+
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def populate_ledger(apps, schema_editor):
+    """Fill the ledger from approved bookings and active leases"""
+    Booking = apps.get_model('core_app', 'Booking')
+    LeaseContract = apps.get_model('core_app', 'LeaseContract')
+    Occupancy = apps.get_model('core_app', 'Occupancy')
+    Resource = apps.get_model('core_app', 'Resource')
+    tz = timezone.get_current_timezone()
+
+    def rows():
+        bookings = Booking.objects.filter(status='approved', end_time__gt=F('start_time'))
+        for pk, resource_id, start_time, end_time in bookings.values_list(
+                'pk', 'resource_id', 'start_time', 'end_time').iterator(chunk_size=5000):
+            yield Occupancy(source='booking', booking_id=pk, resource_id=resource_id,
+                            start_time=start_time, end_time=end_time)
+        leases = LeaseContract.objects.filter(status='active', end_date__gte=F('start_date'))
+        for pk, resource_id, start_date, end_date in leases.values_list(
+                'pk', 'resource_id', 'start_date', 'end_date').iterator(chunk_size=5000):
+            yield Occupancy(
+                source='lease', lease_id=pk, resource_id=resource_id,
+                start_time=timezone.make_aware(datetime.combine(start_date, time.min), tz),
+                end_time=timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz),
+            )
+
+    pending = rows()
+    while batch := list(islice(pending, 5000)):
+        Occupancy.objects.bulk_create(batch)
+    # "Occupied" is now derived from the ledger instead of set by hand
+    Resource.objects.filter(status='occupied').update(status='available')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0008_locations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resource',
+            name='status',
+            field=models.CharField(choices=[('available', 'Available'), ('maintenance', 'Under Maintenance')], default='available', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='MaintenanceWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('reason', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='maintenance_windows', to='core_app.resource')),
+            ],
+            options={
+                'ordering': ('-start_time',),
+            },
+        ),
+        migrations.CreateModel(
+            name='Occupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('booking', 'Booking'), ('lease', 'Lease'), ('maintenance', 'Maintenance')], max_length=20)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('booking', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core_app.booking')),
+                ('lease', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core_app.leasecontract')),
+                ('maintenance', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core_app.maintenancewindow')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core_app.resource')),
+            ],
+            options={
+                'verbose_name_plural': 'occupancy',
+                'ordering': ('resource_id', 'start_time'),
+                'indexes': [models.Index(fields=['resource', 'end_time', 'start_time'], name='occupancy_overlap_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='occupancy_positive_range')],
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
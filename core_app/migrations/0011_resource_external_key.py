@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_app', '0010_audit_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='external_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
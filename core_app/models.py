@@ -1,8 +1,33 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
+class SiteQuerySet(models.QuerySet):
+    """QuerySet for models that belong to a site, directly or through a relation"""
+
+    def for_site(self, site):
+        """Narrow to one site; None means every site"""
+        if site is None:
+            return self
+        return self.filter(**{self.model.SITE_FIELD: site})
+
+class Location(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    address = models.TextField(blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('name',)
+
+    def __str__(self):
+        return self.name
+
 class UserProfile(models.Model):
     ROLE_CHOICES = [
         ('member', 'Member'),
@@ -21,9 +46,16 @@ class UserProfile(models.Model):
     company_name = models.CharField(max_length=100, blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
     account_status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    current_site = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='+')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['role', 'account_status'], name='profile_role_status_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.role}"
 
@@ -52,26 +84,38 @@ class Resource(models.Model):
         ('meeting_room', 'Meeting Room'),
         ('office', 'Private Office'),
     ]
+    # Whether a resource is in service; whether it is occupied right now is
+    # derived from the Occupancy ledger (see core_app.occupancy)
     STATUS_CHOICES = [
         ('available', 'Available'),
         ('maintenance', 'Under Maintenance'),
-        ('occupied', 'Occupied'),
     ]
 
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=20, choices=RESOURCE_TYPES)
     description = models.TextField(blank=True)
     capacity = models.PositiveIntegerField(default=1)
+    site = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True,
+                             related_name='resources')
     location = models.CharField(max_length=100)
     amenities = models.TextField(blank=True)
     price_per_hour = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     monthly_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
+    # Stable ID from the catalog spreadsheet, used to match rows on import (see core_app.catalog)
+    external_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SITE_FIELD = 'site'
+    objects = SiteQuerySet.as_manager()
+
     class Meta:
         ordering = ('name',)
+        indexes = [
+            models.Index(fields=['site', 'name'], name='resource_site_name_idx'),
+            models.Index(fields=['site', 'type', 'name'], name='resource_site_type_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
@@ -87,6 +131,9 @@ class Booking(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='bookings')
+    # Copied from the resource so per-site lists never join through it
+    site = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True,
+                             editable=False, related_name='bookings')
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -95,12 +142,62 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SITE_FIELD = 'site'
+    objects = SiteQuerySet.as_manager()
+
     class Meta:
         ordering = ('-start_time',)
+        indexes = [
+            models.Index(fields=['start_time'], name='booking_start_idx'),
+            models.Index(fields=['site', '-start_time'], name='booking_site_start_idx'),
+            models.Index(fields=['site', 'status'], name='booking_site_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.resource.name} ({self.start_time})"
 
+    def save(self, *args, **kwargs):
+        if self.site_id is None and self.resource_id is not None:
+            self.site_id = self.resource.site_id
+        super().save(*args, **kwargs)
+
+    def calculate_total_price(self):
+        """Price the booking from the resource's hourly rate"""
+        if not self.resource.price_per_hour:
+            return Decimal('0.00')
+        hours = Decimal((self.end_time - self.start_time).total_seconds()) / Decimal(3600)
+        return (self.resource.price_per_hour * hours).quantize(Decimal('0.01'))
+
+class ArchivedBooking(models.Model):
+    """Bookings moved out of the hot Booking table once past the retention horizon."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='archived_bookings')
+    site = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='archived_bookings')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    SITE_FIELD = 'site'
+    objects = SiteQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('-start_time',)
+        indexes = [
+            models.Index(fields=['user', '-start_time'], name='archived_booking_user_idx'),
+            models.Index(fields=['resource', '-start_time'], name='archived_booking_res_idx'),
+            models.Index(fields=['site', '-start_time'], name='archived_booking_site_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.resource.name} ({self.start_time}) [archived]"
+
 class LeaseContract(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending Approval'),
@@ -120,8 +217,14 @@ class LeaseContract(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SITE_FIELD = 'resource__site'
+    objects = SiteQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(fields=['start_date'], name='lease_start_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.resource.name} Lease"
@@ -132,11 +235,219 @@ class Subscription(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     is_active = models.BooleanField(default=True)
+    renewed_from = models.OneToOneField('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='renewal')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ('-start_date',)
+        indexes = [
+            models.Index(fields=['start_date'], name='subscription_start_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.name}"
+
+class MaintenanceWindow(models.Model):
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='maintenance_windows')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    reason = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-start_time',)
+
+    def __str__(self):
+        return f"{self.resource.name} maintenance ({self.start_time} - {self.end_time})"
+
+class Occupancy(models.Model):
+    """
+    One row per time range that blocks a resource: approved bookings, active
+    leases and maintenance windows. Kept in step with its source by
+    core_app.occupancy from post_save, so sources are saved in a transaction.
+    """
+    SOURCE_CHOICES = [
+        ('booking', 'Booking'),
+        ('lease', 'Lease'),
+        ('maintenance', 'Maintenance'),
+    ]
+
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='occupancy')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, null=True, blank=True,
+                                   related_name='occupancy')
+    lease = models.OneToOneField(LeaseContract, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='occupancy')
+    maintenance = models.OneToOneField(MaintenanceWindow, on_delete=models.CASCADE, null=True, blank=True,
+                                       related_name='occupancy')
+
+    class Meta:
+        ordering = ('resource_id', 'start_time')
+        verbose_name_plural = 'occupancy'
+        indexes = [
+            # Overlap and "occupied now" lookups: resource equality, then a
+            # range scan over ranges that have not ended yet
+            models.Index(fields=['resource', 'end_time', 'start_time'], name='occupancy_overlap_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')),
+                                   name='occupancy_positive_range'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource.name} {self.source} ({self.start_time} - {self.end_time})"
+
+class Invoice(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('paid', 'Paid'),
+        ('void', 'Void'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoices')
+    period = models.CharField(max_length=7)  # YYYY-MM
+    lease = models.ForeignKey(LeaseContract, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='invoices')
+    subscription = models.ForeignKey(Subscription, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='invoices')
+    line_items = models.JSONField(default=list)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    due_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-period', 'user')
+        constraints = [
+            # One invoice per contract per billing period keeps billing runs idempotent
+            models.UniqueConstraint(fields=['lease', 'period'], name='unique_lease_invoice_per_period'),
+            models.UniqueConstraint(fields=['subscription', 'period'], name='unique_subscription_invoice_per_period'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'period'], name='invoice_user_period_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period} ({self.total})"
+
+class BillingRun(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+    ]
+
+    period = models.CharField(max_length=7, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    last_lease_id = models.BigIntegerField(default=0)
+    last_subscription_id = models.BigIntegerField(default=0)
+    leases_processed = models.PositiveIntegerField(default=0)
+    subscriptions_processed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('-period',)
+
+    def __str__(self):
+        return f"Billing {self.period} ({self.status})"
+
+class WaitlistEntry(models.Model):
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted'),
+        ('withdrawn', 'Withdrawn'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='waitlist_entries')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    booking = models.OneToOneField(Booking, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='waitlist_entry')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-priority', 'created_at')
+        indexes = [
+            # Overlap lookups scan a bounded start_time range per resource
+            models.Index(fields=['resource', 'status', 'start_time'], name='waitlist_overlap_idx'),
+            models.Index(fields=['user', 'status'], name='waitlist_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.resource.name} waitlist ({self.start_time})"
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('dead', 'Dead'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-created_at',)
+        indexes = [
+            # Workers claim by (queue, status, run_at)
+            models.Index(fields=['queue', 'status', 'run_at'], name='job_claim_idx'),
+            models.Index(fields=['status', 'locked_at'], name='job_lock_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+class AuditEntry(models.Model):
+    """
+    Append-only record of a tracked field changing (see core_app.audit).
+    Objects are referenced by content type and id, so entries outlive
+    archived or deleted rows and the users who made the change.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.PROTECT, related_name='+')
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=32)
+    old_value = models.CharField(max_length=32, blank=True)
+    new_value = models.CharField(max_length=32)
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False,
+                              null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Rows are appended in time order, so the primary key gives the
+        # newest-first listing without a separate index
+        ordering = ('-id',)
+        verbose_name_plural = 'audit entries'
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'created_at'], name='audit_object_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model} #{self.object_id} {self.field}: {self.old_value or '-'} -> {self.new_value}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Audit entries are append-only')
+        super().save(*args, **kwargs)
@@ -0,0 +1,157 @@
+"""
+Resource occupancy ledger.
+
+Approved bookings, active leases and maintenance windows all block a
+resource, but live in different tables with different units (datetimes vs
+dates). ``Occupancy`` holds one time range per blocking source row, so a
+conflict check or an "occupied now" lookup is a single indexed query on
+``(resource, end_time, start_time)`` whatever kind of booking or contract
+is in the way.
+
+Rows are written by ``signals.py`` after every save of a source and deleted
+with it by ``on_delete=CASCADE``. The post_save write only commits together
+with the source row when the save runs in a transaction, so application
+code saves sources through ``reservations`` or ``serialized_write`` (the
+admin wraps its saves in one already). ``rebuild`` recreates the ledger
+after bulk writes that bypass signals.
+"""
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Booking, LeaseContract, MaintenanceWindow, Occupancy
+
+BLOCKING_BOOKING_STATUSES = ('approved',)
+BLOCKING_LEASE_STATUSES = ('active',)
+LIVE_STATUS_LABELS = {
+    'available': 'Available',
+    'occupied': 'Occupied',
+    'maintenance': 'Under Maintenance',
+}
+
+
+def lease_range(start_date, end_date):
+    """A lease covers whole days: [start_date 00:00, end_date + 1 day 00:00)"""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start_date, time.min), tz),
+        timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz),
+    )
+
+
+def _sync(source, blocking, lookup, resource_id, start_time, end_time):
+    if not blocking:
+        Occupancy.objects.filter(**lookup).delete()
+        return
+    Occupancy.objects.update_or_create(
+        **lookup,
+        defaults={
+            'source': source,
+            'resource_id': resource_id,
+            'start_time': start_time,
+            'end_time': end_time,
+        }
+    )
+
+
+def sync_booking(booking):
+    _sync('booking', booking.status in BLOCKING_BOOKING_STATUSES, {'booking': booking},
+          booking.resource_id, booking.start_time, booking.end_time)
+
+
+def sync_lease(lease):
+    start_time, end_time = lease_range(lease.start_date, lease.end_date)
+    _sync('lease', lease.status in BLOCKING_LEASE_STATUSES, {'lease': lease},
+          lease.resource_id, start_time, end_time)
+
+
+def sync_maintenance(window):
+    _sync('maintenance', True, {'maintenance': window},
+          window.resource_id, window.start_time, window.end_time)
+
+
+def conflicts(resource, start_time, end_time, booking=None, lease=None):
+    """Ledger rows overlapping [start_time, end_time), ignoring the given source rows"""
+    queryset = Occupancy.objects.filter(
+        resource=resource,
+        end_time__gt=start_time,
+        start_time__lt=end_time
+    )
+    if booking is not None and booking.pk:
+        queryset = queryset.exclude(booking=booking)
+    if lease is not None and lease.pk:
+        queryset = queryset.exclude(lease=lease)
+    return queryset
+
+
+def occupied(resource_ids, at=None):
+    """Return {resource_id: source} for resources blocked at a moment (default now)"""
+    at = at or timezone.now()
+    rows = Occupancy.objects.filter(
+        resource_id__in=resource_ids,
+        end_time__gt=at,
+        start_time__lte=at
+    ).values_list('resource_id', 'source')
+    result = {}
+    for resource_id, source in rows:
+        # Maintenance wins over bookings and leases
+        if result.get(resource_id) != 'maintenance':
+            result[resource_id] = source
+    return result
+
+
+def attach_live_status(resources, at=None):
+    """Set ``live_status`` and its label on each resource from one ledger lookup; returns the list"""
+    resources = list(resources)
+    blocked = occupied([resource.pk for resource in resources], at)
+    for resource in resources:
+        source = blocked.get(resource.pk)
+        if resource.status == 'maintenance' or source == 'maintenance':
+            resource.live_status = 'maintenance'
+        elif source:
+            resource.live_status = 'occupied'
+        else:
+            resource.live_status = 'available'
+        resource.live_status_label = LIVE_STATUS_LABELS[resource.live_status]
+    return resources
+
+
+def _rows(batch_size):
+    bookings = Booking.objects.filter(
+        status__in=BLOCKING_BOOKING_STATUSES,
+        end_time__gt=F('start_time')
+    ).values_list('pk', 'resource_id', 'start_time', 'end_time')
+    for pk, resource_id, start_time, end_time in bookings.iterator(chunk_size=batch_size):
+        yield Occupancy(source='booking', booking_id=pk, resource_id=resource_id,
+                        start_time=start_time, end_time=end_time)
+
+    leases = LeaseContract.objects.filter(
+        status__in=BLOCKING_LEASE_STATUSES,
+        end_date__gte=F('start_date')
+    ).values_list('pk', 'resource_id', 'start_date', 'end_date')
+    for pk, resource_id, start_date, end_date in leases.iterator(chunk_size=batch_size):
+        start_time, end_time = lease_range(start_date, end_date)
+        yield Occupancy(source='lease', lease_id=pk, resource_id=resource_id,
+                        start_time=start_time, end_time=end_time)
+
+    windows = MaintenanceWindow.objects.filter(
+        end_time__gt=F('start_time')
+    ).values_list('pk', 'resource_id', 'start_time', 'end_time')
+    for pk, resource_id, start_time, end_time in windows.iterator(chunk_size=batch_size):
+        yield Occupancy(source='maintenance', maintenance_id=pk, resource_id=resource_id,
+                        start_time=start_time, end_time=end_time)
+
+
+def rebuild(batch_size=5000):
+    """Recreate the whole ledger from its sources; returns the number of rows"""
+    total = 0
+    rows = _rows(batch_size)
+    with transaction.atomic():
+        Occupancy.objects.all().delete()
+        while batch := list(islice(rows, batch_size)):
+            Occupancy.objects.bulk_create(batch)
+            total += len(batch)
+    return total
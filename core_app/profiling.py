@@ -0,0 +1,238 @@
+"""
+On-demand request profiling.
+
+A user who passes ``can_manage_system_settings`` can profile a single
+request by adding ``?_profile=1`` to the URL or sending an ``X-Profile: 1``
+header. That request runs under cProfile, while a sampling thread records
+its call stacks, and every SQL statement is logged with its duration. The
+results are stored in ``PROFILING_DIR``, which keeps the newest
+``PROFILING_KEEP`` profiles, and can be browsed at /system/profiles/.
+
+Only one cProfile can be active per process (on Python 3.12+ it hooks the
+whole interpreter, so it also counts other threads' work). A profiled
+request that overlaps another one gets stack samples and the SQL log only.
+The sampled stacks always belong to the profiled request alone.
+
+Requests without the flag pay one substring check on the query string and
+one header lookup.
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .permissions import can_manage_system_settings
+
+QUERY_FLAG = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+# cProfile is process-wide from Python 3.12
+CPROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+_cprofile_lock = threading.Lock()
+
+
+def _directory():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'space-flow-profiles')
+
+
+def requested(request):
+    """Cheap check for the profiling flag, before any permission lookup"""
+    if request.META.get(HEADER, '').strip().lower() in TRUE_VALUES:
+        return True
+    # Only parse the query string when the flag could be in it
+    if QUERY_FLAG in request.META.get('QUERY_STRING', ''):
+        return request.GET.get(QUERY_FLAG, '').strip().lower() in TRUE_VALUES
+    return False
+
+
+def _start_cprofile():
+    """An enabled profiler, or None if another request (or tool) is profiling this process"""
+    if not _cprofile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool, such as coverage, holds the interpreter hook
+        _cprofile_lock.release()
+        return None
+    return profiler
+
+
+def _stop_cprofile(profiler):
+    if profiler is not None:
+        profiler.disable()
+        _cprofile_lock.release()
+
+
+def allowed(request):
+    try:
+        return request.user.is_authenticated and can_manage_system_settings(request.user)
+    except AttributeError:
+        return False
+
+
+class StackSampler(threading.Thread):
+    """Sample one thread's call stack at a fixed interval into folded stacks"""
+
+    def __init__(self, thread_id, interval, root=None):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        # Frames above root (server and outer middleware) are left out
+        self.root = root
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                if frame is self.root:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def profile_request(request, get_response):
+    """Run get_response under the profilers and store the results; returns the response"""
+    queries = []
+
+    def log_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries.append({'sql': sql, 'ms': round((time.perf_counter() - start) * 1000, 3)})
+
+    sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001),
+                           root=sys._getframe())
+    started_at = timezone.now()
+    start = time.perf_counter()
+    sampler.start()
+    with connection.execute_wrapper(log_query):
+        profiler = _start_cprofile()
+        try:
+            response = get_response(request)
+        finally:
+            _stop_cprofile(profiler)
+            sampler.stop()
+    duration = time.perf_counter() - start
+
+    profile_id = f"{started_at:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    meta = {
+        'id': profile_id,
+        'path': request.get_full_path(),
+        'method': request.method,
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'started_at': started_at.isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'query_count': len(queries),
+        'query_ms': round(sum(query['ms'] for query in queries), 3),
+        'samples': sum(sampler.stacks.values()),
+        'cprofile': profiler is not None,
+        'cprofile_all_threads': profiler is not None and CPROFILE_ALL_THREADS,
+    }
+    save(profile_id, meta, profiler, queries, sampler.stacks)
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def save(profile_id, meta, profiler, queries, stacks):
+    directory = _directory()
+    os.makedirs(directory, exist_ok=True)
+    if profiler is not None:
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+    with open(os.path.join(directory, f'{profile_id}.folded'), 'w') as f:
+        f.writelines(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+        json.dump(dict(meta, queries=queries), f)
+    rotate()
+
+
+def rotate(keep=None):
+    """Delete all but the newest ``keep`` profiles"""
+    if keep is None:
+        keep = getattr(settings, 'PROFILING_KEEP', 50)
+    for profile_id in profile_ids()[keep:]:
+        for suffix in ('.json', '.prof', '.folded'):
+            try:
+                os.unlink(os.path.join(_directory(), profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def profile_ids():
+    """Stored profile ids, newest first"""
+    directory = _directory()
+    if not os.path.isdir(directory):
+        return []
+    return sorted((name[:-5] for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+
+
+def _path(profile_id, suffix):
+    # Ids come from URLs; never let them leave the profile directory
+    if os.path.basename(profile_id) != profile_id:
+        raise FileNotFoundError(profile_id)
+    return os.path.join(_directory(), profile_id + suffix)
+
+
+def load(profile_id):
+    """Return the metadata and SQL log of one profile"""
+    with open(_path(profile_id, '.json')) as f:
+        return json.load(f)
+
+
+def list_profiles():
+    profiles = []
+    for profile_id in profile_ids():
+        try:
+            meta = load(profile_id)
+        except (OSError, ValueError):
+            continue
+        meta.pop('queries', None)
+        profiles.append(meta)
+    return profiles
+
+
+def top_functions(profile_id, limit=40, sort='cumulative'):
+    """The most expensive functions of a profile as dicts; empty if it has no cProfile data"""
+    path = _path(profile_id, '.prof')
+    if not os.path.exists(path):
+        return []
+    stats = pstats.Stats(path)
+    key = 3 if sort == 'cumulative' else 2
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+    return [{
+        'function': pstats.func_std_string(func),
+        'calls': calls,
+        'primitive_calls': primitive_calls,
+        'tottime_ms': round(tottime * 1000, 3),
+        'cumtime_ms': round(cumtime * 1000, 3),
+    } for func, (primitive_calls, calls, tottime, cumtime, callers) in rows]
+
+
+def folded_stacks(profile_id):
+    """Sampled stacks in the folded format used by flamegraph.pl and speedscope"""
+    with open(_path(profile_id, '.folded')) as f:
+        return f.read()
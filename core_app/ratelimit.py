@@ -0,0 +1,186 @@
+"""
+Token-bucket rate limiting.
+
+Policies live in ``settings.RATELIMITS``, keyed by URL name:
+
+    'login': {'rate': '10/m', 'burst': 5, 'key': ('ip', 'username'), 'methods': ('POST',)}
+
+``rate`` is the refill rate ("<count>/<s|m|h|d>"), ``burst`` the bucket
+size, and ``key`` the scopes that each get their own bucket: ``ip``,
+``user`` (the signed-in user, or the IP for anonymous requests) and
+``username`` (the username submitted in the POST body). A request must get
+a token from every bucket. When a bucket is empty the request gets a 429
+with Retry-After.
+
+``RateLimitMiddleware`` applies a policy to the view of the same URL name.
+The ``ratelimit`` decorator applies one to a specific view.
+
+Each bucket is one integer in the ``RATELIMIT_CACHE`` cache: the
+"theoretical arrival time" of the generic cell rate algorithm, which is
+equivalent to a token bucket. Consuming a token is an atomic ``incr`` by
+the refill interval, so concurrent workers sharing a Redis or Memcached
+cache cannot both take the last token. Catching an idle bucket up to the
+present is a read-modify-write, so it runs under a short ``cache.add`` lock.
+The check makes no database queries.
+"""
+import math
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import metrics
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_PATTERN = re.compile(r'^(\d+)/(\d*)([smhd])$')
+DEFAULT_METHODS = ('POST',)
+
+_policies = {}
+
+
+class Policy:
+    def __init__(self, name, rate, burst=None, key=('user',), methods=DEFAULT_METHODS):
+        match = RATE_PATTERN.match(rate)
+        if not match:
+            raise ValueError(f'Invalid rate "{rate}" for rate limit policy "{name}"')
+        count, multiplier, unit = match.groups()
+        period_ms = int(multiplier or 1) * UNITS[unit] * 1000
+        self.name = name
+        # Milliseconds for one token to refill
+        self.interval = max(1, period_ms // int(count))
+        self.burst = burst or int(count)
+        self.window = self.burst * self.interval
+        self.timeout = math.ceil(self.window / 1000) + 1
+        self.scopes = (key,) if isinstance(key, str) else tuple(key)
+        self.methods = tuple(method.upper() for method in methods)
+
+
+def get_policy(name):
+    """Return the Policy configured under ``name``, or None"""
+    policy = _policies.get(name)
+    if policy is None:
+        config = getattr(settings, 'RATELIMITS', {}).get(name)
+        if config is None:
+            return None
+        policy = _policies[name] = Policy(name, **config)
+    return policy
+
+
+def client_ip(request):
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', '')
+    if header and request.META.get(header):
+        # The proxy appends the address it saw, so the last entry is the one to trust
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _identities(policy, request):
+    for scope in policy.scopes:
+        if scope == 'ip':
+            yield f'ip:{client_ip(request)}'
+        elif scope == 'user':
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                yield f'user:{user.pk}'
+            else:
+                yield f'ip:{client_ip(request)}'
+        elif scope == 'username':
+            username = request.POST.get('username', '').strip().lower()
+            if username:
+                yield f'username:{username[:150]}'
+        else:
+            raise ValueError(f'Unknown rate limit scope "{scope}" in policy "{policy.name}"')
+
+
+def _consume(cache, key, policy, now):
+    """Take one token; returns the bucket's new arrival time in milliseconds"""
+    try:
+        tat = cache.incr(key, policy.interval)
+    except ValueError:
+        # New or expired bucket: it is full, minus this request
+        if cache.add(key, now + policy.interval, policy.timeout):
+            return now + policy.interval
+        tat = cache.incr(key, policy.interval)
+    if tat < now + policy.interval:
+        # The bucket refilled while idle; move the arrival time up to now
+        tat = _catch_up(cache, key, policy, now, tat)
+    cache.touch(key, policy.timeout)
+    return tat
+
+
+def _catch_up(cache, key, policy, now, tat):
+    """
+    Clamp the arrival time to at least now plus one interval. Requests
+    arriving together after an idle period all see a stale value, so only
+    the one holding the catch-up lock moves it, by the difference from a
+    fresh read; tokens taken by the others stay counted on top.
+    """
+    lock_key = f'{key}:catch-up'
+    if not cache.add(lock_key, 1, 1):
+        # Another request is catching the bucket up; it was full either way
+        return tat
+    try:
+        current = cache.get(key)
+        if current is None or current >= now + policy.interval:
+            return tat
+        return cache.incr(key, now + policy.interval - current)
+    finally:
+        cache.delete(lock_key)
+
+
+def check(policy, request):
+    """Return 0 if the request may proceed, else the seconds until it may retry"""
+    cache = caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+    now = int(time.time() * 1000)
+    taken = []
+    for identity in _identities(policy, request):
+        key = f'rl:{policy.name}:{identity}'
+        tat = _consume(cache, key, policy, now)
+        if tat - now > policy.window:
+            # Give back the tokens taken from this and earlier buckets
+            for refund_key in taken + [key]:
+                cache.decr(refund_key, policy.interval)
+            return max(1, math.ceil((tat - policy.window - now) / 1000))
+        taken.append(key)
+    return 0
+
+
+def too_many_requests(policy, retry_after):
+    metrics.inc('spaceflow_ratelimited_total', policy=policy.name)
+    response = HttpResponse(
+        f'Too many requests. Please try again in {retry_after} seconds.\n',
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def limit(policy, request):
+    """Apply a policy to a request; returns a 429 response or None"""
+    if not getattr(settings, 'RATELIMIT_ENABLED', True) or request.method not in policy.methods:
+        return None
+    retry_after = check(policy, request)
+    if retry_after:
+        return too_many_requests(policy, retry_after)
+    return None
+
+
+def ratelimit(name):
+    """Decorator applying the settings.RATELIMITS policy ``name`` to a view"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            policy = get_policy(name)
+            if policy is not None:
+                response = limit(policy, request)
+                if response is not None:
+                    return response
+            return view_func(request, *args, **kwargs)
+        # Tell RateLimitMiddleware the view already enforces its own policy
+        wrapper.ratelimited = True
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+"""
+Booking and lease state changes that must agree with the occupancy ledger.
+
+Approving a booking makes it block its resource, so the conflict check and
+the status change run in one serialized write transaction, with the
+resource row locked where the database supports it. Two approvals for
+overlapping pending bookings then queue up, and the second one sees the
+first in the ledger.
+
+New bookings are checked the same way: ``create`` re-runs the check that
+``BookingForm`` made and saves in the same transaction, so nothing approved
+in between can slip under it.
+
+Leases follow the same path: ``create_lease`` and ``activate_lease`` lock
+the resource and re-check the ledger for the lease's whole days before
+saving, so two overlapping pending leases cannot both become active.
+
+Only pending bookings can be approved or rejected, and only pending leases
+activated. Cancelled, rejected and completed bookings stay that way.
+"""
+from django.core.exceptions import ValidationError
+
+from . import metrics, occupancy
+from .db import serialized_write
+from .models import Booking, LeaseContract, Resource
+
+
+def _lock_resource(resource_id):
+    list(Resource.objects.select_for_update().filter(pk=resource_id).values_list('pk'))
+
+
+def _check_free(booking):
+    if occupancy.conflicts(booking.resource_id, booking.start_time, booking.end_time, booking=booking).exists():
+        metrics.inc('spaceflow_booking_conflicts_total')
+        raise ValidationError('This time slot is already booked', code='conflict')
+
+
+def _check_lease_free(lease):
+    start_time, end_time = occupancy.lease_range(lease.start_date, lease.end_date)
+    if occupancy.conflicts(lease.resource_id, start_time, end_time, lease=lease).exists():
+        raise ValidationError('This resource is already booked or leased for the selected period', code='conflict')
+
+
+def _lock_pending(booking):
+    """Lock the booking's resource, then re-read the booking; it must still be pending"""
+    _lock_resource(booking.resource_id)
+    current = Booking.objects.select_for_update().get(pk=booking.pk)
+    if current.status != 'pending':
+        raise ValidationError(f'A {current.get_status_display().lower()} booking cannot be changed',
+                              code='status')
+    return current
+
+
+@serialized_write
+def create(booking):
+    """Save a new booking unless the ledger now has something overlapping it"""
+    _lock_resource(booking.resource_id)
+    _check_free(booking)
+    booking.save()
+    return booking
+
+
+@serialized_write
+def approve(booking):
+    """Approve a pending booking unless the ledger now has something overlapping it"""
+    booking = _lock_pending(booking)
+    _check_free(booking)
+    booking.status = 'approved'
+    booking.save()
+    return booking
+
+
+@serialized_write
+def reject(booking):
+    """Reject a pending booking"""
+    booking = _lock_pending(booking)
+    booking.status = 'rejected'
+    booking.save()
+    return booking
+
+
+@serialized_write
+def create_lease(lease):
+    """Save a new lease unless the ledger now has something overlapping it"""
+    _lock_resource(lease.resource_id)
+    _check_lease_free(lease)
+    lease.save()
+    return lease
+
+
+@serialized_write
+def activate_lease(lease):
+    """Activate a pending lease unless the ledger now has something overlapping it"""
+    _lock_resource(lease.resource_id)
+    lease = LeaseContract.objects.select_for_update().get(pk=lease.pk)
+    if lease.status != 'pending':
+        raise ValidationError(f'A {lease.status} lease cannot be approved', code='status')
+    _check_lease_free(lease)
+    lease.status = 'active'
+    lease.save()
+    return lease
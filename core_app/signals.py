@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import (
+    UserProfile, MembershipPlan, Subscription, Booking, ArchivedBooking, Location, Resource,
+    LeaseContract, MaintenanceWindow
+)
+from . import audit, entitlements, facets, metrics, occupancy, sites, user_snapshot, waitlist, widgets
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -28,4 +32,106 @@ def save_user_profile(sender, instance, **kwargs):
             phone_number='',
             address='',
             company_name=''
-        ) 
\ No newline at end of file
+        )
+
+@receiver([post_save, post_delete], sender=MembershipPlan)
+def invalidate_plan_matrix(sender, instance, **kwargs):
+    """Reload the access matrix when a plan changes."""
+    entitlements.invalidate_plan_matrix()
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_subscription_entitlements(sender, instance, **kwargs):
+    """Drop the cached entitlements of the subscription's owner."""
+    entitlements.invalidate_user_entitlements(instance.user_id)
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_subscription_widget(sender, instance, **kwargs):
+    """Refresh the owner's subscription tile on the dashboard."""
+    widgets.invalidate(instance.user_id, 'subscription')
+
+@receiver(post_save, sender=Booking)
+def invalidate_booking_widgets(sender, instance, **kwargs):
+    """Refresh the owner's booking tiles on the dashboard."""
+    # No post_delete receiver: it would stop archiving from fast-deleting bookings
+    widgets.invalidate(instance.user_id, 'bookings')
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    """Make sessions reload the cached user and profile."""
+    user_id = instance.pk if sender is User else instance.user_id
+    user_snapshot.invalidate_user_snapshot(user_id)
+
+@receiver(post_init, sender=Booking)
+def remember_booking_status(sender, instance, **kwargs):
+    """Keep the loaded status so saves can detect transitions."""
+    instance._loaded_status = instance.__dict__.get('status')
+
+@receiver(post_save, sender=Booking)
+def sync_booking_occupancy(sender, instance, **kwargs):
+    """Mirror the booking into the occupancy ledger."""
+    occupancy.sync_booking(instance)
+
+@receiver(post_save, sender=LeaseContract)
+def sync_lease_occupancy(sender, instance, **kwargs):
+    """Mirror the lease into the occupancy ledger."""
+    occupancy.sync_lease(instance)
+
+@receiver(post_save, sender=MaintenanceWindow)
+def sync_maintenance_occupancy(sender, instance, **kwargs):
+    """Mirror the maintenance window into the occupancy ledger."""
+    occupancy.sync_maintenance(instance)
+
+@receiver(post_save, sender=Booking)
+def release_freed_slot(sender, instance, created, **kwargs):
+    """Offer a cancelled or rejected slot to the waitlist."""
+    if (not created and instance._loaded_status == 'approved'
+            and instance.status in ('cancelled', 'rejected')):
+        waitlist.release(instance)
+
+@receiver(post_save, sender=Booking)
+def count_booking_transitions(sender, instance, created, **kwargs):
+    """Feed the booking created/approved counters, then remember the new status."""
+    if created:
+        metrics.inc('spaceflow_bookings_created_total')
+    if instance.status == 'approved' and (created or instance._loaded_status != 'approved'):
+        metrics.inc('spaceflow_bookings_approved_total')
+    instance._loaded_status = instance.status
+
+
+@receiver([post_save, post_delete], sender=Location)
+def invalidate_sites(sender, instance, **kwargs):
+    """Refresh the cached site list."""
+    sites.invalidate_sites()
+    facets.bump_version()
+
+@receiver([post_save, post_delete], sender=Resource)
+def invalidate_resource_facets(sender, instance, **kwargs):
+    """Recount the resource facets."""
+    facets.bump_version()
+
+@receiver(post_init, sender=Resource)
+def remember_resource_site(sender, instance, **kwargs):
+    """Keep the loaded site so saves can detect a move."""
+    instance._loaded_site_id = instance.__dict__.get('site_id')
+
+@receiver(post_save, sender=Resource)
+def move_resource_bookings(sender, instance, created, **kwargs):
+    """Keep the site copied onto bookings in step with their resource."""
+    if not created and instance._loaded_site_id != instance.site_id:
+        Booking.objects.filter(resource=instance).update(site=instance.site_id)
+        ArchivedBooking.objects.filter(resource=instance).update(site=instance.site_id)
+    instance._loaded_site_id = instance.site_id
+
+
+def remember_audited_fields(sender, instance, **kwargs):
+    """Keep the loaded values of audited fields so saves can detect transitions."""
+    audit.remember(instance)
+
+def record_audited_transitions(sender, instance, created, **kwargs):
+    """Buffer an audit entry for each audited field that changed."""
+    audit.record_changes(instance, created)
+
+for audited_model in audit.TRACKED_FIELDS:
+    post_init.connect(remember_audited_fields, sender=audited_model)
+    post_save.connect(record_audited_transitions, sender=audited_model)
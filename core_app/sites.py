@@ -0,0 +1,54 @@
+"""
+Multi-site support.
+
+Every resource belongs to a ``Location`` (a building). A user may pick a
+"current site" on their profile; site-aware views, dashboards and the admin
+then narrow their querysets with ``for_site(current_site(user))``, which
+filters on a ``site_id`` column that leads the relevant indexes. With no
+current site selected, everything is shown.
+
+The site list is small and read on every page (for the switcher), so it is
+cached and dropped from ``signals.py`` whenever a location changes.
+"""
+from django.core.cache import cache
+
+from .models import Location, UserProfile
+
+SITES_CACHE_KEY = 'sites:active'
+SITES_CACHE_TIMEOUT = 60 * 60
+
+
+def active_sites():
+    """Return the active locations, cached"""
+    sites = cache.get(SITES_CACHE_KEY)
+    if sites is None:
+        sites = list(Location.objects.filter(is_active=True))
+        cache.set(SITES_CACHE_KEY, sites, SITES_CACHE_TIMEOUT)
+    return sites
+
+
+def current_site(user):
+    """Return the user's selected Location, or None for all sites"""
+    if not user.is_authenticated:
+        return None
+    try:
+        site_id = user.userprofile.current_site_id
+    except UserProfile.DoesNotExist:
+        return None
+    if site_id is None:
+        return None
+    for site in active_sites():
+        if site.pk == site_id:
+            return site
+    return None
+
+
+def set_current_site(user, site):
+    """Store the user's site preference (None clears it)"""
+    profile = user.userprofile
+    profile.current_site = site
+    profile.save(update_fields=['current_site', 'updated_at'])
+
+
+def invalidate_sites():
+    cache.delete(SITES_CACHE_KEY)
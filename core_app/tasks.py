@@ -0,0 +1,47 @@
+"""
+Background tasks run by ``manage.py run_worker``.
+
+Tasks take JSON-serializable keyword arguments (usually primary keys) and
+re-read whatever they need, since the row may have changed since enqueueing.
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+from PIL import Image, ImageOps
+
+from .jobs import task
+from .models import Booking, UserProfile
+
+PROFILE_PICTURE_SIZE = (512, 512)
+
+
+@task
+def send_booking_approved_email(booking_id):
+    """Tell a member their booking was approved"""
+    booking = Booking.objects.select_related('user', 'resource').filter(pk=booking_id).first()
+    if booking is None or booking.status != 'approved' or not booking.user.email:
+        return
+    send_mail(
+        subject=f'Booking approved: {booking.resource.name}',
+        message=(
+            f'Hi {booking.user.get_full_name() or booking.user.username},\n\n'
+            f'Your booking of {booking.resource.name} from '
+            f'{booking.start_time:%b %d, %Y %H:%M} to {booking.end_time:%H:%M} has been approved.\n'
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[booking.user.email],
+    )
+
+
+@task
+def process_profile_picture(profile_id):
+    """Normalize orientation and shrink an uploaded profile picture in place"""
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile is None or not profile.profile_picture:
+        return
+    with profile.profile_picture.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.width <= PROFILE_PICTURE_SIZE[0] and image.height <= PROFILE_PICTURE_SIZE[1]:
+        return
+    image.thumbnail(PROFILE_PICTURE_SIZE)
+    image.save(profile.profile_picture.path)
@@ -0,0 +1,77 @@
+import logging
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.utils import timezone
+
+from core_app import metrics
+from core_app.models import MembershipPlan, Resource, Subscription, UserProfile
+
+
+def make_user(username, role='member'):
+    user = User.objects.create_user(username, password='pass')
+    UserProfile.objects.filter(user=user).update(role=role)
+    return User.objects.get(pk=user.pk)
+
+
+def make_resource(name='Desk 1', type='desk', **kwargs):
+    kwargs.setdefault('price_per_hour', Decimal('10.00'))
+    return Resource.objects.create(name=name, type=type, location='Floor 1', **kwargs)
+
+
+def make_plan(access_level, name=None, **kwargs):
+    return MembershipPlan.objects.create(
+        name=name or access_level, description='', price=Decimal('100.00'),
+        duration_days=30, access_level=access_level, **kwargs
+    )
+
+
+def subscribe(user, plan):
+    today = timezone.localdate()
+    return Subscription.objects.create(user=user, plan=plan, start_date=today,
+                                       end_date=today + timedelta(days=30))
+
+
+def slot(hours_from_now=24, length=2):
+    start = (timezone.now() + timedelta(hours=hours_from_now)).replace(second=0, microsecond=0)
+    return start, start + timedelta(hours=length)
+
+
+@contextmanager
+def quiet_logs():
+    """Keep the JSON log off the test output; assertLogs still captures records"""
+    handlers = logging.getLogger().handlers
+    levels = [handler.level for handler in handlers]
+    for handler in handlers:
+        handler.setLevel(logging.CRITICAL + 1)
+    try:
+        yield
+    finally:
+        for handler, level in zip(handlers, levels):
+            handler.setLevel(level)
+
+
+# A fast hasher: most tests create and log in several users
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TestCase(DjangoTestCase):
+    """
+    The LocMem cache outlives each test's transaction, so every test starts
+    with it empty. Metrics go to a temporary directory and are forgotten
+    afterwards, so test traffic never reaches the deployment's counters.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(quiet_logs())
+
+    def setUp(self):
+        cache.clear()
+        metrics_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(METRICS_DIR=metrics_dir))
+        self.addCleanup(metrics.registry.reset)
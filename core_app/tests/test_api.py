@@ -0,0 +1,111 @@
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core_app.models import Booking, LeaseContract
+
+from .base import TestCase, make_plan, make_resource, make_user, slot, subscribe
+
+
+class ApiKeysetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = make_user('member')
+        other = make_user('other')
+        resource = make_resource()
+        start, end = slot()
+        # Pairs share a start time, so pages must break ties on the id
+        for i in range(7):
+            Booking.objects.create(user=self.member, resource=resource, total_price=0,
+                                   start_time=start + timedelta(hours=i // 2),
+                                   end_time=end + timedelta(hours=i // 2))
+        Booking.objects.create(user=other, resource=resource, start_time=start, end_time=end, total_price=0)
+        self.client.login(username='member', password='pass')
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_visit_every_row_once_in_order(self):
+        ids, params = [], {'limit': 2, 'fields': 'id'}
+        while True:
+            page = self.get('/api/v1/bookings/', **params)
+            ids += [row['id'] for row in page['data']]
+            if page['next'] is None:
+                break
+            params['cursor'] = page['next']
+        expected = list(Booking.objects.filter(user=self.member).order_by('-start_time', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_sparse_fields_always_include_the_id(self):
+        row = self.get('/api/v1/bookings/', fields='status', limit=1)['data'][0]
+        self.assertEqual(set(row), {'id', 'status'})
+
+    def test_invalid_cursor_is_a_client_error(self):
+        response = self.client.get('/api/v1/bookings/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_limit_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=3):
+            self.assertEqual(len(self.get('/api/v1/bookings/', limit=100)['data']), 3)
+
+    def test_included_rows_follow_the_collection_scope(self):
+        subscribe(self.member, make_plan('desk'))
+        subscribe(self.member, make_plan('all', name='Retired', is_active=False))
+        payload = self.get('/api/v1/subscriptions/', include='plan')
+        self.assertEqual(len(payload['data']), 2)
+        self.assertEqual([plan['name'] for plan in payload['included']['plans'].values()], ['desk'])
+
+
+class ApiWriteTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = make_user('member')
+        subscribe(self.member, make_plan('desk'))
+        self.staff = make_user('staff', role='staff')
+        self.desk = make_resource('Desk 1', 'desk')
+        self.room = make_resource('Room 1', 'meeting_room')
+        self.office = make_resource('Office 1', 'office')
+
+    def send(self, method, url, data):
+        return getattr(self.client, method)(url, json.dumps(data), content_type='application/json')
+
+    def test_booking_outside_plan_is_forbidden(self):
+        self.client.login(username='member', password='pass')
+        start, end = slot()
+        response = self.send('post', '/api/v1/bookings/', {
+            'resource': self.room.pk, 'start_time': start.isoformat(), 'end_time': end.isoformat(),
+        })
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_overlapping_booking_approval_is_a_conflict(self):
+        start, end = slot()
+        first, second = [
+            Booking.objects.create(user=self.member, resource=self.desk, start_time=start + timedelta(hours=i),
+                                   end_time=end + timedelta(hours=i), total_price=0)
+            for i in range(2)
+        ]
+        self.client.login(username='staff', password='pass')
+        self.assertEqual(self.send('patch', f'/api/v1/bookings/{first.pk}/', {'status': 'approved'}).status_code, 200)
+        self.assertEqual(self.send('patch', f'/api/v1/bookings/{second.pk}/', {'status': 'approved'}).status_code, 409)
+        self.assertEqual(self.send('patch', f'/api/v1/bookings/{first.pk}/', {'status': 'rejected'}).status_code, 400)
+
+    def test_overlapping_lease_activation_is_a_conflict(self):
+        self.client.login(username='staff', password='pass')
+        start = timezone.localdate() + timedelta(days=7)
+        ids = []
+        for offset in (0, 10):
+            response = self.send('post', '/api/v1/leases/', {
+                'resource': self.office.pk, 'start_date': str(start + timedelta(days=offset)),
+                'end_date': str(start + timedelta(days=offset + 30)), 'monthly_rent': '500.00',
+                'deposit_amount': '0.00', 'terms_and_conditions': 'Standard terms',
+            })
+            self.assertEqual(response.status_code, 201, response.content)
+            ids.append(response.json()['data']['id'])
+        self.assertEqual(self.send('patch', f'/api/v1/leases/{ids[0]}/', {'status': 'active'}).status_code, 200)
+        self.assertEqual(self.send('patch', f'/api/v1/leases/{ids[1]}/', {'status': 'active'}).status_code, 409)
+        self.assertEqual(LeaseContract.objects.get(pk=ids[1]).status, 'pending')
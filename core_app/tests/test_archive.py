@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+
+from core_app import archive, pagination
+from core_app.models import ArchivedBooking, Booking
+
+from .base import TestCase, make_resource, make_user
+
+
+def book(user, resource, days_ago, status='completed'):
+    start = (timezone.now() - timedelta(days=days_ago)).replace(hour=9, minute=0, second=0, microsecond=0)
+    return Booking.objects.create(user=user, resource=resource, start_time=start,
+                                  end_time=start + timedelta(hours=1), total_price=12, status=status)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('member')
+        self.resource = make_resource()
+        self.horizon = archive.retention_horizon(180)
+
+    def book(self, days_ago, status='completed'):
+        return book(self.user, self.resource, days_ago, status)
+
+    def archive(self, batch_size=1000):
+        return list(archive.archive_bookings(self.horizon, batch_size))
+
+    def test_old_decided_bookings_move_to_the_archive(self):
+        old = [self.book(400, status) for status in ('completed', 'cancelled', 'rejected', 'approved')]
+        self.assertEqual(self.archive(), [4])
+        self.assertFalse(Booking.objects.filter(pk__in=[booking.pk for booking in old]).exists())
+        archived = ArchivedBooking.objects.get(pk=old[1].pk)
+        self.assertEqual((archived.status, archived.total_price, archived.start_time, archived.user_id),
+                         ('cancelled', 12, old[1].start_time, self.user.pk))
+
+    def test_recent_and_pending_bookings_stay(self):
+        recent = self.book(10)
+        upcoming = self.book(-3, 'approved')
+        pending = self.book(400, 'pending')
+        self.assertEqual(self.archive(), [])
+        self.assertEqual(set(Booking.objects.values_list('pk', flat=True)), {recent.pk, upcoming.pk, pending.pk})
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    def test_moves_in_batches(self):
+        for days_ago in range(200, 205):
+            self.book(days_ago)
+        self.assertEqual(self.archive(batch_size=2), [2, 2, 1])
+        self.assertEqual(ArchivedBooking.objects.count(), 5)
+
+    def test_rerunning_is_harmless(self):
+        booking = self.book(400)
+        # Copied by an earlier run that stopped before deleting
+        ArchivedBooking.objects.create(**Booking.objects.filter(pk=booking.pk).values(*archive.ARCHIVED_FIELDS)[0])
+        self.assertEqual(self.archive(), [1])
+        self.assertEqual(self.archive(), [])
+        self.assertEqual(ArchivedBooking.objects.count(), 1)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_history_reads_both_tables_newest_first(self):
+        archived = self.book(400)
+        self.archive()
+        recent = self.book(10)
+        self.assertEqual([booking.pk for booking in archive.booking_history(user=self.user)],
+                         [recent.pk, archived.pk])
+
+
+class HistoryKeysetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('member')
+        self.resource = make_resource()
+        # Pairs share a start time, and the first two pairs are split across the two tables
+        bookings = [book(self.user, self.resource, days_ago) for days_ago in (300, 300, 200, 200, 5, 5, 1)]
+        moved = [bookings[0].pk, bookings[3].pk]
+        ArchivedBooking.objects.bulk_create(
+            ArchivedBooking(**row) for row in Booking.objects.filter(pk__in=moved).values(*archive.ARCHIVED_FIELDS)
+        )
+        Booking.objects.filter(pk__in=moved).delete()
+        self.expected = sorted([(booking.start_time, booking.pk) for booking in bookings], reverse=True)
+
+    def pages(self, limit):
+        pages, before = [], None
+        while True:
+            rows = archive.booking_history(limit=limit + 1, before=before)
+            pages.append([(booking.start_time, booking.pk) for booking in rows[:limit]])
+            if len(rows) <= limit:
+                return pages
+            before = pagination.decode_keyset(pagination.encode_keyset(*pages[-1][-1]))
+
+    def test_pages_break_ties_on_the_id(self):
+        for limit in (1, 2, 3):
+            pages = self.pages(limit)
+            self.assertEqual([row for page in pages for row in page], self.expected)
+            self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+
+    def test_cursor_round_trips(self):
+        start_time, pk = self.expected[0]
+        self.assertEqual(pagination.decode_keyset(pagination.encode_keyset(start_time, pk)), (start_time, pk))
+        self.assertIsNone(pagination.decode_keyset('not-a-cursor'))
+
+    @mock.patch('core_app.views.BOOKINGS_PER_PAGE', 3)
+    def test_booking_list_pages_follow_the_older_link(self):
+        self.client.force_login(make_user('staff', role='staff'))
+        seen, query = [], 'history=1'
+        while query:
+            response = self.client.get(f'/bookings/?{query}')
+            self.assertEqual(response.status_code, 200)
+            seen += [booking.pk for booking in response.context['bookings']]
+            query = response.context['next_query']
+        self.assertEqual(seen, [pk for _, pk in self.expected])
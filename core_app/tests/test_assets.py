@@ -0,0 +1,103 @@
+import gzip
+import os
+import tempfile
+from unittest import mock
+
+from django.test import RequestFactory
+from django.urls import reverse
+
+from core_app import assets
+
+from .base import TestCase
+
+CSS = b'.card { padding: 1rem; }\n' * 40
+
+
+class BuiltAssetsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(assets, '_built', False))
+
+    def test_pages_fall_back_to_the_cdn_until_the_build_has_run(self):
+        with mock.patch('core_app.assets.finders.find', return_value=None):
+            response = self.client.get(reverse('login'))
+        self.assertContains(response, 'https://cdn.tailwindcss.com/')
+        self.assertNotContains(response, 'core_app/dist/app.css')
+
+    def test_built_assets_replace_the_cdn(self):
+        with mock.patch('core_app.assets.finders.find', return_value='/built') as find:
+            response = self.client.get(reverse('login'))
+            self.assertTrue(assets.built())
+        self.assertContains(response, 'core_app/dist/app.css')
+        self.assertNotContains(response, 'cdn.tailwindcss.com')
+        # A positive answer is kept for the process
+        self.assertEqual(find.call_count, len(assets.BUILT_ASSETS))
+
+    def test_a_manifest_decides_when_collectstatic_has_run(self):
+        storage = mock.Mock(hashed_files={'core_app/dist/app.css': 'core_app/dist/app.1.css'})
+        with mock.patch('core_app.assets.staticfiles_storage', storage):
+            self.assertFalse(assets.built())
+            storage.hashed_files['core_app/dist/alpine.min.js'] = 'core_app/dist/alpine.min.1.js'
+            self.assertTrue(assets.built())
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        self.write('app.3f2a9c1e04b7.css', CSS)
+        self.write('app.3f2a9c1e04b7.css.gz', gzip.compress(CSS))
+        self.write('app.3f2a9c1e04b7.css.br', b'brotli')
+        self.write('robots.txt', b'User-agent: *\n')
+        storage = mock.Mock(hashed_files={'app.css': 'app.3f2a9c1e04b7.css'})
+        self.enterContext(mock.patch('core_app.assets.staticfiles_storage', storage))
+        self.static_files = assets.StaticFiles(self.root)
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(data)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def get(self, name, method='get', **headers):
+        request = getattr(RequestFactory(), method)('/static/' + name, headers=headers)
+        response = self.static_files.serve(request, name)
+        self.addCleanup(response.close)
+        return response
+
+    def test_serves_the_best_accepted_variant(self):
+        response = self.get('app.3f2a9c1e04b7.css', accept_encoding='gzip, br')
+        self.assertEqual((response['Content-Encoding'], response['Vary']), ('br', 'Accept-Encoding'))
+        response = self.get('app.3f2a9c1e04b7.css', accept_encoding='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response = self.get('app.3f2a9c1e04b7.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(b''.join(response.streaming_content), CSS)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertNotIn('Content-Disposition', response)
+
+    def test_only_hashed_names_are_immutable(self):
+        self.assertEqual(self.get('app.3f2a9c1e04b7.css')['Cache-Control'], assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get('robots.txt')['Cache-Control'], assets.MUTABLE_CACHE_CONTROL)
+
+    def test_conditional_and_head_requests(self):
+        etag = self.get('robots.txt')['ETag']
+        self.assertEqual(self.get('robots.txt', if_none_match=etag).status_code, 304)
+        response = self.get('robots.txt', method='head')
+        self.assertEqual((response.content, response['Content-Length']), (b'', '14'))
+
+    def test_missing_and_outside_files_are_not_found(self):
+        self.assertEqual(self.get('missing.css').status_code, 404)
+        self.assertEqual(self.get('../../etc/passwd').status_code, 404)
+
+    def test_collectstatic_keeps_only_smaller_variants(self):
+        storage = assets.PrecompressedManifestStaticFilesStorage(location=self.root)
+        self.write('big.css', CSS)
+        self.write('small.css', b'a{}')
+        for name in ('big.css', 'small.css', 'robots.txt'):
+            storage.compress(name)
+        self.assertEqual(gzip.decompress(self.read('big.css.gz')), CSS)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'small.css.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'robots.txt.gz')))
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.db import DatabaseError, transaction
+from django.urls import reverse
+
+from core_app import audit
+from core_app.models import AuditEntry, Booking
+
+from .base import TestCase, make_resource, make_user, slot
+
+
+class AuditTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = make_user('member')
+        self.staff = make_user('staff', role='staff')
+        start, end = slot()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = Booking.objects.create(user=self.member, resource=make_resource(),
+                                                  start_time=start, end_time=end, total_price=0)
+
+    def transitions(self):
+        return [(entry.old_value, entry.new_value, entry.actor_id) for entry in reversed(audit.history(self.booking))]
+
+    def set_status(self, status):
+        self.booking.status = status
+        self.booking.save()
+
+    def test_transitions_are_recorded_with_their_actor(self):
+        with self.captureOnCommitCallbacks(execute=True), audit.actor(self.staff):
+            self.set_status('approved')
+            self.booking.save()  # unchanged, so not recorded
+        self.assertEqual(self.transitions(), [('', 'pending', None), ('pending', 'approved', self.staff.pk)])
+
+    def test_a_buffered_block_writes_once(self):
+        with audit.buffered():
+            with self.captureOnCommitCallbacks(execute=True):
+                for status in ('approved', 'cancelled'):
+                    self.set_status(status)
+            # Committed, but still in the buffer
+            self.assertEqual(len(self.transitions()), 1)
+            with self.assertNumQueries(1):
+                audit.flush()
+        self.assertEqual([entry[1] for entry in self.transitions()], ['pending', 'approved', 'cancelled'])
+
+    def test_rolled_back_changes_leave_no_entry(self):
+        with audit.buffered(), self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                self.set_status('approved')
+                raise DatabaseError('deadlock')
+        self.assertEqual(self.transitions(), [('', 'pending', None)])
+
+    def test_a_failed_flush_does_not_fail_the_request(self):
+        with mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=DatabaseError), \
+                mock.patch.object(audit.logger, 'exception') as exception, audit.buffered(), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.set_status('approved')
+        exception.assert_called_once()
+
+    def test_entries_are_append_only(self):
+        entry = audit.history(self.booking)[0]
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_requests_attribute_changes_to_their_user(self):
+        self.client.force_login(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('booking_approve', args=[self.booking.pk]))
+        self.assertEqual(self.transitions()[-1], ('pending', 'approved', self.staff.pk))
@@ -0,0 +1,53 @@
+from datetime import date
+from decimal import Decimal
+
+from core_app import billing
+from core_app.models import BillingRun, Invoice, LeaseContract, Subscription
+
+from .base import TestCase, make_plan, make_resource, make_user
+
+
+class BillingTests(TestCase):
+    period = '2030-03'
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('tenant')
+        self.leases = [
+            LeaseContract.objects.create(
+                user=self.user, resource=make_resource(f'Office {i}', 'office'),
+                start_date=date(2030, 3 - i, 1), end_date=date(2030, 12, 31),
+                monthly_rent=Decimal('500.00'), deposit_amount=Decimal('1000.00'), status='active'
+            )
+            for i in range(3)
+        ]
+        plan = make_plan('desk')
+        self.subscription = Subscription.objects.create(
+            user=self.user, plan=plan, start_date=date(2030, 2, 15), end_date=date(2030, 3, 14)
+        )
+
+    def test_rerunning_a_period_bills_nothing_twice(self):
+        billing.run_billing(self.period, chunk_size=2)
+        billing.run_billing(self.period, chunk_size=2)
+        billing.run_billing(self.period, chunk_size=2, restart=True)
+        self.assertEqual(Invoice.objects.filter(period=self.period).count(), 4)
+        self.assertEqual(Subscription.objects.filter(renewed_from=self.subscription).count(), 1)
+
+    def test_resumes_after_last_committed_chunk(self):
+        BillingRun.objects.create(period=self.period, last_lease_id=self.leases[0].pk, leases_processed=1)
+        run = billing.run_billing(self.period, chunk_size=1)
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.leases_processed, 3)
+        billed = set(Invoice.objects.filter(lease__isnull=False).values_list('lease_id', flat=True))
+        self.assertEqual(billed, {lease.pk for lease in self.leases[1:]})
+
+    def test_deposit_is_billed_in_the_first_month_only(self):
+        billing.run_billing(self.period)
+        totals = dict(Invoice.objects.filter(lease__isnull=False).values_list('lease_id', 'total'))
+        self.assertEqual(totals[self.leases[0].pk], Decimal('1500.00'))
+        self.assertEqual(totals[self.leases[1].pk], Decimal('500.00'))
+
+    def test_renewal_starts_the_day_after_expiry(self):
+        billing.run_billing(self.period)
+        renewal = Subscription.objects.get(renewed_from=self.subscription)
+        self.assertEqual(renewal.start_date, date(2030, 3, 15))
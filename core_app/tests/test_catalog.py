@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from core_app import catalog
+from core_app.models import Booking, Location, Resource
+
+from .base import TestCase, make_resource, make_user, slot
+
+
+class CatalogTests(TestCase):
+    header = 'external_key,name,type,location,capacity,price_per_hour,site\n'
+
+    def setUp(self):
+        super().setUp()
+        self.north = Location.objects.create(name='North', slug='north')
+        self.south = Location.objects.create(name='South', slug='south')
+        self.desk = make_resource('Desk 1', external_key='D-1', site=self.north)
+        self.booking = Booking.objects.create(user=make_user('member'), resource=self.desk, start_time=slot()[0],
+                                              end_time=slot()[1], total_price=0)
+
+    def plan(self, text, name='catalog.csv'):
+        return catalog.plan(catalog.read_rows(text, name))
+
+    def test_plan_diffs_without_writing(self):
+        plan = self.plan(self.header
+                         + 'D-1,Desk 1,desk,Floor 1,1,12.50,north\n'
+                         + 'R-1,Room 1,meeting_room,Floor 2,6,30.00,south\n')
+        self.assertTrue(plan.is_valid)
+        self.assertEqual([change.key for change in plan.creates], ['R-1'])
+        self.assertEqual(plan.updates[0].changes, {'price_per_hour': ('10.00', '12.50')})
+        self.assertFalse(Resource.objects.filter(external_key='R-1').exists())
+        self.desk.refresh_from_db()
+        self.assertEqual(self.desk.price_per_hour, Decimal('10.00'))
+
+    def test_apply_writes_the_plan(self):
+        plan = self.plan(self.header
+                         + 'D-1,Desk 1,desk,Floor 1,1,12.50,north\n'
+                         + 'R-1,Room 1,meeting_room,Floor 2,6,30.00,south\n')
+        self.assertEqual(catalog.apply(plan, batch_size=1), (1, 1))
+        self.desk.refresh_from_db()
+        self.assertEqual(self.desk.price_per_hour, Decimal('12.50'))
+        self.assertEqual(Resource.objects.get(external_key='R-1').site, self.south)
+
+    def test_columns_left_out_keep_current_values(self):
+        plan = self.plan('{"external_key": "D-1", "capacity": 2}\n', name='catalog.jsonl')
+        catalog.apply(plan)
+        self.desk.refresh_from_db()
+        self.assertEqual((self.desk.capacity, self.desk.name, self.desk.site), (2, 'Desk 1', self.north))
+
+    def test_moving_site_moves_bookings(self):
+        catalog.apply(self.plan('external_key,site\nD-1,south\n'))
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.site, self.south)
+
+    def test_invalid_rows_are_reported_and_block_apply(self):
+        plan = self.plan(self.header
+                         + 'R-1,Room 1,spaceship,Floor 2,6,30.00,south\n'
+                         + 'R-2,Room 2,desk,Floor 2,1,5.00,nowhere\n'
+                         + 'R-2,Room 2,desk,Floor 2,1,5.00,south\n')
+        self.assertEqual([(line, key) for line, key, messages in plan.errors], [(2, 'R-1'), (3, 'R-2'), (4, 'R-2')])
+        with self.assertRaises(ValueError):
+            catalog.apply(plan)
+
+    def test_unknown_column_rejects_the_file(self):
+        with self.assertRaises(catalog.CatalogError):
+            self.plan('external_key,colour\nD-1,red\n')
+
+    def test_fingerprint_changes_when_the_database_does(self):
+        text = self.header + 'D-1,Desk 1,desk,Floor 1,1,12.50,north\n'
+        before = self.plan(text).fingerprint()
+        Resource.objects.filter(pk=self.desk.pk).update(price_per_hour=Decimal('11.00'))
+        self.assertNotEqual(self.plan(text).fingerprint(), before)
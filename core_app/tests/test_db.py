@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core_app import reservations
+from core_app.db import serialized_write
+from core_app.forms import BookingForm
+from core_app.models import Booking, MembershipPlan
+
+from .base import TestCase, make_plan, make_resource, make_user, slot, subscribe
+
+
+# serialized_write only retries outside a transaction, which TestCase always is in
+@override_settings(WRITE_RETRY_ATTEMPTS=3, SQLITE_SERIALIZE_WRITES=True)
+@mock.patch('core_app.db.time.sleep')
+class SerializedWriteTests(TransactionTestCase):
+    def flaky_write(self, failures, message='database is locked'):
+        calls = []
+
+        def write():
+            calls.append(1)
+            make_plan('desk', name=f'Plan {len(calls)}')
+            if len(calls) <= failures:
+                raise OperationalError(message)
+            return len(calls)
+
+        return write, calls
+
+    def test_lock_errors_are_retried_and_the_write_commits_once(self, sleep):
+        write, calls = self.flaky_write(failures=2)
+        self.assertEqual(serialized_write(write)(), 3)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+        # The failed attempts were rolled back
+        self.assertEqual(list(MembershipPlan.objects.values_list('name', flat=True)), ['Plan 3'])
+
+    def test_gives_up_after_the_configured_attempts(self, sleep):
+        write, calls = self.flaky_write(failures=10)
+        with self.assertRaises(OperationalError):
+            serialized_write(write)()
+        self.assertEqual(len(calls), 4)
+        self.assertFalse(MembershipPlan.objects.exists())
+
+    def test_other_errors_are_not_retried(self, sleep):
+        write, calls = self.flaky_write(failures=1, message='no such table: core_app_membershipplan')
+        with self.assertRaises(OperationalError):
+            serialized_write(write)()
+        self.assertEqual(len(calls), 1)
+        sleep.assert_not_called()
+
+    def test_joins_an_outer_transaction_without_retrying(self, sleep):
+        write, calls = self.flaky_write(failures=1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            serialized_write(write)()
+        self.assertEqual(len(calls), 1)
+
+    def test_works_as_a_decorator(self, sleep):
+        @serialized_write
+        def write():
+            return make_plan('desk')
+
+        self.assertEqual(write().name, 'desk')
+
+
+class BookingWriteTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = make_user('member')
+        subscribe(self.member, make_plan('desk'))
+        self.other = make_user('other')
+        self.desk = make_resource()
+        self.start, self.end = slot()
+        self.client.login(username='member', password='pass')
+
+    def approve_other_booking(self):
+        return Booking.objects.create(user=self.other, resource=self.desk, start_time=self.start,
+                                      end_time=self.end, total_price=0, status='approved')
+
+    def test_slot_approved_after_validation_is_not_booked(self):
+        form = BookingForm({'resource': self.desk.pk, 'start_time': self.start, 'end_time': self.end})
+        self.assertTrue(form.is_valid())
+        self.approve_other_booking()
+        booking = form.save(commit=False)
+        booking.user = self.member
+        booking.total_price = 0
+        with self.assertRaises(ValidationError) as raised:
+            reservations.create(booking)
+        self.assertEqual(raised.exception.code, 'conflict')
+        self.assertFalse(Booking.objects.filter(user=self.member).exists())
+
+    def test_booking_view_reports_a_slot_taken_while_it_validated(self):
+        is_valid = BookingForm.is_valid
+
+        def validate_then_lose_the_race(form):
+            valid = is_valid(form)
+            self.approve_other_booking()
+            return valid
+
+        with mock.patch.object(BookingForm, 'is_valid', validate_then_lose_the_race):
+            response = self.client.post(reverse('booking_create', args=[self.desk.pk]), {
+                'resource': self.desk.pk,
+                'start_time': self.start.strftime('%Y-%m-%dT%H:%M'),
+                'end_time': self.end.strftime('%Y-%m-%dT%H:%M'),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].has_error('__all__', 'conflict'))
+        self.assertFalse(Booking.objects.filter(user=self.member).exists())
@@ -0,0 +1,88 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, override_settings
+
+from core_app import db_maintenance
+from core_app.db_maintenance import MaintenanceError
+
+
+@override_settings(DB_BACKUP_STEP_PAUSE=0)
+class BackupTests(SimpleTestCase):
+    def setUp(self):
+        self.root = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.source = self.root / 'db.sqlite3'
+        self.backup_dir = self.root / 'backups'
+        self.execute('CREATE TABLE note (id INTEGER PRIMARY KEY, body TEXT)')
+        self.execute('INSERT INTO note (body) SELECT hex(randomblob(500)) FROM '
+                     '(WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 200) SELECT i FROM n)')
+        self.enterContext(mock.patch('core_app.db_maintenance.database_path', return_value=self.source))
+
+    def execute(self, sql, path=None):
+        connection = sqlite3.connect(path or self.source, isolation_level=None)
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def backup(self, **kwargs):
+        return db_maintenance.backup(directory=self.backup_dir, **kwargs)
+
+    def old_backup(self, name):
+        self.backup_dir.mkdir(exist_ok=True)
+        path = self.backup_dir / name
+        path.write_bytes(b'')
+        return path
+
+    def test_copy_is_verified_and_complete(self):
+        result = self.backup(step_pages=8)
+        self.assertEqual(result['path'].parent, self.backup_dir)
+        self.assertRegex(result['path'].name, r'^db-\d{8}-\d{6}\.sqlite3$')
+        self.assertGreater(result['steps'], 1)
+        self.assertEqual(self.execute('SELECT COUNT(*) FROM note', result['path']), [(200,)])
+        self.assertEqual(db_maintenance.verify(result['path']), [])
+        self.assertEqual(list(self.backup_dir.glob('*.partial')), [])
+
+    def test_oldest_backups_are_rotated_away(self):
+        oldest = self.old_backup('db-20240101-000000.sqlite3')
+        older = self.old_backup('db-20240102-000000.sqlite3')
+        unrelated = self.old_backup('db-manual.sqlite3')
+        result = self.backup(keep=2)
+        self.assertEqual(result['removed'], [oldest])
+        self.assertEqual(db_maintenance.backups(self.backup_dir, 'db'), [result['path'], older])
+        self.assertTrue(unrelated.exists())
+
+    def test_failed_verification_keeps_the_old_backups(self):
+        old = self.old_backup('db-20240101-000000.sqlite3')
+        with mock.patch('core_app.db_maintenance.verify', return_value=['row 3 missing from index']), \
+                self.assertRaisesMessage(MaintenanceError, 'failed verification: row 3 missing from index'):
+            self.backup(keep=1)
+        self.assertEqual(db_maintenance.backups(self.backup_dir, 'db'), [old])
+        self.assertEqual(len(list(self.backup_dir.glob('*.partial.corrupt'))), 1)
+
+    @override_settings(DB_BACKUP_MAX_RESTARTS=2)
+    def test_busy_database_is_finished_in_a_single_step(self):
+        def write(copied, total):
+            self.execute("INSERT INTO note (body) VALUES ('during the backup')")
+
+        result = self.backup(step_pages=4, progress=write)
+        self.assertEqual((result['restarts'] > 2, result['single_step']), (True, True))
+        self.assertEqual(db_maintenance.verify(result['path']), [])
+
+
+class DatabasePathTests(SimpleTestCase):
+    def connection(self, vendor, name):
+        return mock.Mock(vendor=vendor, settings_dict={'NAME': name},
+                         is_in_memory_db=mock.Mock(return_value=name == ':memory:'))
+
+    def test_only_sqlite_files_can_be_backed_up(self):
+        for connection, message in ((self.connection('postgresql', 'space_flow'), 'use its own backup tools'),
+                                    (self.connection('sqlite', ':memory:'), 'is in memory and cannot be backed up')):
+            with mock.patch('core_app.db_maintenance.connections', {'default': connection}), \
+                    self.assertRaisesMessage(CommandError, message):
+                call_command('db_maintenance', 'backup')
+        with mock.patch('core_app.db_maintenance.connections', {'default': self.connection('sqlite', '/srv/db.sqlite3')}):
+            self.assertEqual(db_maintenance.database_path(), Path('/srv/db.sqlite3'))
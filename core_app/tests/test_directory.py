@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core_app.models import UserProfile
+
+from .base import TestCase, make_user
+
+
+@mock.patch('core_app.views.USERS_PER_PAGE', 2)
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        make_user('staff', role='staff')
+        for username, first_name in (('alice', 'Alice'), ('bob', 'Robert'), ('carol', 'Carol'), ('dave', 'Dave')):
+            User.objects.filter(pk=make_user(username).pk).update(first_name=first_name,
+                                                                   email=f'{username}@example.com')
+        UserProfile.objects.filter(user__username='carol').update(company_name='Robotics Ltd',
+                                                                  account_status='suspended')
+        self.client.login(username='staff', password='pass')
+
+    def usernames(self, **params):
+        response = self.client.get(reverse('user_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [user.username for user in response.context['users']], response.context['page']
+
+    def test_pages_in_username_order(self):
+        first, page = self.usernames()
+        self.assertEqual((first, page.paginator.count, page.paginator.num_pages), (['alice', 'bob'], 5, 3))
+        self.assertEqual(self.usernames(page=3)[0], ['staff'])
+        # Out-of-range pages show the last page rather than failing
+        self.assertEqual(self.usernames(page=99)[0], ['staff'])
+
+    def test_search_matches_prefixes_of_each_column(self):
+        self.assertEqual(self.usernames(q='rob')[0], ['bob', 'carol'])
+        self.assertEqual(self.usernames(q='DAVE@')[0], ['dave'])
+        self.assertEqual(self.usernames(q='lice')[0], [])
+
+    def test_filters_combine_with_search(self):
+        self.assertEqual(self.usernames(role='staff')[0], ['staff'])
+        self.assertEqual(self.usernames(status='suspended')[0], ['carol'])
+        self.assertEqual(self.usernames(q='rob', status='active')[0], ['bob'])
+
+    def test_page_links_keep_the_filters(self):
+        response = self.client.get(reverse('user_list'), {'q': 'rob', 'role': 'member', 'page': 1})
+        self.assertEqual(response.context['filter_query'], 'q=rob&role=member')
+
+    def summary_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            summary = self.client.get(reverse('user_list')).context['summary']
+        return summary, [query['sql'] for query in queries if 'AS "active"' in query['sql']]
+
+    def test_summary_is_one_cached_aggregate(self):
+        summary, aggregates = self.summary_queries()
+        self.assertEqual(summary, {'total': 5, 'active': 4, 'staff': 1, 'admin': 0})
+        self.assertEqual(len(aggregates), 1)
+        self.assertEqual(self.summary_queries(), (summary, []))
+
+    def test_members_are_turned_away(self):
+        self.client.login(username='alice', password='pass')
+        self.assertRedirects(self.client.get(reverse('user_list')), reverse('dashboard'),
+                             fetch_redirect_response=False)
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from core_app import entitlements
+from core_app.models import Booking, Resource
+
+from .base import TestCase, make_plan, make_resource, make_user, slot, subscribe
+
+
+class EntitlementTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = make_user('member')
+        subscribe(self.member, make_plan('desk'))
+        self.desk = make_resource('Desk 1', 'desk')
+        self.room = make_resource('Room 1', 'meeting_room')
+        self.client.login(username='member', password='pass')
+
+    def test_plan_limits_resource_types(self):
+        self.assertTrue(entitlements.is_entitled(self.member, self.desk))
+        self.assertFalse(entitlements.is_entitled(self.member, self.room))
+
+    def test_booking_view_denies_resource_outside_plan(self):
+        start, end = slot()
+        response = self.client.post(reverse('booking_create', args=[self.room.pk]), {
+            'resource': self.room.pk,
+            'start_time': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_time': end.strftime('%Y-%m-%dT%H:%M'),
+        })
+        self.assertRedirects(response, reverse('resource_detail', args=[self.room.pk]),
+                             fetch_redirect_response=False)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_resource_list_hides_resource_outside_plan(self):
+        queryset = entitlements.filter_resources(Resource.objects.all(), self.member)
+        self.assertEqual(list(queryset), [self.desk])
+
+    def test_new_subscription_takes_effect_without_waiting_for_the_cache(self):
+        self.assertFalse(entitlements.is_entitled(self.member, self.room))
+        subscribe(self.member, make_plan('desk_room'))
+        member = User.objects.get(pk=self.member.pk)
+        self.assertTrue(entitlements.is_entitled(member, self.room))
+
+    def test_staff_are_not_limited_by_plans(self):
+        staff = make_user('staff', role='staff')
+        self.assertTrue(entitlements.is_entitled(staff, self.room))
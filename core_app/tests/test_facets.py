@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+from django.urls import reverse
+
+from core_app import facets
+from core_app.models import Resource
+
+from .base import TestCase, make_resource, make_user
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        make_resource('Desk 1', capacity=1, price_per_hour=Decimal('5.00'))
+        make_resource('Desk 2', capacity=1, price_per_hour=Decimal('15.00'), status='maintenance')
+        make_resource('Room 1', 'meeting_room', capacity=8, price_per_hour=Decimal('40.00'))
+        make_resource('Office 1', 'office', capacity=4, price_per_hour=Decimal('60.00'))
+
+    def counts(self, **selected):
+        return facets.facet_counts(Resource.objects.all(), selected, 'all')
+
+    def test_counts_every_facet_in_one_query(self):
+        facets.facet_options()  # the site list is cached on its own
+        with self.assertNumQueries(1):
+            counts, total = self.counts()
+        self.assertEqual(total, 4)
+        self.assertEqual(counts['type'], {'desk': 2, 'meeting_room': 1, 'office': 1})
+        self.assertEqual(counts['capacity'], {'1': 2, '2-4': 1, '5-10': 1, '11+': 0})
+        self.assertEqual(counts['price'], {'under-10': 1, '10-25': 1, '25-50': 1, '50+': 1})
+
+    def test_a_facet_ignores_its_own_selection(self):
+        counts, total = self.counts(type='desk', status='available')
+        self.assertEqual(total, 1)
+        # Other types are counted with the status applied, other statuses with the type applied
+        self.assertEqual(counts['type'], {'desk': 1, 'meeting_room': 1, 'office': 1})
+        self.assertEqual((counts['status']['available'], counts['status']['maintenance']), (1, 1))
+
+    def test_selection_drops_unknown_values(self):
+        self.assertEqual(facets.selection({'type': 'desk', 'status': 'gone', 'price': '', 'page': '2'}),
+                         {'type': 'desk'})
+
+    def test_counts_are_cached_until_a_resource_changes(self):
+        counts = self.counts(type='desk')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(type='desk'), counts)
+        version = facets.get_version()
+        make_resource('Desk 3')
+        self.assertEqual(facets.get_version(), version + 1)
+        self.assertEqual(self.counts(type='desk')[1], 3)
+
+    def test_resource_list_filters_and_links_the_facets(self):
+        self.client.force_login(make_user('staff', role='staff'))
+        response = self.client.get(reverse('resource_list'), {'type': 'desk', 'page': '1'})
+        self.assertEqual(sorted(resource.name for resource in response.context['resources']), ['Desk 1', 'Desk 2'])
+        self.assertEqual(response.context['page'].paginator.count, 2)
+        type_facet = next(facet for facet in response.context['facets'] if facet['name'] == 'type')
+        office = next(link for link in type_facet['options'] if link['label'] == 'Private Office')
+        self.assertEqual((office['count'], office['query']), (1, 'type=office'))
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from core_app import jobs
+from core_app.models import Job
+
+from .base import TestCase
+
+calls = []
+
+
+def record(**payload):
+    calls.append(payload)
+
+
+def fail(**payload):
+    raise RuntimeError('mail server down')
+
+
+@mock.patch.dict(jobs.TASKS, {'tests.record': record, 'tests.fail': fail})
+@mock.patch('core_app.jobs.close_old_connections')
+class JobQueueTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        calls.clear()
+
+    def run_due(self, worker_id='worker-1'):
+        return [jobs.run(job) for job in jobs.claim(worker_id)]
+
+    def test_claimed_job_runs_once(self, close_old_connections):
+        job = jobs.enqueue('tests.record', booking_id=7)
+        done, = self.run_due()
+        self.assertEqual(done.pk, job.pk)
+        self.assertEqual(calls, [{'booking_id': 7}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('succeeded', 1))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.run_due(), [])
+
+    def test_claim_takes_due_jobs_of_its_queue_and_locks_them(self, close_old_connections):
+        due = jobs.enqueue('tests.record')
+        jobs.enqueue('tests.record', run_at=timezone.now() + timedelta(hours=1))
+        jobs.enqueue('tests.record', queue='reports')
+        claimed, = jobs.claim('worker-1')
+        self.assertEqual(claimed.pk, due.pk)
+        self.assertEqual((claimed.status, claimed.locked_by), ('running', 'worker-1'))
+        self.assertEqual(jobs.claim('worker-2'), [])
+
+    def test_claim_respects_the_batch_size_in_run_order(self, close_old_connections):
+        now = timezone.now()
+        later, sooner = [jobs.enqueue('tests.record', run_at=now - timedelta(minutes=minutes)) for minutes in (1, 2)]
+        self.assertEqual([job.pk for job in jobs.claim('worker-1', batch_size=1)], [sooner.pk])
+        self.assertEqual([job.pk for job in jobs.claim('worker-1', batch_size=1)], [later.pk])
+
+    @mock.patch.object(jobs.logger, 'warning')
+    def test_failure_is_retried_with_backoff(self, warning, close_old_connections):
+        job = jobs.enqueue('tests.fail', max_attempts=3)
+        before = timezone.now()
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('mail server down', job.last_error)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=30))
+        self.assertEqual(jobs.backoff(3), timedelta(seconds=120))
+        self.assertEqual(jobs.backoff(20), timedelta(hours=6))
+
+    @mock.patch.object(jobs.logger, 'error')
+    def test_job_is_dead_after_max_attempts(self, error, close_old_connections):
+        job = jobs.enqueue('tests.fail', max_attempts=1)
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'dead')
+        self.assertIsNotNone(job.finished_at)
+        error.assert_called_once()
+
+    @mock.patch.object(jobs.logger, 'error')
+    def test_unknown_task_fails(self, error, close_old_connections):
+        job = jobs.enqueue('tests.missing', max_attempts=1)
+        self.run_due()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'dead')
+        self.assertIn("Unknown task 'tests.missing'", job.last_error)
+
+    def test_stale_running_jobs_are_requeued(self, close_old_connections):
+        stale, fresh = jobs.enqueue('tests.record'), jobs.enqueue('tests.record')
+        now = timezone.now()
+        Job.objects.filter(pk=stale.pk).update(status='running', locked_by='gone', locked_at=now - timedelta(hours=1))
+        Job.objects.filter(pk=fresh.pk).update(status='running', locked_by='busy', locked_at=now)
+        self.assertEqual(jobs.requeue_stale(timeout=600), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, 'queued')
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, 'running')
+
+    def test_dead_jobs_command_requeues_with_a_fresh_budget(self, close_old_connections):
+        dead = jobs.enqueue('tests.record')
+        Job.objects.filter(pk=dead.pk).update(status='dead', attempts=5, finished_at=timezone.now())
+        out = StringIO()
+        call_command('dead_jobs', stdout=out)
+        self.assertIn(f'#{dead.pk} tests.record attempts=5', out.getvalue())
+        call_command('dead_jobs', '--retry', stdout=out)
+        self.assertIn('Requeued 1 jobs', out.getvalue())
+        self.run_due()
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.attempts), ('succeeded', 1))
+
+    def test_enqueue_on_commit_waits_for_the_transaction(self, close_old_connections):
+        with self.captureOnCommitCallbacks() as callbacks:
+            jobs.enqueue_on_commit('tests.record', booking_id=1)
+            self.assertFalse(Job.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Job.objects.get().payload, {'booking_id': 1})
@@ -0,0 +1,83 @@
+import io
+import json
+import logging
+import os
+import tempfile
+
+from core_app import logs
+
+from .base import TestCase
+
+
+class CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(logs.RequestContextFilter())
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class RequestContextTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.handler = CaptureHandler()
+        for name in ('django.request', 'core_app.requests'):
+            logging.getLogger(name).addHandler(self.handler)
+            self.addCleanup(logging.getLogger(name).removeHandler, self.handler)
+
+    def records(self, name):
+        return [record for record in self.handler.records if record.name == name]
+
+    def test_error_responses_are_logged_with_the_request_id(self):
+        response = self.client.get('/no-such-page/', HTTP_X_REQUEST_ID='req-404')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['X-Request-ID'], 'req-404')
+        warning, = self.records('django.request')
+        self.assertEqual(warning.request_id, 'req-404')
+        access, = self.records('core_app.requests')
+        self.assertEqual((access.request_id, access.status), ('req-404', 404))
+
+    def test_context_ends_with_the_request(self):
+        self.client.get('/', HTTP_X_REQUEST_ID='req-home')
+        logging.getLogger('django.request').warning('outside')
+        self.assertIsNone(self.records('django.request')[-1].request_id)
+
+    def test_malformed_request_id_is_replaced(self):
+        response = self.client.get('/', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+
+class QueueHandlerTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.path = os.path.join(directory, 'app.log')
+        self.handler = logs.QueueHandler(filename=self.path, stream=io.StringIO())
+        self.handler.setFormatter(logs.JsonFormatter())
+        self.addCleanup(self.handler.close)
+
+    def log(self, message, **extra):
+        self.handler.handle(logging.makeLogRecord({'name': 'test', 'levelname': 'INFO', 'levelno': logging.INFO,
+                                                   'msg': message, **extra}))
+        # Drains the queue; the next record starts a new listener
+        self.handler.stop()
+
+    def lines(self, path=None):
+        with open(path or self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_are_written_as_json_lines_with_extra_fields(self):
+        self.log('first', booking_id=7)
+        self.log('second')
+        first, second = self.lines()
+        self.assertEqual((first['message'], first['booking_id'], first['request_id']), ('first', 7, None))
+        self.assertEqual(second['message'], 'second')
+
+    def test_file_moved_aside_is_reopened(self):
+        self.log('before')
+        os.rename(self.path, self.path + '.1')
+        self.log('after')
+        self.assertEqual([line['message'] for line in self.lines(self.path + '.1')], ['before'])
+        self.assertEqual([line['message'] for line in self.lines()], ['after'])
@@ -0,0 +1,63 @@
+import json
+import os
+
+from django.conf import settings
+
+from core_app import metrics
+
+from .base import TestCase
+
+
+class MetricsTests(TestCase):
+    def files(self):
+        return sorted(os.listdir(settings.METRICS_DIR))
+
+    def requests_counted(self, view='home'):
+        counters = metrics.registry.snapshot()['counters']
+        return sum(value for name, labels, value in counters
+                   if name == 'spaceflow_http_requests_total' and labels['view'] == view)
+
+    def test_requests_are_counted_and_flushed(self):
+        self.client.get('/')
+        self.assertEqual(self.requests_counted(), 1)
+        self.assertEqual(len([name for name in self.files() if metrics.PROCESS_FILE.match(name)]), 1)
+
+    def test_warm_up_requests_are_neither_written_nor_kept(self):
+        with metrics.registry.warm_up():
+            self.client.get('/')
+        self.assertEqual(self.files(), [])
+        self.assertEqual(self.requests_counted(), 0)
+        self.assertFalse(metrics.registry.warming_up)
+
+    def test_reset_deletes_the_flushed_file(self):
+        self.client.get('/')
+        metrics.registry.reset()
+        self.assertEqual([name for name in self.files() if name.endswith('.json')], [])
+
+    def test_retire_folds_counts_into_exited_file(self):
+        self.client.get('/')
+        self.client.get('/')
+        metrics.registry.retire()
+        self.assertEqual([name for name in self.files() if name.endswith('.json')], [metrics.EXITED_FILE])
+        with open(os.path.join(settings.METRICS_DIR, metrics.EXITED_FILE)) as f:
+            counters = json.load(f)['counters']
+        self.assertIn(['spaceflow_http_requests_total', {'method': 'GET', 'status': '200', 'view': 'home'}, 2.0],
+                      counters)
+
+    def test_scrape_adds_up_every_process(self):
+        other = {'counters': [['spaceflow_bookings_created_total', {}, 2]], 'histograms': []}
+        with open(os.path.join(settings.METRICS_DIR, '1-abc.json'), 'w') as f:
+            json.dump(other, f)
+        with open(os.path.join(settings.METRICS_DIR, metrics.EXITED_FILE), 'w') as f:
+            json.dump(other, f)
+        metrics.inc('spaceflow_bookings_created_total')
+        metrics.registry.serving = True
+        response = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('spaceflow_bookings_created_total 5\n', response.content.decode())
+
+    def test_scrape_needs_token_or_allowed_address(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.9').status_code, 403)
+            response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.9', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
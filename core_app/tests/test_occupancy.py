@@ -0,0 +1,127 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from core_app import occupancy, reservations
+from core_app.forms import BookingForm
+from core_app.models import Booking, LeaseContract, MaintenanceWindow
+
+from .base import TestCase, make_resource, make_user, slot
+
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('member')
+        self.resource = make_resource()
+        self.start, self.end = slot()
+
+    def book(self, start=None, end=None, status='pending'):
+        return Booking.objects.create(user=self.user, resource=self.resource, start_time=start or self.start,
+                                      end_time=end or self.end, total_price=0, status=status)
+
+    def conflicts(self, start=None, end=None):
+        return occupancy.conflicts(self.resource, start or self.start, end or self.end).exists()
+
+    def test_only_approved_bookings_block(self):
+        booking = self.book()
+        self.assertFalse(self.conflicts())
+        booking.status = 'approved'
+        booking.save()
+        self.assertTrue(self.conflicts())
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertFalse(self.conflicts())
+
+    def test_ranges_are_half_open(self):
+        self.book(status='approved')
+        self.assertFalse(self.conflicts(self.end, self.end + timedelta(hours=1)))
+        self.assertTrue(self.conflicts(self.end - timedelta(minutes=1), self.end + timedelta(hours=1)))
+
+    def test_active_lease_blocks_whole_days(self):
+        day = timezone.localdate(self.start)
+        LeaseContract.objects.create(user=self.user, resource=self.resource, start_date=day, end_date=day,
+                                     monthly_rent=Decimal('1.00'), deposit_amount=Decimal('0.00'),
+                                     status='active')
+        self.assertTrue(self.conflicts())
+
+    def test_maintenance_blocks_and_shows_in_live_status(self):
+        now = timezone.now()
+        MaintenanceWindow.objects.create(resource=self.resource, start_time=now - timedelta(hours=1),
+                                         end_time=now + timedelta(hours=1))
+        resource, = occupancy.attach_live_status([self.resource])
+        self.assertEqual(resource.live_status, 'maintenance')
+
+    def test_booking_form_reports_conflict(self):
+        self.book(status='approved')
+        form = BookingForm({
+            'resource': self.resource.pk,
+            'start_time': self.start + timedelta(hours=1),
+            'end_time': self.end + timedelta(hours=1),
+        })
+        self.assertFalse(form.is_valid())
+        self.assertTrue(form.has_error('__all__', 'conflict'))
+
+    def test_second_overlapping_approval_is_refused(self):
+        first = self.book()
+        second = self.book(self.start + timedelta(hours=1), self.end + timedelta(hours=1))
+        reservations.approve(first)
+        with self.assertRaises(ValidationError) as raised:
+            reservations.approve(second)
+        self.assertEqual(raised.exception.code, 'conflict')
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+
+    def test_only_pending_bookings_can_be_decided(self):
+        booking = self.book(status='cancelled')
+        with self.assertRaises(ValidationError):
+            reservations.approve(booking)
+        with self.assertRaises(ValidationError):
+            reservations.reject(booking)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'cancelled')
+
+
+class LeaseActivationTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('tenant')
+        self.resource = make_resource('Office 1', 'office')
+        self.day = timezone.localdate() + timedelta(days=7)
+
+    def lease(self, start=None, end=None, status='pending'):
+        return LeaseContract(user=self.user, resource=self.resource, start_date=start or self.day,
+                             end_date=end or self.day + timedelta(days=30), monthly_rent=Decimal('500.00'),
+                             deposit_amount=Decimal('0.00'), status=status)
+
+    def test_second_overlapping_activation_is_refused(self):
+        first = reservations.create_lease(self.lease())
+        second = reservations.create_lease(self.lease(self.day + timedelta(days=10), self.day + timedelta(days=40)))
+        reservations.activate_lease(first)
+        with self.assertRaises(ValidationError) as raised:
+            reservations.activate_lease(second)
+        self.assertEqual(raised.exception.code, 'conflict')
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+
+    def test_activation_over_an_approved_booking_is_refused(self):
+        lease = reservations.create_lease(self.lease())
+        start, _ = occupancy.lease_range(self.day + timedelta(days=3), self.day + timedelta(days=3))
+        Booking.objects.create(user=self.user, resource=self.resource, start_time=start + timedelta(hours=9),
+                               end_time=start + timedelta(hours=11), total_price=0, status='approved')
+        with self.assertRaises(ValidationError):
+            reservations.activate_lease(lease)
+
+    def test_only_pending_leases_can_be_activated(self):
+        lease = reservations.create_lease(self.lease(status='terminated'))
+        with self.assertRaises(ValidationError) as raised:
+            reservations.activate_lease(lease)
+        self.assertEqual(raised.exception.code, 'status')
+
+    def test_new_lease_over_an_active_one_is_refused(self):
+        reservations.activate_lease(reservations.create_lease(self.lease()))
+        with self.assertRaises(ValidationError):
+            reservations.create_lease(self.lease(self.day + timedelta(days=5)))
+        self.assertEqual(LeaseContract.objects.count(), 1)
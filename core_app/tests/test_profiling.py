@@ -0,0 +1,52 @@
+import tempfile
+
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from core_app import profiling
+
+from .base import TestCase, make_user
+
+
+class ProfilingFlagTests(TestCase):
+    def requested(self, path='/', **headers):
+        return profiling.requested(RequestFactory().get(path, headers=headers))
+
+    def test_query_flag(self):
+        for value in ('1', 'true', 'YES', ' on '):
+            self.assertTrue(self.requested(f'/?_profile={value}'), value)
+        for path in ('/', '/?_profile=0', '/?_profile=', '/?page=2&_profiled=1'):
+            self.assertFalse(self.requested(path), path)
+
+    def test_header_flag(self):
+        self.assertTrue(self.requested(X_PROFILE='true'))
+        self.assertFalse(self.requested(X_PROFILE='no'))
+
+
+class ProfileRequestTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(PROFILING_DIR=self.enterContext(tempfile.TemporaryDirectory()),
+                                            PROFILING_KEEP=2))
+
+    def test_only_admins_are_profiled(self):
+        self.client.force_login(make_user('staff', role='staff'))
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('dashboard'), {'_profile': 1}))
+        self.assertEqual(profiling.profile_ids(), [])
+
+    def test_profile_is_stored_and_rotated(self):
+        self.client.force_login(make_user('admin', role='admin'))
+        ids = [self.client.get(reverse('dashboard'), headers={'X-Profile': '1'})['X-Profile-Id'] for _ in range(3)]
+        # Ids start with the second the request began, so the order within one second is arbitrary
+        kept = profiling.profile_ids()
+        self.assertEqual(len(kept), 2)
+        self.assertLessEqual(set(kept), set(ids))
+        meta = profiling.load(kept[0])
+        self.assertEqual((meta['path'], meta['status'], meta['user']), ('/dashboard/', 200, 'admin'))
+        self.assertEqual(meta['query_count'], len(meta['queries']))
+        response = self.client.get(reverse('profile_detail', args=[kept[0]]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_ids_cannot_leave_the_profile_directory(self):
+        with self.assertRaises(FileNotFoundError):
+            profiling.load('../settings')
@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import RequestFactory
+
+from core_app import ratelimit
+
+from .base import TestCase
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.RATELIMIT_CACHE].clear()
+        self.policy = ratelimit.Policy('test_login', '3/m', key=('ip', 'username'))
+        self.now = 1_000_000.0
+        patcher = mock.patch('core_app.ratelimit.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def attempt(self, username, ip='10.0.0.1'):
+        return ratelimit.check(self.policy, RequestFactory().post('/', {'username': username}, REMOTE_ADDR=ip))
+
+    def test_burst_then_refusal_with_retry_after(self):
+        self.assertEqual([self.attempt('alice') for _ in range(3)], [0, 0, 0])
+        self.assertEqual(self.attempt('alice'), 20)
+
+    def test_refused_request_refunds_earlier_buckets(self):
+        for username in ('alice', 'bob', 'carol'):
+            self.assertEqual(self.attempt(username), 0)
+        # Refused by the exhausted IP bucket: dave's own bucket gets its token back
+        self.assertGreater(self.attempt('dave'), 0)
+        self.assertEqual([self.attempt('dave', ip='10.0.0.2') for _ in range(3)], [0, 0, 0])
+
+    def test_refused_requests_do_not_push_back_retry(self):
+        for _ in range(3):
+            self.attempt('alice')
+        retry = self.attempt('alice')
+        for _ in range(10):
+            self.assertEqual(self.attempt('alice'), retry)
+
+    def test_tokens_refill_over_time(self):
+        for _ in range(3):
+            self.attempt('alice')
+        self.assertGreater(self.attempt('alice'), 0)
+        self.now += 20
+        self.assertEqual(self.attempt('alice'), 0)
+        self.assertGreater(self.attempt('alice'), 0)
+
+    def test_requests_arriving_together_after_idle_do_not_lock_the_key_out(self):
+        self.attempt('alice')
+        # Long enough for the bucket to refill, too short for the key to expire
+        self.now += 50
+        cache = caches[settings.RATELIMIT_CACHE]
+        incr = cache.incr
+        other = {}
+
+        def take_then_let_another_request_in(key, delta=1, version=None):
+            value = incr(key, delta, version)
+            if not other:
+                # A second request takes its token before this one catches the bucket up
+                other['retry'] = None
+                other['retry'] = self.attempt('alice')
+            return value
+
+        with mock.patch.object(cache, 'incr', take_then_let_another_request_in):
+            self.assertEqual(self.attempt('alice'), 0)
+        self.assertEqual(other['retry'], 0)
+        self.assertEqual(self.attempt('alice'), 0)
+        retries = [self.attempt('alice') for _ in range(3)]
+        self.assertLessEqual(max(retries), 20)
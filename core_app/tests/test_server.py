@@ -0,0 +1,70 @@
+import os
+from unittest import mock
+
+from django.test import override_settings
+
+from main_app import server
+
+from .base import TestCase
+
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'ratelimit')
+}
+SHARED_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/0'}
+    for alias in ('default', 'ratelimit')
+}
+
+
+class ServerTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.dict(os.environ))
+        for name in [name for name in os.environ if name.startswith('SERVER_')]:
+            del os.environ[name]
+
+
+class ServerArgumentTests(ServerTestCase):
+    def test_defaults(self):
+        args = server.parse_args([])
+        self.assertIsNone(args.workers)
+        self.assertEqual((args.threads, args.max_requests, args.check), (4, 1000, False))
+        self.assertEqual(args.warmup, '/,/login/')
+
+    def test_environment_sets_defaults(self):
+        with mock.patch.dict(os.environ, {'SERVER_WORKERS': '3', 'SERVER_THREADS': '8'}):
+            args = server.parse_args([])
+        self.assertEqual((args.workers, args.threads), (3, 8))
+
+    def test_counts_must_be_positive(self):
+        with self.assertRaises(SystemExit), mock.patch('sys.stderr'):
+            server.parse_args(['--threads', '0'])
+
+
+@mock.patch('main_app.server.Master')
+@mock.patch('main_app.server._listener')
+@mock.patch('main_app.server.preload')
+@override_settings(CACHES=LOCAL_CACHES)
+class ServerStartupTests(ServerTestCase):
+    def test_per_process_caches_are_detected(self, preload, listener, master):
+        self.assertEqual(server.process_local_caches(), ['default', 'ratelimit'])
+        with override_settings(CACHES=SHARED_CACHES):
+            self.assertEqual(server.process_local_caches(), [])
+
+    def test_default_is_one_worker_with_a_per_process_cache(self, preload, listener, master):
+        self.assertEqual(server.main(['--check']), 0)
+        args, = preload.call_args.args
+        self.assertEqual(args.workers, 1)
+
+    def test_default_is_one_worker_per_cpu_with_a_shared_cache(self, preload, listener, master):
+        with override_settings(CACHES=SHARED_CACHES), mock.patch('os.cpu_count', return_value=6):
+            self.assertEqual(server.main(['--check']), 0)
+        args, = preload.call_args.args
+        self.assertEqual(args.workers, 6)
+
+    def test_several_workers_on_a_per_process_cache_are_refused_before_preloading(self, preload, listener, master):
+        with self.assertLogs('main_app.server', 'ERROR'):
+            self.assertEqual(server.main(['--workers', '2']), 1)
+        preload.assert_not_called()
+        master.assert_not_called()
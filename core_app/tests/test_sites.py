@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+
+from core_app import archive, sites
+from core_app.models import ArchivedBooking, Booking, Location, Resource
+
+from .base import TestCase, make_resource, make_user
+
+
+class SiteTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.north = Location.objects.create(name='North', slug='north')
+        self.south = Location.objects.create(name='South', slug='south')
+        self.north_desk = make_resource('North desk', site=self.north)
+        self.south_desk = make_resource('South desk', site=self.south)
+        self.staff = make_user('staff', role='staff')
+        self.member = make_user('member')
+        for resource in (self.north_desk, self.south_desk):
+            start = timezone.now() + timedelta(days=1)
+            Booking.objects.create(user=self.member, resource=resource, start_time=start,
+                                   end_time=start + timedelta(hours=1), total_price=10)
+        self.client.login(username='staff', password='pass')
+
+    def switch(self, site, next_url=None):
+        data = {'site': site.pk if site else ''}
+        if next_url:
+            data['next'] = next_url
+        return self.client.post(reverse('site_switch'), data)
+
+    def listed(self, name, context_key):
+        items = self.client.get(reverse(name)).context[context_key]
+        return sorted(item.resource.name if context_key == 'bookings' else item.name for item in items)
+
+    def test_bookings_take_the_site_of_their_resource(self):
+        self.assertEqual(set(Booking.objects.values_list('resource__name', 'site__name')),
+                         {('North desk', 'North'), ('South desk', 'South')})
+
+    def test_moving_a_resource_moves_its_bookings(self):
+        booking = Booking.objects.get(resource=self.north_desk)
+        ArchivedBooking.objects.create(**Booking.objects.filter(pk=booking.pk).values(*archive.ARCHIVED_FIELDS)[0])
+        self.north_desk.site = self.south
+        self.north_desk.save()
+        self.assertEqual(Booking.objects.get(pk=booking.pk).site, self.south)
+        self.assertEqual(ArchivedBooking.objects.get(pk=booking.pk).site, self.south)
+
+    def test_for_site_none_means_every_site(self):
+        self.assertEqual(list(Resource.objects.for_site(self.north)), [self.north_desk])
+        self.assertEqual(Resource.objects.for_site(None).count(), 2)
+
+    def test_lists_are_scoped_to_the_current_site(self):
+        self.assertEqual(self.listed('resource_list', 'resources'), ['North desk', 'South desk'])
+        self.switch(self.north)
+        self.assertEqual(sites.current_site(self.staff), self.north)
+        self.assertEqual(self.listed('resource_list', 'resources'), ['North desk'])
+        self.assertEqual(self.listed('booking_list', 'bookings'), ['North desk'])
+        self.switch(None)
+        self.assertEqual(self.listed('booking_list', 'bookings'), ['North desk', 'South desk'])
+
+    def test_switching_redirects_only_to_local_pages(self):
+        self.assertRedirects(self.switch(self.south, reverse('booking_list')), reverse('booking_list'),
+                             fetch_redirect_response=False)
+        self.assertRedirects(self.switch(self.south, 'https://example.com/'), reverse('dashboard'),
+                             fetch_redirect_response=False)
+
+    def test_inactive_sites_cannot_be_chosen(self):
+        self.south.is_active = False
+        self.south.save()
+        self.assertEqual(self.switch(self.south).status_code, 404)
+        self.assertEqual(sites.active_sites(), [self.north])
+
+    def test_a_deactivated_current_site_falls_back_to_every_site(self):
+        self.switch(self.north)
+        self.north.is_active = False
+        self.north.save()
+        self.assertIsNone(sites.current_site(self.staff))
+        self.assertEqual(self.listed('resource_list', 'resources'), ['North desk', 'South desk'])
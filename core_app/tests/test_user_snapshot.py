@@ -0,0 +1,43 @@
+from django.test import RequestFactory
+from django.urls import reverse
+
+from core_app import user_snapshot
+from core_app.models import UserProfile
+
+from .base import TestCase, make_user
+
+
+class UserSnapshotTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('member')
+        self.client.login(username='member', password='pass')
+        self.client.get(reverse('dashboard'))
+
+    def resolve(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.session.load()
+        return request
+
+    def test_snapshot_resolves_user_without_queries(self):
+        request = self.resolve()
+        with self.assertNumQueries(0):
+            user = user_snapshot.get_user(request)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.userprofile.role, 'member')
+
+    def test_profile_save_invalidates_snapshot(self):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.role = 'staff'
+        profile.save()
+        self.assertEqual(user_snapshot.get_user(self.resolve()).userprofile.role, 'staff')
+
+    def test_suspended_user_is_signed_out_on_next_request(self):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.account_status = 'suspended'
+        profile.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('suspended=1', response['Location'])
+        self.assertNotIn('_auth_user_id', self.client.session)
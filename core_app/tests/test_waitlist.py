@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+
+from core_app import waitlist
+from core_app.models import Booking
+
+from .base import TestCase, make_resource, make_user, slot
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = make_user('owner')
+        self.first = make_user('first')
+        self.second = make_user('second')
+        self.resource = make_resource()
+        self.start, self.end = slot()
+        self.booking = Booking.objects.create(user=self.owner, resource=self.resource, start_time=self.start,
+                                              end_time=self.end, total_price=0, status='approved')
+
+    def free_slot(self, status='cancelled'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.status = status
+            self.booking.save()
+
+    def test_cancelling_promotes_waiting_entry(self):
+        entry = waitlist.join(self.first, self.resource, self.start, self.end)
+        self.free_slot()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'promoted')
+        self.assertEqual(entry.booking.user, self.first)
+        self.assertEqual(entry.booking.status, 'pending')
+
+    def test_overlapping_entries_promote_in_priority_then_queue_order(self):
+        earlier = waitlist.join(self.first, self.resource, self.start, self.end)
+        preferred = waitlist.join(self.second, self.resource, self.start, self.end)
+        preferred.priority = 1
+        preferred.save()
+        self.free_slot(status='rejected')
+        earlier.refresh_from_db()
+        preferred.refresh_from_db()
+        self.assertEqual(preferred.status, 'promoted')
+        self.assertEqual(earlier.status, 'waiting')
+
+    def test_pending_booking_leaving_does_not_promote(self):
+        self.booking.status = 'pending'
+        self.booking.save()
+        entry = waitlist.join(self.first, self.resource, self.start, self.end)
+        self.free_slot()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'waiting')
+
+    def test_window_longer_than_limit_is_refused(self):
+        with self.assertRaises(ValidationError):
+            waitlist.join(self.first, self.resource, self.start, self.start + waitlist.MAX_WINDOW + timedelta(hours=1))
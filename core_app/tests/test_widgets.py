@@ -0,0 +1,67 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.urls import reverse
+from django.utils import timezone
+
+from core_app import widgets
+from core_app.models import Booking
+
+from .base import TestCase, make_plan, make_resource, make_user, subscribe
+
+
+@mock.patch.object(widgets.logger, 'warning')
+class DashboardWidgetTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.member = make_user('member')
+        self.staff = make_user('staff', role='staff')
+        subscribe(self.member, make_plan('desk'))
+        desks = [make_resource(f'Desk {number}') for number in range(3)]
+        start = timezone.now() + timedelta(days=1)
+        for number in range(12):
+            self.book(desks[number % 3], start + timedelta(hours=number))
+
+    def book(self, resource, start):
+        return Booking.objects.create(user=self.member, resource=resource, start_time=start,
+                                      end_time=start + timedelta(hours=1), total_price=10)
+
+    def widget(self, name, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('dashboard_widget', args=[name]))
+
+    def test_every_widget_stays_within_its_query_budget(self, warning):
+        for name, widget in widgets.WIDGETS.items():
+            user = self.member if 'member' in widget.roles else self.staff
+            with self.subTest(name):
+                self.assertEqual(self.widget(name, user).status_code, 200)
+        warning.assert_not_called()
+
+    def test_lists_show_one_page_and_whether_there_is_more(self, warning):
+        response = self.widget('my_bookings', self.member)
+        self.assertEqual((len(response.context['bookings']), response.context['has_more']), (5, True))
+        response = self.widget('site_bookings', self.staff)
+        self.assertEqual((len(response.context['bookings']), response.context['has_more']), (10, True))
+
+    def test_rendered_html_is_cached(self, warning):
+        html = self.widget('operations', self.staff).content
+        with mock.patch.object(widgets.WIDGETS['operations'], 'loader') as loader:
+            self.assertEqual(self.widget('operations', self.staff).content, html)
+        loader.assert_not_called()
+
+    def test_a_new_booking_drops_the_members_cached_copies(self, warning):
+        self.assertEqual(self.widget('booking_count', self.member).context['booking_count'], 12)
+        self.book(make_resource('Room'), timezone.now() + timedelta(days=2))
+        self.assertEqual(self.widget('booking_count', self.member).context['booking_count'], 13)
+
+    def test_widgets_are_limited_to_their_roles(self, warning):
+        self.assertEqual(self.widget('operations', self.member).status_code, 404)
+        self.assertEqual(self.widget('my_bookings', self.staff).status_code, 404)
+        self.assertEqual(self.widget('missing', self.staff).status_code, 404)
+
+    def test_a_render_over_budget_is_reported(self, warning):
+        with mock.patch.object(widgets.WIDGETS['operations'], 'query_budget', 2), \
+                mock.patch('core_app.metrics.inc') as inc:
+            self.widget('operations', self.staff)
+        warning.assert_called_once_with('Dashboard widget %s ran %d queries (budget %d)', 'operations', 3, 2)
+        inc.assert_any_call('spaceflow_dashboard_widget_over_budget_total', widget='operations')
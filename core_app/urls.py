@@ -1,6 +1,7 @@
 # core_app/urls.py
 from django.urls import path
-from . import views
+from . import api, views
+from .forms import LoginForm
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
@@ -8,6 +9,7 @@ urlpatterns = [
     path('register/', views.register, name='register'),
     path('login/', auth_views.LoginView.as_view(
         template_name='core_app/auth/login.html',
+        authentication_form=LoginForm,
         next_page='dashboard'
     ), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
@@ -19,16 +21,26 @@ urlpatterns = [
     # Home and Dashboard
     path('', views.home, name='home'),
     path('dashboard/', views.member_dashboard, name='dashboard'),
+    path('dashboard/widgets/<slug:name>/', views.dashboard_widget, name='dashboard_widget'),
+    path('site/', views.site_switch, name='site_switch'),
     
     # Resources
     path('resources/', views.resource_list, name='resource_list'),
     path('resources/<int:pk>/', views.resource_detail, name='resource_detail'),
     path('resources/create/', views.resource_create, name='resource_create'),
+    path('resources/import/', views.resource_import, name='resource_import'),
     
     # Bookings
     path('bookings/', views.booking_list, name='booking_list'),
     path('bookings/create/<int:resource_id>/', views.booking_create, name='booking_create'),
     path('bookings/<int:pk>/approve/', views.booking_approve, name='booking_approve'),
+    path('bookings/<int:pk>/reject/', views.booking_reject, name='booking_reject'),
+    path('bookings/<int:pk>/cancel/', views.booking_cancel, name='booking_cancel'),
+    
+    # Waitlist
+    path('waitlist/', views.waitlist_list, name='waitlist_list'),
+    path('waitlist/join/<int:resource_id>/', views.waitlist_join, name='waitlist_join'),
+    path('waitlist/<int:pk>/leave/', views.waitlist_leave, name='waitlist_leave'),
     
     # Subscriptions
     path('subscriptions/', views.subscription_list, name='subscription_list'),
@@ -38,7 +50,17 @@ urlpatterns = [
     path('leases/', views.lease_list, name='lease_list'),
     path('leases/create/<int:resource_id>/', views.lease_create, name='lease_create'),
     
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
+    path('system/profiles/', views.profile_list, name='profile_list'),
+    path('system/profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('system/profiles/<str:profile_id>/stacks/', views.profile_stacks, name='profile_stacks'),
+    
     # User Management (Staff/Admin only)
     path('users/', views.user_list, name='user_list'),
     path('users/<int:user_id>/', views.user_detail, name='user_detail'),
-]
\ No newline at end of file
+
+    # JSON API (see core_app/api.py)
+    path('api/v1/<slug:name>/', api.collection_view, name='api_collection'),
+    path('api/v1/<slug:name>/<int:pk>/', api.item_view, name='api_item'),
+]
@@ -0,0 +1,119 @@
+"""
+Cached user-and-profile snapshots.
+
+On login (or after invalidation) the authenticated ``User`` and its
+``UserProfile`` are flattened into a small JSON-safe dict and stored in the
+session. Later requests rebuild both model instances from that dict, so
+resolving ``request.user`` and ``request.user.userprofile`` costs no queries.
+
+A snapshot is only trusted while its version token matches the one held in
+the cache for that user. Saving a user or profile deletes the token (see
+``signals.py``), which forces the next request to reload from the database.
+"""
+import uuid
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import router
+
+from .models import UserProfile
+
+SNAPSHOT_SESSION_KEY = '_auth_user_snapshot'
+VERSION_CACHE_KEY = 'auth:snapshot_version:{}'
+
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email',
+               'is_staff', 'is_active', 'is_superuser')
+PROFILE_FIELDS = ('id', 'user_id', 'role', 'account_status', 'company_name',
+                  'profile_picture', 'current_site_id')
+
+
+def _get_version(user_id):
+    """Return the current snapshot token for a user, creating one if needed"""
+    key = VERSION_CACHE_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, settings.SESSION_COOKIE_AGE)
+        version = cache.get(key)
+    return version
+
+
+def _build_instance(model, field_names, data):
+    """Rebuild a model instance from snapshot data without touching the DB"""
+    concrete = [f for f in model._meta.concrete_fields if f.attname in field_names]
+    values = [data[f.attname] for f in concrete]
+    return model.from_db(router.db_for_read(model), [f.attname for f in concrete], values)
+
+
+def build_snapshot(user, profile, version, session_hash):
+    """Flatten a user and profile into a JSON-serializable dict"""
+    user_data = {name: getattr(user, name) for name in USER_FIELDS}
+    profile_data = None
+    if profile is not None:
+        profile_data = {
+            name: getattr(profile, name) for name in PROFILE_FIELDS
+            if name != 'profile_picture'
+        }
+        profile_data['profile_picture'] = profile.profile_picture.name or ''
+    return {
+        'version': version,
+        'hash': session_hash,
+        'user': user_data,
+        'profile': profile_data,
+    }
+
+
+def user_from_snapshot(snapshot):
+    """Return a User (with userprofile attached) built from a snapshot"""
+    user = _build_instance(User, USER_FIELDS, snapshot['user'])
+    if snapshot['profile'] is not None:
+        profile = _build_instance(UserProfile, PROFILE_FIELDS, snapshot['profile'])
+        user.userprofile = profile
+    return user
+
+
+def get_user(request):
+    """Resolve request.user from the session snapshot, refreshing it if stale"""
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    if user_id is None:
+        return AnonymousUser()
+
+    snapshot = session.get(SNAPSHOT_SESSION_KEY)
+    session_hash = session.get(auth.HASH_SESSION_KEY)
+    if (
+        snapshot
+        and str(snapshot['user']['id']) == str(user_id)
+        and snapshot['hash'] == session_hash
+        and snapshot['version'] == cache.get(VERSION_CACHE_KEY.format(user_id))
+    ):
+        return user_from_snapshot(snapshot)
+
+    # Stale or missing: fall back to Django's own lookup, which also
+    # verifies the session hash, then cache the result
+    user = auth.get_user(request)
+    if not user.is_authenticated:
+        session.pop(SNAPSHOT_SESSION_KEY, None)
+        return user
+
+    profile = UserProfile.objects.filter(user=user).first()
+    if profile is not None:
+        user.userprofile = profile
+    session[SNAPSHOT_SESSION_KEY] = build_snapshot(
+        user, profile, _get_version(user.pk), session.get(auth.HASH_SESSION_KEY)
+    )
+    return user
+
+
+def is_suspended(user):
+    """Check the account status carried by the user's snapshot profile"""
+    try:
+        return user.userprofile.account_status == 'suspended'
+    except UserProfile.DoesNotExist:
+        return False
+
+
+def invalidate_user_snapshot(user_id):
+    """Force every session of a user to reload on its next request"""
+    cache.delete(VERSION_CACHE_KEY.format(user_id))
@@ -1,20 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
 from django.contrib import messages
-from django.db.models import Q
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from .forms import (
     CustomUserCreationForm, ResourceForm, BookingForm,
-    LeaseContractForm, SubscriptionForm
+    LeaseContractForm, SubscriptionForm, WaitlistForm, CatalogUploadForm
 )
 from django.contrib.auth.models import User
+from . import archive, catalog, entitlements, facets, jobs, metrics, occupancy, pagination, profiling, reservations, sites, waitlist, widgets
+from .db import serialized_write
+from .ratelimit import ratelimit
+from .permissions import can_approve_bookings, can_manage_system_settings, is_owner_or_staff
 from .models import (
     UserProfile, Resource, Booking, LeaseContract,
-    MembershipPlan, Subscription
+    MembershipPlan, Subscription, WaitlistEntry, Location
 )
 
+RESOURCES_PER_PAGE = 24
+BOOKINGS_PER_PAGE = 50
+USERS_PER_PAGE = 25
+USER_SUMMARY_CACHE_KEY = 'users:summary'
+USER_SUMMARY_CACHE_TIMEOUT = 60
+
 def home(request):
     resources = Resource.objects.filter(status='available')
     membership_plans = MembershipPlan.objects.filter(is_active=True)
@@ -28,17 +45,30 @@ def register(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            UserProfile.objects.create(
-                user=user,
-                role='member'
-            )
+            # The post_save signal creates the member profile
+            form.save()
             messages.success(request, 'Account created successfully. You can now login.')
             return redirect('login')
     else:
         form = CustomUserCreationForm()
     return render(request, 'core_app/auth/register.html', {'form': form})
 
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    token = settings.METRICS_TOKEN
+    authorized = (
+        (token and request.headers.get('Authorization') == f'Bearer {token}')
+        or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    
+    gauges = {
+        'spaceflow_pending_bookings': Booking.objects.filter(status='pending').count(),
+        'spaceflow_active_leases': LeaseContract.objects.filter(status='active').count(),
+    }
+    return HttpResponse(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Profile Views
 @login_required
 def profile_view(request):
@@ -77,6 +107,8 @@ def profile_edit(request):
         if 'profile_picture' in request.FILES:
             profile.profile_picture = request.FILES['profile_picture']
         profile.save()
+        if 'profile_picture' in request.FILES:
+            jobs.enqueue('core_app.tasks.process_profile_picture', profile_id=profile.pk)
         messages.success(request, 'Profile updated successfully.')
         return redirect('profile')
     
@@ -85,61 +117,115 @@ def profile_edit(request):
 # Dashboard Views
 @login_required
 def member_dashboard(request):
-    # Get or create user profile
-    user_profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'role': 'member',
-            'phone_number': '',
-            'address': '',
-            'company_name': ''
-        }
-    )
+    # Use the profile cached with the session, creating one if it is missing
+    try:
+        user_profile = request.user.userprofile
+    except UserProfile.DoesNotExist:
+        user_profile, created = UserProfile.objects.get_or_create(
+            user=request.user,
+            defaults={
+                'role': 'member',
+                'phone_number': '',
+                'address': '',
+                'company_name': ''
+            }
+        )
     
     if user_profile.role not in ['member', 'staff', 'admin']:
         messages.error(request, 'Access denied.')
         return redirect('home')
     
-    # Get bookings based on user role
-    if user_profile.role == 'member':
-        bookings = request.user.bookings.all()[:5]
-    else:
-        # Staff/Admin see all recent bookings
-        bookings = Booking.objects.all().order_by('-created_at')[:10]
-    
-    context = {
-        'bookings': bookings,
-        'active_subscription': Subscription.objects.filter(
-            user=request.user,
-            is_active=True,
-            end_date__gte=timezone.now().date()
-        ).first()
-    }
-    
-    if user_profile.role in ['staff', 'admin']:
-        context.update({
-            'pending_bookings': Booking.objects.filter(status='pending').count(),
-            'active_leases': LeaseContract.objects.filter(status='active').count(),
-            'maintenance_resources': Resource.objects.filter(status='maintenance').count(),
-        })
+    # The shell makes no queries; each tile is fetched from dashboard_widget
+    return render(request, 'core_app/dashboard.html')
+
+@login_required
+def dashboard_widget(request, name):
+    """One dashboard tile as an HTML fragment, cached per widget policy"""
+    widget = widgets.WIDGETS.get(name)
+    try:
+        role = request.user.userprofile.role
+    except UserProfile.DoesNotExist:
+        raise Http404
+    if widget is None or role not in widget.roles:
+        raise Http404
+    html = widgets.render(widget, request, sites.current_site(request.user))
+    return HttpResponse(html)
+
+@login_required
+def site_switch(request):
+    """Set (or clear) the site the user is working in"""
+    if request.method == 'POST':
+        site_id = request.POST.get('site')
+        site = get_object_or_404(Location, pk=site_id, is_active=True) if site_id else None
+        sites.set_current_site(request.user, site)
     
-    return render(request, 'core_app/dashboard.html', context)
+    next_url = request.POST.get('next') or request.GET.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        next_url = 'dashboard'
+    return redirect(next_url)
 
 # Resource Views
 @login_required
 def resource_list(request):
-    resources = Resource.objects.all()
-    resource_type = request.GET.get('type')
-    if resource_type:
-        resources = resources.filter(type=resource_type)
+    site = sites.current_site(request.user)
+    resources = entitlements.filter_resources(Resource.objects.for_site(site), request.user)
+    
+    options = facets.facet_options()
+    selected = facets.selection(request.GET, options)
+    scope_key = f"{site.pk if site else 'all'}:{','.join(sorted(entitlements.allowed_resource_types(request.user)))}"
+    counts, total = facets.facet_counts(resources, selected, scope_key, options)
+    
+    resources = facets.filter_resources(resources, selected, options).select_related('site')
+    paginator = Paginator(resources, RESOURCES_PER_PAGE)
+    # The facet aggregate already counted the matches
+    paginator.count = total
+    page = paginator.get_page(request.GET.get('page'))
     
-    return render(request, 'core_app/resources/list.html', {'resources': resources})
+    return render(request, 'core_app/resources/list.html', {
+        'resources': occupancy.attach_live_status(page.object_list),
+        'page': page,
+        'facets': _facet_links(request.GET, options, counts, selected),
+        'selected': selected,
+        'filter_query': _without(request.GET, 'page'),
+    })
+
+def _without(params, *names):
+    """Return params urlencoded without the given keys"""
+    params = params.copy()
+    for name in names:
+        params.pop(name, None)
+    return params.urlencode()
+
+def _facet_links(params, options, counts, selected):
+    """Facet options with counts and the query string that toggles each one"""
+    labels = {'type': 'Type', 'status': 'Status', 'capacity': 'Capacity', 'site': 'Location', 'price': 'Price'}
+    result = []
+    for facet, choices in options.items():
+        links = []
+        for value, label, q in choices:
+            toggled = params.copy()
+            toggled.pop('page', None)
+            if selected.get(facet) == value:
+                toggled.pop(facet, None)
+            else:
+                toggled[facet] = value
+            links.append({
+                'label': label,
+                'count': counts[facet][value],
+                'selected': selected.get(facet) == value,
+                'query': toggled.urlencode(),
+            })
+        result.append({'name': facet, 'label': labels[facet], 'options': links})
+    return result
 
 @login_required
 def resource_detail(request, pk):
     resource = get_object_or_404(Resource, pk=pk)
+    occupancy.attach_live_status([resource])
     context = {
         'resource': resource,
+        'can_book': entitlements.is_entitled(request.user, resource),
         'upcoming_bookings': resource.bookings.filter(
             status='approved',
             end_time__gte=timezone.now()
@@ -160,55 +246,226 @@ def resource_create(request):
             messages.success(request, 'Resource created successfully.')
             return redirect('resources')
     else:
-        form = ResourceForm()
+        form = ResourceForm(initial={'site': sites.current_site(request.user)})
     
     return render(request, 'core_app/resources/form.html', {'form': form})
 
+@login_required
+def resource_import(request):
+    """Upload a resource catalog, preview the changes, then apply them"""
+    if request.user.userprofile.role not in ['staff', 'admin']:
+        messages.error(request, 'Access denied.')
+        return redirect('resource_list')
+
+    form = CatalogUploadForm()
+    context = {'form': form, 'columns': catalog.COLUMNS}
+    if request.method == 'POST':
+        try:
+            if 'content' in request.POST:
+                # Confirmation: the previewed file comes back in a hidden field
+                name, content = request.POST.get('name', ''), request.POST['content']
+            else:
+                form = context['form'] = CatalogUploadForm(request.POST, request.FILES)
+                if not form.is_valid():
+                    return render(request, 'core_app/resources/import.html', context)
+                upload = form.cleaned_data['file']
+                name, content = upload.name, catalog.decode(upload.read())
+            rows = catalog.read_rows(content, name)
+        except catalog.CatalogError as e:
+            messages.error(request, str(e))
+            return render(request, 'core_app/resources/import.html', context)
+
+        plan = catalog.plan(rows)
+        if 'content' in request.POST and plan.is_valid:
+            if request.POST.get('fingerprint') != plan.fingerprint():
+                messages.warning(request, 'The catalog changed since the preview. Please review the changes again.')
+            else:
+                created, updated = catalog.apply(plan)
+                messages.success(request, f'Imported the catalog: {created} resources created, {updated} updated.')
+                return redirect('resource_list')
+        context.update({
+            'plan': plan,
+            'changes': len(plan.creates) + len(plan.updates),
+            'name': name,
+            'content': content,
+            'rows': len(rows),
+        })
+
+    return render(request, 'core_app/resources/import.html', context)
+
 # Booking Views
 @login_required
+@ratelimit('booking_create')
 def booking_create(request, resource_id):
     resource = get_object_or_404(Resource, pk=resource_id)
     
+    if not entitlements.is_entitled(request.user, resource):
+        messages.error(request, 'Your membership plan does not include this type of resource.')
+        return redirect('resource_detail', pk=resource.pk)
+    
     if request.method == 'POST':
         form = BookingForm(request.POST)
         if form.is_valid():
             booking = form.save(commit=False)
             booking.user = request.user
             booking.resource = resource
-            booking.save()
-            messages.success(request, 'Booking request submitted successfully.')
-            return redirect('booking_list')
+            booking.total_price = booking.calculate_total_price()
+            try:
+                reservations.create(booking)
+            except ValidationError as e:
+                # Taken between validating the form and saving
+                form.add_error(None, e)
+            else:
+                messages.success(request, 'Booking request submitted successfully.')
+                return redirect('booking_list')
     else:
         form = BookingForm(initial={'resource': resource})
     
-    return render(request, 'core_app/bookings/form.html', {'form': form, 'resource': resource})
+    return render(request, 'core_app/bookings/form.html', {
+        'form': form,
+        'resource': resource,
+        'slot_taken': form.has_error(NON_FIELD_ERRORS, 'conflict'),
+    })
 
 @login_required
 def booking_list(request):
     user_profile = request.user.userprofile
-    if user_profile.role in ['staff', 'admin']:
-        bookings = Booking.objects.all()
+    status = request.GET.get('status')
+    show_history = request.GET.get('history') == '1'
+    site = sites.current_site(request.user)
+    # Keyset pages: ?before= is the (start_time, id) of the last booking shown
+    before = pagination.decode_keyset(request.GET.get('before'))
+    
+    if show_history:
+        # Include bookings that have been moved to the archive table
+        bookings = archive.booking_history(
+            user=None if user_profile.role in ['staff', 'admin'] else request.user,
+            status=status,
+            site=site,
+            limit=BOOKINGS_PER_PAGE + 1,
+            before=before
+        )
     else:
-        bookings = request.user.bookings.all()
+        if user_profile.role in ['staff', 'admin']:
+            bookings = Booking.objects.for_site(site)
+        else:
+            bookings = request.user.bookings.for_site(site)
+        bookings = bookings.select_related('user', 'resource').order_by('-start_time', '-id')
+        if status:
+            bookings = bookings.filter(status=status)
+        if before is not None:
+            bookings = bookings.filter(pagination.before_keyset('start_time', before))
+        bookings = list(bookings[:BOOKINGS_PER_PAGE + 1])
     
-    status = request.GET.get('status')
-    if status:
-        bookings = bookings.filter(status=status)
+    next_query = None
+    if len(bookings) > BOOKINGS_PER_PAGE:
+        bookings = bookings[:BOOKINGS_PER_PAGE]
+        query = request.GET.copy()
+        query['before'] = pagination.encode_keyset(bookings[-1].start_time, bookings[-1].pk)
+        next_query = query.urlencode()
     
-    return render(request, 'core_app/bookings/list.html', {'bookings': bookings})
+    first_query = request.GET.copy()
+    first_query.pop('before', None)
+    return render(request, 'core_app/bookings/list.html', {
+        'bookings': bookings,
+        'show_history': show_history,
+        'next_query': next_query,
+        'first_query': first_query.urlencode() if before is not None else None,
+    })
 
 @login_required
+@require_POST
 def booking_approve(request, pk):
     if request.user.userprofile.role not in ['staff', 'admin']:
         messages.error(request, 'Access denied.')
-        return redirect('bookings')
+        return redirect('booking_list')
     
     booking = get_object_or_404(Booking, pk=pk)
-    booking.status = 'approved'
-    booking.save()
+    try:
+        reservations.approve(booking)
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+        return redirect('booking_list')
+    jobs.enqueue('core_app.tasks.send_booking_approved_email', booking_id=booking.pk)
     messages.success(request, 'Booking approved successfully.')
     return redirect('booking_list')
 
+@login_required
+@require_POST
+def booking_reject(request, pk):
+    if not can_approve_bookings(request.user):
+        messages.error(request, 'Access denied.')
+        return redirect('booking_list')
+    
+    booking = get_object_or_404(Booking, pk=pk)
+    try:
+        reservations.reject(booking)
+    except ValidationError as e:
+        messages.error(request, e.messages[0])
+        return redirect('booking_list')
+    messages.success(request, 'Booking rejected.')
+    return redirect('booking_list')
+
+@login_required
+@require_POST
+def booking_cancel(request, pk):
+    booking = get_object_or_404(Booking, pk=pk)
+    if not is_owner_or_staff(request.user, booking):
+        messages.error(request, 'Access denied.')
+        return redirect('booking_list')
+    
+    if booking.status in ('pending', 'approved'):
+        booking.status = 'cancelled'
+        serialized_write(booking.save)()
+        messages.success(request, 'Booking cancelled.')
+    return redirect('booking_list')
+
+# Waitlist Views
+@login_required
+def waitlist_join(request, resource_id):
+    resource = get_object_or_404(Resource, pk=resource_id)
+    if request.method != 'POST':
+        return redirect('booking_create', resource_id=resource.pk)
+    
+    if not entitlements.is_entitled(request.user, resource):
+        messages.error(request, 'Your membership plan does not include this type of resource.')
+        return redirect('resource_detail', pk=resource.pk)
+    
+    form = WaitlistForm(request.POST)
+    if form.is_valid():
+        try:
+            waitlist.join(
+                request.user,
+                resource,
+                form.cleaned_data['start_time'],
+                form.cleaned_data['end_time'],
+                form.cleaned_data['notes']
+            )
+        except ValidationError as e:
+            messages.error(request, e.messages[0])
+            return redirect('booking_create', resource_id=resource.pk)
+        messages.success(request, "You're on the waitlist. We'll book the slot for you if it frees up.")
+        return redirect('waitlist_list')
+    
+    messages.error(request, 'Please provide a valid time window.')
+    return redirect('booking_create', resource_id=resource.pk)
+
+@login_required
+def waitlist_list(request):
+    entries = request.user.waitlist_entries.select_related('resource', 'booking').filter(
+        status__in=['waiting', 'promoted']
+    )
+    return render(request, 'core_app/waitlist/list.html', {'entries': entries})
+
+@login_required
+def waitlist_leave(request, pk):
+    entry = get_object_or_404(WaitlistEntry, pk=pk, user=request.user)
+    if request.method == 'POST' and entry.status == 'waiting':
+        entry.status = 'withdrawn'
+        entry.save(update_fields=['status', 'updated_at'])
+        messages.success(request, 'You have left the waitlist.')
+    return redirect('waitlist_list')
+
 # Subscription Views
 @login_required
 def subscription_create(request):
@@ -249,9 +506,13 @@ def lease_create(request, resource_id):
             lease = form.save(commit=False)
             lease.user = request.user
             lease.resource = resource
-            lease.save()
-            messages.success(request, 'Lease contract created successfully.')
-            return redirect('lease_list')
+            try:
+                reservations.create_lease(lease)
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, 'Lease contract created successfully.')
+                return redirect('lease_list')
     else:
         form = LeaseContractForm(initial={'resource': resource})
     
@@ -259,10 +520,11 @@ def lease_create(request, resource_id):
 
 @login_required
 def lease_list(request):
+    site = sites.current_site(request.user)
     if request.user.userprofile.role in ['staff', 'admin']:
-        leases = LeaseContract.objects.all()
+        leases = LeaseContract.objects.for_site(site)
     else:
-        leases = request.user.leases.all()
+        leases = request.user.leases.for_site(site)
     
     status = request.GET.get('status')
     if status:
@@ -278,8 +540,53 @@ def user_list(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard')
     
-    users = User.objects.select_related('userprofile').all()
-    return render(request, 'core_app/users/list.html', {'users': users})
+    users = User.objects.select_related('userprofile').order_by('username')
+    
+    query = request.GET.get('q', '').strip()
+    if query:
+        # A UNION of per-column prefix matches lets each branch use its own
+        # index; a single OR across the join would scan auth_user
+        matches = User.objects.filter(username__istartswith=query).values('pk').union(
+            User.objects.filter(email__istartswith=query).values('pk'),
+            User.objects.filter(first_name__istartswith=query).values('pk'),
+            User.objects.filter(last_name__istartswith=query).values('pk'),
+            UserProfile.objects.filter(company_name__istartswith=query).values('user_id'),
+        )
+        users = users.filter(pk__in=matches)
+    
+    role = request.GET.get('role')
+    if role:
+        users = users.filter(userprofile__role=role)
+    status = request.GET.get('status')
+    if status:
+        users = users.filter(userprofile__account_status=status)
+    
+    page = Paginator(users, USERS_PER_PAGE).get_page(request.GET.get('page'))
+    
+    return render(request, 'core_app/users/list.html', {
+        'users': page.object_list,
+        'page': page,
+        'summary': _user_summary(),
+        'query': query,
+        'role': role,
+        'status': status,
+        'filter_query': _without(request.GET, 'page'),
+        'role_choices': UserProfile.ROLE_CHOICES,
+        'status_choices': UserProfile.STATUS_CHOICES,
+    })
+
+def _user_summary():
+    """Directory tiles from a single conditional aggregate, cached briefly"""
+    summary = cache.get(USER_SUMMARY_CACHE_KEY)
+    if summary is None:
+        summary = UserProfile.objects.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(account_status='active')),
+            staff=Count('id', filter=Q(role='staff')),
+            admin=Count('id', filter=Q(role='admin')),
+        )
+        cache.set(USER_SUMMARY_CACHE_KEY, summary, USER_SUMMARY_CACHE_TIMEOUT)
+    return summary
 
 @login_required
 def user_detail(request, user_id):
@@ -290,3 +597,52 @@ def user_detail(request, user_id):
     
     user = get_object_or_404(User, id=user_id)
     return render(request, 'core_app/users/detail.html', {'target_user': user})
+
+# System Views
+@login_required
+def profile_list(request):
+    """List stored request profiles (admin only)"""
+    if not can_manage_system_settings(request.user):
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    return render(request, 'core_app/system/profiles.html', {
+        'profiles': profiling.list_profiles(),
+        'keep': settings.PROFILING_KEEP,
+    })
+
+@login_required
+def profile_detail(request, profile_id):
+    """Top functions, SQL log and sampled stacks of one profile (admin only)"""
+    if not can_manage_system_settings(request.user):
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    sort = 'tottime' if request.GET.get('sort') == 'tottime' else 'cumulative'
+    try:
+        profile = profiling.load(profile_id)
+        functions = profiling.top_functions(profile_id, sort=sort)
+        stacks = profiling.folded_stacks(profile_id)
+    except FileNotFoundError:
+        raise Http404('Profile not found')
+    return render(request, 'core_app/system/profile_detail.html', {
+        'profile': profile,
+        'functions': functions,
+        'stacks': stacks,
+        'sort': sort,
+    })
+
+@login_required
+def profile_stacks(request, profile_id):
+    """Download a profile's folded stacks (admin only)"""
+    if not can_manage_system_settings(request.user):
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard')
+    
+    try:
+        stacks = profiling.folded_stacks(profile_id)
+    except FileNotFoundError:
+        raise Http404('Profile not found')
+    response = HttpResponse(stacks, content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{profile_id}.folded"'
+    return response
@@ -0,0 +1,111 @@
+"""
+Waitlist for fully booked resources.
+
+Members queue for a resource and time window when ``BookingForm`` reports a
+conflict. When an approved booking is cancelled or rejected, the freed
+interval is matched against the queue in priority, then FIFO order, and
+every entry that now fits is turned into a pending booking.
+
+Windows are capped at ``WAITLIST_MAX_WINDOW_HOURS``, so an entry overlapping
+``[start, end)`` must start inside ``(start - max_window, end)``. That keeps
+the overlap lookup a bounded range scan on the
+``(resource, status, start_time)`` index, however long the queue is.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .db import serialized_write
+from .models import Booking, Occupancy, WaitlistEntry
+
+MAX_WINDOW = timedelta(hours=getattr(settings, 'WAITLIST_MAX_WINDOW_HOURS', 24))
+PROMOTION_BATCH_SIZE = getattr(settings, 'WAITLIST_PROMOTION_BATCH_SIZE', 100)
+
+
+def join(user, resource, start_time, end_time, notes=''):
+    """Queue a user for a resource and window, returning the entry"""
+    if end_time <= start_time:
+        raise ValidationError("End time must be after start time")
+    if end_time - start_time > MAX_WINDOW:
+        raise ValidationError(f"Waitlist windows cannot be longer than {MAX_WINDOW}")
+    if start_time < timezone.now():
+        raise ValidationError("Start time cannot be in the past")
+
+    entry, created = WaitlistEntry.objects.get_or_create(
+        user=user,
+        resource=resource,
+        start_time=start_time,
+        end_time=end_time,
+        status='waiting',
+        defaults={'notes': notes}
+    )
+    return entry
+
+
+def overlapping_entries(resource_id, start_time, end_time):
+    """Waiting entries overlapping [start_time, end_time), in queue order"""
+    return WaitlistEntry.objects.filter(
+        resource_id=resource_id,
+        status='waiting',
+        start_time__gt=max(start_time - MAX_WINDOW, timezone.now()),
+        start_time__lt=end_time,
+        end_time__gt=start_time
+    ).order_by('-priority', 'created_at', 'id')
+
+
+def _overlaps(start_time, end_time, intervals):
+    return any(start < end_time and end > start_time for start, end in intervals)
+
+
+@serialized_write
+def promote(resource_id, start_time, end_time):
+    """
+    Turn queued entries that fit into the freed interval into bookings.
+
+    Runs in a single serialized write transaction; returns the list of promoted entries.
+    """
+    entries = list(
+        overlapping_entries(resource_id, start_time, end_time)
+        .select_for_update()
+        .select_related('resource')[:PROMOTION_BATCH_SIZE]
+    )
+    if not entries:
+        return []
+
+    # One ledger query for everything that could still block a candidate
+    busy = list(Occupancy.objects.filter(
+        resource_id=resource_id,
+        end_time__gt=min(e.start_time for e in entries),
+        start_time__lt=max(e.end_time for e in entries)
+    ).values_list('start_time', 'end_time'))
+
+    promoted = []
+    for entry in entries:
+        if _overlaps(entry.start_time, entry.end_time, busy):
+            continue
+        booking = Booking(
+            user_id=entry.user_id,
+            resource=entry.resource,
+            start_time=entry.start_time,
+            end_time=entry.end_time,
+            notes=entry.notes,
+        )
+        booking.total_price = booking.calculate_total_price()
+        booking.save()
+        entry.status = 'promoted'
+        entry.booking = booking
+        entry.save(update_fields=['status', 'booking', 'updated_at'])
+        # Later entries in the queue must not overlap this one
+        busy.append((entry.start_time, entry.end_time))
+        promoted.append(entry)
+    return promoted
+
+
+def release(booking):
+    """Schedule waitlist promotion for a booking's interval after commit"""
+    transaction.on_commit(
+        lambda: promote(booking.resource_id, booking.start_time, booking.end_time)
+    )
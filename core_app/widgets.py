@@ -0,0 +1,134 @@
+"""
+Dashboard widgets.
+
+The dashboard page is a shell that makes no queries of its own. Each tile
+is a widget fetched from /dashboard/widgets/<name>/ once the page has
+loaded, so a slow widget only delays itself. A widget declares:
+
+- the roles that may see it,
+- a cache scope: ``user`` (one copy per user and site) or ``site`` (shared
+  by everyone at a site), with a timeout in seconds; the rendered HTML is
+  cached, and ``invalidate`` drops a user's copies early,
+- a query budget. A render that issues more queries is logged and counted
+  in spaceflow_dashboard_widget_over_budget_total, which catches N+1
+  regressions.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import metrics, sites
+from .models import Booking, LeaseContract, Resource, Subscription
+
+logger = logging.getLogger(__name__)
+
+MEMBER_ROLES = ('member',)
+STAFF_ROLES = ('staff', 'admin')
+RECENT_BOOKINGS = {'member': 5, 'staff': 10}
+
+
+class Widget:
+    def __init__(self, name, loader, roles, scope, timeout, query_budget):
+        self.name = name
+        self.loader = loader
+        self.template = f'core_app/dashboard/widgets/{name}.html'
+        self.roles = roles
+        self.scope = scope
+        self.timeout = timeout
+        self.query_budget = query_budget
+
+
+def _subscription(user, site):
+    return {'active_subscription': Subscription.objects.filter(
+        user=user,
+        is_active=True,
+        end_date__gte=timezone.localdate()
+    ).select_related('plan').first()}
+
+
+def _booking_count(user, site):
+    return {'booking_count': Booking.objects.for_site(site).filter(user=user).count()}
+
+
+def _recent_bookings(queryset, limit):
+    # One extra row tells whether to link to the full list, without a COUNT
+    bookings = list(queryset.select_related('resource')[:limit + 1])
+    return {'bookings': bookings[:limit], 'has_more': len(bookings) > limit}
+
+
+def _my_bookings(user, site):
+    return _recent_bookings(Booking.objects.for_site(site).filter(user=user), RECENT_BOOKINGS['member'])
+
+
+def _site_bookings(user, site):
+    # Newest first by id, which follows created_at: the primary key (or the
+    # site_id index, whose entries end with it) is read backwards, no sort
+    return _recent_bookings(Booking.objects.for_site(site).order_by('-id'), RECENT_BOOKINGS['staff'])
+
+
+def _operations(user, site):
+    return {
+        'pending_bookings': Booking.objects.for_site(site).filter(status='pending').count(),
+        'active_leases': LeaseContract.objects.for_site(site).filter(status='active').count(),
+        'maintenance_resources': Resource.objects.for_site(site).filter(status='maintenance').count(),
+    }
+
+
+WIDGETS = {widget.name: widget for widget in (
+    Widget('subscription', _subscription, MEMBER_ROLES, scope='user', timeout=300, query_budget=1),
+    Widget('booking_count', _booking_count, MEMBER_ROLES, scope='user', timeout=60, query_budget=1),
+    Widget('my_bookings', _my_bookings, MEMBER_ROLES, scope='user', timeout=60, query_budget=1),
+    Widget('operations', _operations, STAFF_ROLES, scope='site', timeout=30, query_budget=3),
+    Widget('site_bookings', _site_bookings, STAFF_ROLES, scope='site', timeout=30, query_budget=1),
+)}
+
+# Widgets to drop from a user's cache when their own data changes
+USER_WIDGETS = {
+    'bookings': ('booking_count', 'my_bookings'),
+    'subscription': ('subscription',),
+}
+
+
+def _cache_key(widget, user_id, site_id):
+    if widget.scope == 'user':
+        return f'widget:{widget.name}:user:{user_id}:site:{site_id}'
+    return f'widget:{widget.name}:site:{site_id}'
+
+
+def render(widget, request, site):
+    """Return the widget's HTML from the cache, rendering it on a miss"""
+    key = _cache_key(widget, request.user.pk, site.pk if site else None)
+    html = cache.get(key)
+    if html is not None:
+        return html
+
+    queries = 0
+
+    def count_query(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        context = widget.loader(request.user, site)
+        html = render_to_string(widget.template, context, request)
+    if queries > widget.query_budget:
+        logger.warning('Dashboard widget %s ran %d queries (budget %d)', widget.name, queries, widget.query_budget)
+        metrics.inc('spaceflow_dashboard_widget_over_budget_total', widget=widget.name)
+    cache.set(key, html, widget.timeout)
+    return html
+
+
+def invalidate(user_id, kind):
+    """Drop a user's cached copies of the widgets showing ``kind`` (see USER_WIDGETS)"""
+    # A user's widgets are cached per site they looked from, including "all sites"
+    site_ids = [None] + [site.pk for site in sites.active_sites()]
+    keys = [
+        _cache_key(WIDGETS[name], user_id, site_id)
+        for name in USER_WIDGETS[kind]
+        for site_id in site_ids
+    ]
+    cache.delete_many(keys)
@@ -1,6 +1,11 @@
+import sys
+
+from main_app import server
+
+
 def main():
-    print("Hello from space-flow!")
+    return server.main()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
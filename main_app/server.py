@@ -0,0 +1,477 @@
+"""
+Pre-forking WSGI server, started with ``python main.py``.
+
+Before it forks, the master process imports Django, the URLconf, every
+template and the models. It serves a few warm-up requests and primes the
+caches, then freezes the garbage collector. Workers therefore start warm
+and share that memory with the master copy-on-write. Each worker runs
+SERVER_THREADS threads. The threads accept connections from the shared
+listening socket and serve them with the standard library's wsgiref
+handler, which speaks HTTP/1.0. Run nginx or another proxy in front for
+TLS, keep-alive and slow clients.
+
+Signals to the master:
+
+- TERM, INT: stop accepting, let requests in flight finish (up to
+  SERVER_GRACEFUL_TIMEOUT), then exit.
+- HUP: rolling reload. The new code is first started in a ``--check``
+  subprocess. If that succeeds, the master re-executes itself on the same
+  listening socket, preloads the new code, and replaces the old workers
+  one at a time as new ones become ready. If the check fails, nothing
+  changes.
+- USR1: log the memory use of every process.
+
+A worker retires after SERVER_MAX_REQUESTS requests, plus a random jitter
+of up to SERVER_MAX_REQUESTS_JITTER so workers don't all restart at once.
+A fresh fork of the warm master replaces it. POSIX only.
+
+With more than one worker every cache must be shared between processes.
+A per-process cache (LocMemCache) only forgets a changed permission,
+plan, session or facet count in the worker that made the change, so with
+one configured the server defaults to a single worker and refuses to
+start more.
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+from wsgiref.util import setup_testing_defaults
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+LISTEN_FD_ENV = 'SERVER_LISTEN_FD'
+OLD_WORKERS_ENV = 'SERVER_OLD_WORKERS'
+READY_TIMEOUT = 30  # seconds a new worker has to start
+PROCESS_LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve space-flow with a pre-forking WSGI server')
+    parser.add_argument('--bind', default=os.getenv('SERVER_BIND', '127.0.0.1:8000'),
+                        help='host:port to listen on (default: SERVER_BIND or 127.0.0.1:8000)')
+    parser.add_argument('--workers', type=int,
+                        default=_env_int('SERVER_WORKERS', 0) or None,
+                        help='Worker processes (default: SERVER_WORKERS, else one per CPU with a shared '
+                             'cache and one with a per-process cache)')
+    parser.add_argument('--threads', type=int, default=_env_int('SERVER_THREADS', 4),
+                        help='Threads per worker (default: SERVER_THREADS or 4)')
+    parser.add_argument('--max-requests', type=int, default=_env_int('SERVER_MAX_REQUESTS', 1000),
+                        help='Requests a worker serves before it is replaced; 0 for never')
+    parser.add_argument('--max-requests-jitter', type=int, default=_env_int('SERVER_MAX_REQUESTS_JITTER', 100),
+                        help='Random extra requests per worker, so workers retire at different times')
+    parser.add_argument('--timeout', type=int, default=_env_int('SERVER_TIMEOUT', 30),
+                        help='Seconds a connection may stay idle')
+    parser.add_argument('--graceful-timeout', type=int, default=_env_int('SERVER_GRACEFUL_TIMEOUT', 30),
+                        help='Seconds workers get to finish their requests when stopping')
+    parser.add_argument('--warmup', default=os.getenv('SERVER_WARMUP_URLS', '/,/login/'),
+                        help='Comma-separated paths requested before forking')
+    parser.add_argument('--check', action='store_true',
+                        help='Preload and warm up, report the timings, then exit')
+    args = parser.parse_args(argv)
+    if (args.workers is not None and args.workers < 1) or args.threads < 1:
+        parser.error('--workers and --threads must be positive')
+    return args
+
+
+def memory_usage(pid):
+    """(rss, pss, private) of a process in KiB, or None where /proc has no smaps_rollup"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            values = {}
+            for line in f:
+                key, _, rest = line.partition(':')
+                fields = rest.split()
+                if len(fields) == 2 and fields[1] == 'kB':
+                    values[key] = int(fields[0])
+    except OSError:
+        return None
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def _compile_templates():
+    """Load every template so the cached loader holds them compiled; returns how many"""
+    from django.template import TemplateSyntaxError, engines
+
+    count = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    if not name.endswith(('.html', '.txt', '.xml')):
+                        continue
+                    try:
+                        engine.get_template(os.path.relpath(os.path.join(root, name), directory))
+                    except TemplateSyntaxError:
+                        # Some templates only compile in the context they are included from
+                        continue
+                    count += 1
+    return count
+
+
+def _warm_up(application, paths):
+    from django.conf import settings
+
+    host = next((host for host in settings.ALLOWED_HOSTS if host and not host.startswith(('*', '.'))), 'localhost')
+    for path in paths:
+        environ = {'PATH_INFO': path, 'HTTP_HOST': host, 'REMOTE_ADDR': '127.0.0.1'}
+        setup_testing_defaults(environ)
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(status)
+            return lambda data: None
+
+        result = application(environ, start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        logger.info('Warm-up request %s: %s', path, statuses[0] if statuses else 'no response')
+
+
+def _prime_caches():
+    from core_app import entitlements, facets, sites
+
+    sites.active_sites()
+    facets.get_version()
+    entitlements.get_plan_matrix()
+
+
+def preload(args):
+    """Import and warm up the application in this process; returns the WSGI callable"""
+    timings = {}
+    started = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main_app.settings')
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # Settings, logging, apps, models and the middleware chain
+    application = get_wsgi_application()
+    # Importing the URLconf imports every view; reverse_dict builds the {% url %} tables
+    get_resolver().reverse_dict
+    timings['import'] = time.perf_counter() - started
+
+    step = time.perf_counter()
+    templates = _compile_templates()
+    timings['templates'] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    from core_app import metrics
+    # Warm-up requests are not traffic
+    with metrics.registry.warm_up():
+        _warm_up(application, [path.strip() for path in args.warmup.split(',') if path.strip()])
+        _prime_caches()
+    timings['warm_up'] = time.perf_counter() - step
+
+    # Connections must not be shared across the fork
+    connections.close_all()
+    logger.info('Preloaded in %.2fs: import %.2fs, %d templates %.2fs, warm-up %.2fs',
+                time.perf_counter() - started, timings['import'], templates, timings['templates'],
+                timings['warm_up'], extra={'timings': timings, 'templates': templates})
+    return application
+
+
+def _listener(bind):
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        # Re-executed by a reload: keep serving on the inherited socket
+        sock = socket.socket(fileno=int(fd))
+        os.set_inheritable(sock.fileno(), False)
+        return sock
+    host, _, port = bind.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    return socket.create_server((host, int(port)), family=family, backlog=2048)
+
+
+class RequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        # RequestLogMiddleware writes the access log
+        logger.debug(format, *args)
+
+
+class Worker:
+    """One forked process serving the shared socket with a pool of threads"""
+
+    def __init__(self, application, listener, args):
+        self.listener = listener
+        self.args = args
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.served = 0
+        self.max_requests = args.max_requests
+        if self.max_requests:
+            self.max_requests += random.randint(0, args.max_requests_jitter)
+
+        host, port = listener.getsockname()[:2]
+        self.server = WSGIServer((host, port), RequestHandler, bind_and_activate=False)
+        self.server.socket.close()
+        self.server.socket = listener
+        self.server.server_name = host
+        self.server.server_port = port
+        self.server.setup_environ()
+        self.server.set_app(application)
+
+    def run(self, ready_fd):
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        for signum in (signal.SIGINT, signal.SIGHUP, signal.SIGUSR1):
+            signal.signal(signum, signal.SIG_IGN)
+        # Wake up once a second to notice a stop request
+        self.listener.settimeout(1.0)
+        threads = [threading.Thread(target=self._serve, name=f'worker-{i}', daemon=True)
+                   for i in range(self.args.threads)]
+        for thread in threads:
+            thread.start()
+        os.write(ready_fd, b'1')
+        os.close(ready_fd)
+
+        while not self.stopping.wait(1.0):
+            pass
+        deadline = time.monotonic() + self.args.graceful_timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        logger.info('Worker %d stopping after %d requests', os.getpid(), self.served)
+
+    def _serve(self):
+        while not self.stopping.is_set():
+            try:
+                conn, address = self.listener.accept()
+            except TimeoutError:
+                continue
+            except OSError:
+                # Out of file descriptors, or the connection was reset before we got it
+                time.sleep(0.1)
+                continue
+            conn.settimeout(self.args.timeout)
+            try:
+                self.server.finish_request(conn, address)
+            except OSError:
+                pass
+            except Exception:
+                logger.exception('Error serving %s', address)
+            finally:
+                self.server.shutdown_request(conn)
+            with self.lock:
+                self.served += 1
+                if self.max_requests and self.served >= self.max_requests:
+                    self.stopping.set()
+
+
+class Master:
+    def __init__(self, application, listener, args):
+        self.application = application
+        self.listener = listener
+        self.args = args
+        self.workers = {}  # pid: start time
+        self.old_workers = {int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid}
+        self.signals = []
+        self.respawn_after = 0.0
+        self.stopping = False
+
+    def run(self):
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+        logger.info('Listening on %s:%s with %d workers x %d threads', *self.listener.getsockname()[:2],
+                    self.args.workers, self.args.threads)
+        self._start_workers()
+        self.log_memory()
+
+        while True:
+            self._reap()
+            if time.monotonic() >= self.respawn_after:
+                while len(self.workers) < self.args.workers:
+                    self._spawn()
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGUSR1:
+                    self.log_memory()
+            time.sleep(0.5)
+
+    def _spawn(self):
+        """Fork a worker and wait until it is accepting; returns whether it came up"""
+        from core_app import logs
+
+        logs.stop_listeners()
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            code = 0
+            try:
+                Worker(self.application, self.listener, self.args).run(ready_write)
+            except BaseException:
+                logger.exception('Worker %d failed', os.getpid())
+                code = 1
+            finally:
+                # Never return into the master's stack
+                _exit_worker(code)
+        os.close(ready_write)
+        self.workers[pid] = time.monotonic()
+        readable, _, _ = select.select([ready_read], [], [], READY_TIMEOUT)
+        ready = bool(readable) and os.read(ready_read, 1) == b'1'
+        os.close(ready_read)
+        if not ready:
+            logger.error('Worker %d did not start within %ds', pid, READY_TIMEOUT)
+        return ready
+
+    def _start_workers(self):
+        """Start the pool, retiring one old worker (after a reload) per new worker that is ready"""
+        old = sorted(self.old_workers)
+        for i in range(self.args.workers):
+            if self._spawn() and old:
+                self._signal(old.pop(0), signal.SIGTERM)
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self.old_workers:
+                self.old_workers.discard(pid)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            if self.stopping:
+                logger.info('Worker %d stopped', pid)
+            elif code == 0:
+                logger.info('Worker %d retired; starting a replacement', pid)
+            else:
+                logger.warning('Worker %d exited with status %d', pid, code)
+                if time.monotonic() - started < 1:
+                    # Don't spin if workers die as soon as they start
+                    self.respawn_after = time.monotonic() + 1
+
+    def stop(self):
+        """Stop every worker gracefully, killing those that outlast the timeout"""
+        self.stopping = True
+        logger.info('Stopping %d workers', len(self.workers) + len(self.old_workers))
+        children = set(self.workers) | self.old_workers
+        for pid in children:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.args.graceful_timeout + 2
+        while (self.workers or self.old_workers) and time.monotonic() < deadline:
+            time.sleep(0.1)
+            self._reap()
+        for pid in set(self.workers) | self.old_workers:
+            logger.warning('Killing worker %d', pid)
+            self._signal(pid, signal.SIGKILL)
+        self.listener.close()
+
+    def reload(self):
+        """Re-execute with the current code on the same socket, if the code starts"""
+        logger.info('Reload requested; checking the new code')
+        check = subprocess.run([sys.executable, *sys.orig_argv[1:], '--check'], stdin=subprocess.DEVNULL)
+        if check.returncode != 0:
+            logger.error('Reload aborted: the new code exited with status %d; still serving the old code',
+                         check.returncode)
+            return
+        from core_app import logs, metrics
+
+        os.set_inheritable(self.listener.fileno(), True)
+        os.environ[LISTEN_FD_ENV] = str(self.listener.fileno())
+        os.environ[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in set(self.workers) | self.old_workers)
+        logger.info('Re-executing the master; %d workers keep serving until replaced', len(self.workers))
+        metrics.registry.retire()
+        logs.stop_listeners()
+        os.execv(sys.executable, [sys.executable, *sys.orig_argv[1:]])
+
+    def log_memory(self):
+        for role, pid in [('master', os.getpid())] + [('worker', pid) for pid in self.workers]:
+            usage = memory_usage(pid)
+            if usage is None:
+                return
+            rss, pss, private = usage
+            logger.info('Memory of %s %d: rss %.1f MiB, pss %.1f MiB, private %.1f MiB',
+                        role, pid, rss / 1024, pss / 1024, private / 1024,
+                        extra={'role': role, 'pid': pid, 'rss_kib': rss, 'pss_kib': pss, 'private_kib': private})
+
+
+def _exit_worker(code):
+    from core_app import logs, metrics
+
+    try:
+        metrics.registry.retire()
+        logs.stop_listeners()
+    finally:
+        os._exit(code)
+
+
+def process_local_caches():
+    """Aliases of the configured caches that each process keeps to itself"""
+    from django.conf import settings
+
+    return [alias for alias, config in settings.CACHES.items()
+            if config['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS]
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main_app.settings')
+    # Decided before preloading: settings are enough, and a refusal should be quick
+    local_caches = process_local_caches()
+    if args.workers is None:
+        args.workers = 1 if local_caches else os.cpu_count() or 1
+    elif args.workers > 1 and local_caches:
+        # Logging is not configured yet; the last-resort handler prints this to stderr
+        logger.error('Caches %s are local to each process, so %d workers would serve stale '
+                     'permissions, sessions, entitlements and rate limits. Point CACHE_BACKEND and '
+                     'RATELIMIT_CACHE_BACKEND at Redis or Memcached, or run with --workers 1.',
+                     ', '.join(local_caches), args.workers)
+        return 1
+    application = preload(args)
+    if args.check:
+        from core_app import logs
+        logs.stop_listeners()
+        return 0
+
+    listener = _listener(args.bind)
+    from core_app import metrics
+    folded = metrics.fold_exited()
+    if folded:
+        logger.info('Folded the metrics of %d exited processes', folded)
+    # Objects loaded so far live as long as the master; keeping the collector
+    # off them stops the workers from dirtying (and so copying) shared pages
+    gc.collect()
+    gc.freeze()
+    Master(application, listener, args).run()
+    return 0
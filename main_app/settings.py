@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 
+from . import database
+
 # Load environment variables from .env file (optional)
 try:
     from dotenv import load_dotenv
@@ -32,6 +34,16 @@ LOGOUT_REDIRECT_URL = 'home'
 SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
 CSRF_COOKIE_SECURE = os.getenv('CSRF_COOKIE_SECURE', 'False').lower() == 'true'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
+
+# Session storage strategy: 'cached_db' keeps sessions in the cache with a DB
+# write-through, 'signed_cookies' keeps them entirely client-side
+SESSION_STRATEGIES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESSION_STRATEGIES[os.getenv('SESSION_STRATEGY', 'cached_db')]
 CSRF_COOKIE_NAME = 'csrftoken'
 CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', 'http://localhost:8000,http://127.0.0.1:8000').split(',')
@@ -62,11 +74,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core_app.middleware.StaticFilesMiddleware',
+    'core_app.middleware.RequestLogMiddleware',
+    'core_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core_app.middleware.SnapshotAuthenticationMiddleware',
+    'core_app.middleware.AuditMiddleware',
+    'core_app.middleware.RateLimitMiddleware',
+    'core_app.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,6 +105,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core_app.context_processors.site_switcher',
+                'core_app.context_processors.built_assets',
             ],
         },
     },
@@ -98,11 +118,105 @@ WSGI_APPLICATION = 'main_app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3')  # see main_app/database.py
 DATABASES = {
+    'default': database.parse(DATABASE_URL, BASE_DIR),
+}
+DATABASE_ENGINE = DATABASES['default']['ENGINE']
+
+# Persistent connections: reuse a connection for up to DB_CONN_MAX_AGE
+# seconds ("none" for no limit, 0 to reconnect on every request) and check
+# it is still alive before the first query of each request
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', '60')
+DATABASES['default']['CONN_MAX_AGE'] = None if DB_CONN_MAX_AGE.lower() == 'none' else int(DB_CONN_MAX_AGE)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+
+# PostgreSQL session settings, applied once per connection: statements and
+# idle transactions running longer than these many milliseconds are aborted
+# (0 disables)
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', '30000'))
+DB_IDLE_IN_TRANSACTION_TIMEOUT = int(os.getenv('DB_IDLE_IN_TRANSACTION_TIMEOUT', '60000'))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))  # seconds
+
+if DATABASE_ENGINE == 'django.db.backends.postgresql':
+    pg_options = DATABASES['default']['OPTIONS']
+    pg_options.setdefault('connect_timeout', DB_CONNECT_TIMEOUT)
+    pg_options.setdefault('application_name', 'space-flow')
+    pg_options['options'] = ' '.join(filter(None, [
+        pg_options.get('options', ''),
+        f'-c statement_timeout={DB_STATEMENT_TIMEOUT}',
+        f'-c idle_in_transaction_session_timeout={DB_IDLE_IN_TRANSACTION_TIMEOUT}',
+    ]))
+
+# Production SQLite profile: WAL journal, tuned pragmas, a busy timeout and
+# BEGIN IMMEDIATE write transactions so concurrent writers queue instead of
+# failing with "database is locked"
+SQLITE_PRODUCTION = os.getenv('SQLITE_PRODUCTION', 'False').lower() == 'true'
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '20'))  # seconds
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # KiB, i.e. ~20 MB of page cache per connection
+    'mmap_size': 134217728,  # 128 MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT * 1000,
+}
+
+# SQLite has no statement timeout; busy_timeout bounds waits for the write lock
+if SQLITE_PRODUCTION and DATABASE_ENGINE == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'].update({
+        'timeout': SQLITE_BUSY_TIMEOUT,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    })
+
+# Serialize writes within a process and retry on lock contention
+# (see core_app.db.serialized_write)
+SQLITE_SERIALIZE_WRITES = os.getenv('SQLITE_SERIALIZE_WRITES', str(SQLITE_PRODUCTION)).lower() == 'true'
+WRITE_RETRY_ATTEMPTS = int(os.getenv('WRITE_RETRY_ATTEMPTS', '5'))
+WRITE_RETRY_BACKOFF = float(os.getenv('WRITE_RETRY_BACKOFF', '0.05'))  # seconds, doubled per attempt
+
+# Online SQLite backups (`manage.py db_maintenance backup`): the newest
+# DB_BACKUP_KEEP copies are kept in DB_BACKUP_DIR (default: <project>/backups).
+# Outside WAL mode the copy advances DB_BACKUP_STEP_PAGES pages at a time and
+# pauses between steps so that writers are not held up. A write restarts the
+# copy; after DB_BACKUP_MAX_RESTARTS restarts it is finished in a single step.
+DB_BACKUP_DIR = os.getenv('DB_BACKUP_DIR', '')
+DB_BACKUP_KEEP = int(os.getenv('DB_BACKUP_KEEP', '7'))
+DB_BACKUP_STEP_PAGES = int(os.getenv('DB_BACKUP_STEP_PAGES', '256'))
+DB_BACKUP_STEP_PAUSE = float(os.getenv('DB_BACKUP_STEP_PAUSE', '0.01'))  # seconds
+DB_BACKUP_MAX_RESTARTS = int(os.getenv('DB_BACKUP_MAX_RESTARTS', '3'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'space-flow'),
+    },
+    # Rate limit buckets (see core_app.ratelimit). Point this at Redis or
+    # Memcached so all workers share the buckets; locmem is per process.
+    'ratelimit': {
+        'BACKEND': os.getenv('RATELIMIT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RATELIMIT_CACHE_LOCATION', 'space-flow-ratelimit'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Token-bucket rate limits per URL name: refill rate, bucket size, the
+# scopes that get their own bucket (ip, user, username) and the methods
+# that are limited
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True').lower() == 'true'
+RATELIMIT_CACHE = 'ratelimit'
+# Request header holding the client address when behind a proxy, e.g.
+# HTTP_X_FORWARDED_FOR; REMOTE_ADDR is used when empty
+RATELIMIT_IP_HEADER = os.getenv('RATELIMIT_IP_HEADER', '')
+RATELIMITS = {
+    'login': {'rate': '10/m', 'burst': 5, 'key': ('ip', 'username')},
+    'register': {'rate': '5/h', 'burst': 3, 'key': ('ip',)},
+    'booking_create': {'rate': '30/m', 'burst': 10, 'key': ('user',)},
 }
 
 
@@ -143,10 +257,117 @@ USE_TZ = True
 STATIC_URL = os.getenv('STATIC_URL', 'static/')
 STATIC_ROOT = BASE_DIR / os.getenv('STATIC_ROOT', 'staticfiles')
 
+# collectstatic content-hashes every file and writes .gz (and, with the
+# optional brotli package, .br) variants; see core_app.assets
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core_app.assets.PrecompressedManifestStaticFilesStorage',
+    },
+}
+# Serve STATIC_ROOT from Django with far-future caching; turn off when a web
+# server or CDN serves it instead
+SERVE_STATIC = os.getenv('SERVE_STATIC', 'True').lower() == 'true'
+
 # Media files (User uploaded files)
 MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 MEDIA_ROOT = BASE_DIR / os.getenv('MEDIA_ROOT', 'media')
 
+# Email
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False').lower() == 'true'
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Space Flow <noreply@localhost>')
+
+# Background jobs (see core_app.jobs and `manage.py run_worker`)
+JOB_TASK_MODULES = ['core_app.tasks']
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BACKOFF = int(os.getenv('JOB_RETRY_BACKOFF', '30'))  # seconds, doubled per attempt
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', '600'))  # seconds before a running job is requeued
+
+# Bookings that ended more than this many days ago are moved to the archive
+# table by `manage.py archive_bookings`
+BOOKING_RETENTION_DAYS = int(os.getenv('BOOKING_RETENTION_DAYS', '180'))
+
+# Waitlist (see core_app.waitlist): the longest window a member can queue
+# for, which bounds the overlap lookup, and how many entries one freed slot
+# can promote
+WAITLIST_MAX_WINDOW_HOURS = int(os.getenv('WAITLIST_MAX_WINDOW_HOURS', '24'))
+WAITLIST_PROMOTION_BATCH_SIZE = int(os.getenv('WAITLIST_PROMOTION_BATCH_SIZE', '100'))
+
+# Resource catalog imports (see core_app.catalog): rows per file, and
+# resources written per transaction
+RESOURCE_IMPORT_MAX_ROWS = int(os.getenv('RESOURCE_IMPORT_MAX_ROWS', '5000'))
+RESOURCE_IMPORT_BATCH_SIZE = int(os.getenv('RESOURCE_IMPORT_BATCH_SIZE', '500'))
+
+# JSON API page sizes (see core_app.api)
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '50'))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '200'))
+
+# Prometheus metrics served at /metrics (see core_app.metrics). Each serving
+# process writes its counters to METRICS_DIR (default: <project>/metrics),
+# which must be shared by all workers of one deployment.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))  # seconds
+# Scrapers must send "Authorization: Bearer <METRICS_TOKEN>" or connect from
+# one of METRICS_ALLOWED_IPS
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# On-demand profiling (?_profile=1, admins only; see core_app.profiling)
+PROFILING_DIR = os.getenv('PROFILING_DIR', '')
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', '50'))
+PROFILING_SAMPLE_INTERVAL = float(os.getenv('PROFILING_SAMPLE_INTERVAL', '0.001'))  # seconds
+
+# Logging (see core_app.logs). Records are formatted and written by a
+# background thread in batches, so a slow terminal or disk never holds up a
+# request; when LOG_QUEUE_SIZE records are waiting, new ones are dropped and
+# counted instead.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json or text
+LOG_FILE = os.getenv('LOG_FILE', '')  # also append to this file; rotate it with logrotate
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '100'))
+# One access log line per request, from core_app.requests
+LOG_REQUESTS = os.getenv('LOG_REQUESTS', 'True').lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {
+            '()': 'core_app.logs.RequestContextFilter',
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'core_app.logs.JsonFormatter',
+        },
+        'text': {
+            'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s',
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'core_app.logs.QueueHandler',
+            'formatter': LOG_FORMAT,
+            'filters': ['request_context'],
+            'filename': LOG_FILE,
+            'queue_size': LOG_QUEUE_SIZE,
+            'batch_size': LOG_BATCH_SIZE,
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,41 @@
+/** Tailwind build for Space Flow (`npm run build`); see README "Front-end Assets". */
+module.exports = {
+  // Every file that may contain class names. Python is included because
+  // form widgets set their classes in core_app/forms.py.
+  content: [
+    './templates/**/*.html',
+    './core_app/templates/**/*.html',
+    './core_app/**/*.py',
+  ],
+  theme: {
+    extend: {
+      colors: {
+        primary: {
+          50: '#f0f7ff',
+          100: '#e0efff',
+          200: '#b9dfff',
+          300: '#7cc3ff',
+          400: '#36a9ff',
+          500: '#0077C0',  /* Main brand blue from your logo */
+          600: '#005C94',  /* Darker shade for hover states */
+          700: '#004B7A',
+          800: '#003A5E',
+          900: '#002542',
+        },
+        accent: {
+          50: '#f4f9f7',
+          100: '#dbede7',
+          200: '#b8dcd0',
+          300: '#8ac3b2',
+          400: '#5aa891',
+          500: '#00B388',  /* Secondary color from your logo */
+          600: '#009975',  /* Darker shade for hover states */
+          700: '#007F62',
+          800: '#00654E',
+          900: '#004A3A',
+        },
+      },
+    },
+  },
+  plugins: [],
+}